@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+Micro benchmark for qtools_sxzq.qcalendar.CCalendar
+
+compare the indexed implementation with the legacy linear-scan implementation,
+results of both implementations are checked to be the same before timing.
+
+usage:
+    python benchmarks/bench_qcalendar.py --years 20 --repeat 2000
+"""
+
+import os
+import argparse
+import tempfile
+import timeit
+import pandas as pd
+from qtools_sxzq.qcalendar import CCalendar
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+class CCalendarLinear(object):
+    """
+    the legacy implementation, every query is a linear scan over trade dates
+    """
+
+    def __init__(self, calendar_path: str):
+        calendar_df = pd.read_csv(calendar_path, dtype=str)
+        self.trade_dates = [_.replace("-", "") for _ in calendar_df["trade_date"]]
+
+    def get_iter_list(self, bgn_date: str, stp_date: str) -> list[str]:
+        res = []
+        for t_date in self.trade_dates:
+            if t_date < bgn_date:
+                continue
+            if t_date >= stp_date:
+                break
+            res.append(t_date)
+        return res
+
+    def get_next_date(self, this_date: str, shift: int = 1) -> str:
+        return self.trade_dates[self.trade_dates.index(this_date) + shift]
+
+    def get_last_days_in_range(self, bgn_date: str, stp_date: str) -> list[str]:
+        res = []
+        for this_day, next_day in zip(self.trade_dates[:-1], self.trade_dates[1:]):
+            if this_day < bgn_date:
+                continue
+            elif this_day >= stp_date:
+                break
+            else:
+                if this_day[0:6] != next_day[0:6]:
+                    res.append(this_day)
+        return res
+
+    def get_first_day_of_month(self, month: str) -> str:
+        threshold = f"{month}01"
+        for t in self.trade_dates:
+            if t >= threshold:
+                return t
+        raise ValueError(f"Could not find first day for {month}")
+
+    def get_last_day_of_month(self, month: str) -> str:
+        threshold = f"{month}31"
+        for t in self.trade_dates[::-1]:
+            if t <= threshold:
+                return t
+        raise ValueError(f"Could not find last day for {month}")
+
+
+def make_calendar_file(save_dir: str, years: int) -> str:
+    dates = pd.bdate_range(start="2005-01-01", periods=years * 250)
+    calendar_path = os.path.join(save_dir, "calendar.csv")
+    pd.DataFrame({"trade_date": dates.strftime("%Y-%m-%d")}).to_csv(calendar_path, index=False)
+    return calendar_path
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Micro benchmark for CCalendar")
+    args_parser.add_argument("--years", type=int, default=20, help="years of trade dates in calendar")
+    args_parser.add_argument("--repeat", type=int, default=2000, help="calls for each query")
+    args = args_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        calendar_path = make_calendar_file(tmp_dir, args.years)
+        new, old = CCalendar(calendar_path), CCalendarLinear(calendar_path)
+
+    dates = new.trade_dates
+    bgn_date, stp_date = dates[len(dates) // 2], dates[-10]
+    this_date, month = dates[-20], dates[-30][0:6]
+    cases = {
+        "get_iter_list": lambda c: c.get_iter_list(bgn_date, stp_date),
+        "get_next_date": lambda c: c.get_next_date(this_date, shift=5),
+        "get_last_days_in_range": lambda c: c.get_last_days_in_range(bgn_date, stp_date),
+        "get_first_day_of_month": lambda c: c.get_first_day_of_month(month),
+        "get_last_day_of_month": lambda c: c.get_last_day_of_month(month),
+    }
+    print(f"calendar size = {SFY(len(dates))}, repeat = {SFY(args.repeat)}")
+    for case, func in cases.items():
+        if func(new) != func(old):
+            raise ValueError(f"results of {case} are not the same")
+        t_new = timeit.timeit(lambda: func(new), number=args.repeat) / args.repeat * 1e6
+        t_old = timeit.timeit(lambda: func(old), number=args.repeat) / args.repeat * 1e6
+        print(
+            f"{case:<24s}: linear = {t_old:>10.2f}us, indexed = {t_new:>8.2f}us, "
+            f"speedup = {SFG(f'{t_old / t_new:.1f}x')}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    main()
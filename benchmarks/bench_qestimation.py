@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for qtools_sxzq.qestimation
+
+Compare the per-date loop with pd.DataFrame.cov() / pd.DataFrame.ewm() against one streaming
+pass of CMomentsRolling / CMomentsEWMA for every rebalance date, report time and max differences.
+
+usage:
+    python benchmarks/bench_qestimation.py --dates 2500 --assets 100 --win 120 --freq 1
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from qtools_sxzq.qestimation import cal_moments, CMomentsRolling, CMomentsEWMA
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for moments estimation")
+    args_parser.add_argument("--dates", type=int, default=2500, help="number of dates")
+    args_parser.add_argument("--assets", type=int, default=100, help="number of assets")
+    args_parser.add_argument("--win", type=int, default=120, help="rolling window")
+    args_parser.add_argument("--halflife", type=float, default=30, help="halflife of EWMA")
+    args_parser.add_argument("--freq", type=int, default=1, help="rebalance every freq dates")
+    args = args_parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n, p = args.dates, args.assets
+    rtn = pd.DataFrame(
+        rng.normal(0, 0.01, (n, 1)) @ rng.uniform(0.5, 1.5, (1, p)) + rng.normal(0.0005, 0.015, (n, p)),
+        index=pd.bdate_range("2015-01-01", periods=n).strftime("%Y%m%d"),
+    )
+    rebalance_dates = rtn.index[args.win - 1::args.freq].tolist()
+    print(f"dates = {SFY(n)}, assets = {SFY(p)}, rebalance dates = {SFY(len(rebalance_dates))}")
+
+    t0 = time.perf_counter()
+    loop_ms, loop_vs = [], []
+    for date in rebalance_dates:
+        i = rtn.index.get_loc(date)
+        window = rtn.iloc[i - args.win + 1:i + 1]
+        loop_ms.append(window.mean().to_numpy())
+        loop_vs.append(window.cov().to_numpy())
+    t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    stack = cal_moments(rtn, CMomentsRolling(p, win=args.win), rebalance_dates)
+    t_stream = time.perf_counter() - t0
+    d_v = np.max(np.abs(stack.vs - np.array(loop_vs)))
+    print(f"rolling: loop = {t_loop:.2f}s, stream = {t_stream:.2f}s, max|dV| = {d_v:.2e}, "
+          f"speedup = {SFG(f'{t_loop / t_stream:.1f}x')}")
+
+    t0 = time.perf_counter()
+    stack = cal_moments(rtn, CMomentsRolling(p, win=args.win, shrinkage=True), rebalance_dates)
+    print(f"rolling with Ledoit-Wolf shrinkage: stream = {time.perf_counter() - t0:.2f}s")
+
+    alpha = 1 - np.exp(-np.log(2) / args.halflife)
+    t0 = time.perf_counter()
+    ewm_cov = rtn.ewm(alpha=alpha, adjust=False).cov(bias=True)
+    loop_vs = [ewm_cov.loc[date].to_numpy() for date in rebalance_dates]
+    t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    stack = cal_moments(rtn, CMomentsEWMA(p, alpha=alpha), rebalance_dates)
+    t_stream = time.perf_counter() - t0
+    d_v = np.max(np.abs(stack.vs - np.array(loop_vs)))
+    print(f"ewma: pandas = {t_loop:.2f}s, stream = {t_stream:.2f}s, max|dV| = {d_v:.2e}, "
+          f"speedup = {SFG(f'{t_loop / t_stream:.1f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""
+Micro benchmark for drawdown duration indicators of qtools_sxzq.qevaluation.CNAV
+
+compare the vectorized implementation with the legacy for-loop implementation,
+values, series and idx of both implementations are checked to be the same before timing.
+
+usage:
+    python benchmarks/bench_qevaluation_duration.py --length 10000 --series 20
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from qtools_sxzq.qevaluation import CNAV
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+class CNAVLoop(CNAV):
+    """
+    the legacy implementation, series are written by iloc one element at a time
+    """
+
+    def cal_longest_drawdown_duration(self):
+        if self.longest_drawdown_duration.avlb:
+            return 0
+        prev_high = self.nav_srs.iloc[0]
+        prev_high_loc = 0
+        prev_drawdown_scale = 0.0
+        drawdown_loc = 0
+        for i, nav_i in enumerate(self.nav_srs):
+            if nav_i > prev_high:
+                prev_high = nav_i
+                prev_high_loc = i
+                prev_drawdown_scale = 0
+            drawdown_scale = 1 - nav_i / prev_high  # type:ignore
+            if drawdown_scale > prev_drawdown_scale:
+                prev_drawdown_scale = drawdown_scale
+                drawdown_loc = i
+            self.longest_drawdown_duration.srs.iloc[i] = drawdown_loc - prev_high_loc
+        self.longest_drawdown_duration.val = self.longest_drawdown_duration.srs.max()
+        self.longest_drawdown_duration.idx = self.longest_drawdown_duration.srs.idxmax()
+        self.longest_drawdown_duration.avlb = True
+        return 0
+
+    def cal_longest_recover_duration(self):
+        if self.longest_recover_duration.avlb:
+            return 0
+        prev_high = self.nav_srs.iloc[0]
+        prev_high_loc = 0
+        for i, nav_i in enumerate(self.nav_srs):
+            if nav_i > prev_high:
+                self.longest_recover_duration.srs.iloc[i] = 0
+                prev_high = nav_i
+                prev_high_loc = i
+            else:
+                self.longest_recover_duration.srs.iloc[i] = i - prev_high_loc
+        self.longest_recover_duration.val = self.longest_recover_duration.srs.max()
+        self.longest_recover_duration.idx = self.longest_recover_duration.srs.idxmax()
+        self.longest_recover_duration.avlb = True
+        return 0
+
+
+def make_ret_series(length: int, seed: int) -> pd.Series:
+    """
+    returns with random drift, some of them are set to 0 to make ties in nav
+    """
+    rng = np.random.default_rng(seed)
+    ret = rng.normal(rng.normal(0, 0.0005), 0.01, length)
+    ret[rng.random(length) < 0.1] = 0
+    index = pd.bdate_range("2000-01-03", periods=length).strftime("%Y%m%d")
+    return pd.Series(ret, index=index)
+
+
+def run(cls, ret_srs: list[pd.Series]) -> tuple[float, list[CNAV]]:
+    navs = [cls(input_srs=srs, input_type="RET") for srs in ret_srs]
+    t0 = time.perf_counter()
+    for nav in navs:
+        nav.cal_longest_drawdown_duration()
+        nav.cal_longest_recover_duration()
+    return time.perf_counter() - t0, navs
+
+
+def check_the_same(nav_loop: CNAV, nav_vec: CNAV):
+    for name in ("longest_drawdown_duration", "longest_recover_duration"):
+        ind_loop, ind_vec = getattr(nav_loop, name), getattr(nav_vec, name)
+        if not (ind_loop.val == ind_vec.val and ind_loop.idx == ind_vec.idx and ind_loop.srs.equals(ind_vec.srs)):
+            raise ValueError(f"results of {name} are not the same")
+    if not pd.Series(nav_loop.to_dict()).equals(pd.Series(nav_vec.to_dict())):  # NaN == NaN
+        raise ValueError("results of to_dict are not the same")
+    return 0
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Micro benchmark for drawdown duration indicators")
+    args_parser.add_argument("--length", type=int, default=10000, help="length of each return series")
+    args_parser.add_argument("--series", type=int, default=20, help="number of return series")
+    args = args_parser.parse_args()
+
+    ret_srs = [make_ret_series(args.length, seed) for seed in range(args.series)]
+    t_loop, navs_loop = run(CNAVLoop, ret_srs)
+    t_vec, navs_vec = run(CNAV, ret_srs)
+    for nav_loop, nav_vec in zip(navs_loop, navs_vec):
+        check_the_same(nav_loop, nav_vec)
+
+    print(f"results are {SFG('the same')}, length = {SFY(args.length)}, series = {SFY(args.series)}")
+    print(f"for-loop   : {t_loop / args.series * 1e3:>10.2f} ms/series")
+    print(f"vectorized : {t_vec / args.series * 1e3:>10.2f} ms/series, speedup = {SFG(f'{t_loop / t_vec:.0f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
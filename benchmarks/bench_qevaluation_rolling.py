@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for rolling indicators of qtools_sxzq.qevaluation.CNAV
+
+compare CNAV.cal_rolling_indicators with a new CNAV for each window, results of both
+are checked to be the same (durations exactly, others up to float rounding) before timing.
+
+usage:
+    python benchmarks/bench_qevaluation_rolling.py --length 2500 --win 250
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from qtools_sxzq.qevaluation import CNAV
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+def cal_rolling_by_slices(nav: CNAV, win: int, qs: tuple[int, ...]) -> pd.DataFrame:
+    res = {}
+    for i in range(win - 1, len(nav.rtn_srs)):
+        sub = CNAV(input_srs=nav.rtn_srs.iloc[i - win + 1:i + 1], input_type="RET")
+        sub.cal_all_indicators(qs=qs)
+        res[nav.rtn_srs.index[i]] = sub.to_dict()
+    return pd.DataFrame.from_dict(res, orient="index")
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for rolling indicators")
+    args_parser.add_argument("--length", type=int, default=2500, help="length of return series")
+    args_parser.add_argument("--win", type=int, default=250, help="window size")
+    args = args_parser.parse_args()
+
+    qs = (1, 5)
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range("2010-01-04", periods=args.length).strftime("%Y%m%d")
+    nav = CNAV(input_srs=pd.Series(rng.normal(0.0003, 0.01, args.length), index=index), input_type="RET")
+
+    t0 = time.perf_counter()
+    rolling = nav.cal_rolling_indicators(win=args.win, qs=qs)
+    t1 = time.perf_counter()
+    slices = cal_rolling_by_slices(nav, args.win, qs)
+    t2 = time.perf_counter()
+
+    rolling = rolling.dropna(axis=0, how="all")
+    for col in rolling.columns:
+        if col in ("lddDur", "lrd"):
+            is_the_same = np.array_equal(rolling[col].to_numpy(), slices[col].to_numpy())
+        else:
+            is_the_same = np.allclose(rolling[col].to_numpy(), slices[col].to_numpy(), rtol=1e-9, atol=1e-12)
+        if not is_the_same:
+            raise ValueError(f"results of {col} are not the same")
+
+    print(f"results are {SFG('the same')}, length = {SFY(args.length)}, win = {SFY(args.win)}")
+    print(f"CNAV of each window    : {t2 - t1:>8.3f}s")
+    print(f"cal_rolling_indicators : {t1 - t0:>8.3f}s, speedup = {SFG(f'{(t2 - t1) / (t1 - t0):.0f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
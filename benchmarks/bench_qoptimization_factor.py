@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for the factor model covariance in qtools_sxzq.qoptimization
+
+Build V = B @ Sigma @ B.T + diag(D), solve the same problems with the dense V and with
+CCovarianceFactor, report time, memory of the covariance and the differences of results.
+
+usage:
+    python benchmarks/bench_qoptimization_factor.py --assets 200 1000 3000 --factors 10
+"""
+
+import argparse
+import time
+import numpy as np
+from scipy.optimize import OptimizeResult
+from qtools_sxzq.qoptimization import (
+    CCovarianceFactor, COptimizerPortfolioUtility, COptimizerPortfolioMinVariance, COptimizerPortfolioSharpe,
+)
+from qtools_sxzq.qwidgets import SFG
+
+
+def make_factor_model(p: int, k: int, seed: int) -> tuple[np.ndarray, CCovarianceFactor]:
+    rng = np.random.default_rng(seed)
+    b = rng.normal(0, 1, (p, k))
+    a = rng.normal(0, 0.1, (k, k))
+    sigma = a @ a.T + np.diag(rng.uniform(0.01, 0.02, k))
+    d = rng.uniform(0.02, 0.08, p)
+    m = rng.normal(0.05, 0.10, p)
+    return m, CCovarianceFactor(b=b, sigma=sigma, d=d)
+
+
+def run(optimizer) -> tuple[float, OptimizeResult]:
+    t0 = time.perf_counter()
+    res = optimizer.optimize()
+    return time.perf_counter() - t0, res
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for factor model covariance")
+    args_parser.add_argument("--assets", type=int, nargs="+", default=[200, 1000, 3000], help="number of assets")
+    args_parser.add_argument("--factors", type=int, default=10, help="number of factors")
+    args_parser.add_argument("--scipy-max-assets", type=int, default=300, help="skip scipy solves above it")
+    args = args_parser.parse_args()
+
+    print(f"{'problem':<16s}{'p':>6s}{'dense(s)':>10s}{'factor(s)':>10s}{'dense MB':>10s}{'factor MB':>10s}"
+          f"{'dFun':>12s}{'max|dW|':>10s}{'  speedup'}")
+    for p in args.assets:
+        m, v_factor = make_factor_model(p, args.factors, seed=p)
+        v_dense = v_factor.to_dense()
+        mb_dense = v_dense.nbytes / 2 ** 20
+        mb_factor = (v_factor.b.nbytes + v_factor.sigma.nbytes + v_factor.d.nbytes) / 2 ** 20
+        problems = {
+            "utility qp": (COptimizerPortfolioUtility, {"lbd": 20, "bounds": [(-0.05, 0.05)] * p, "solver": "qp"}),
+            "min var qp": (COptimizerPortfolioMinVariance, {"bounds": [(0.0, 0.05)] * p, "solver": "qp"}),
+        }
+        if p <= args.scipy_max_assets:
+            problems["utility scipy"] = (COptimizerPortfolioUtility, {"lbd": 20, "bounds": [(-0.05, 0.05)] * p})
+            problems["sharpe scipy"] = (COptimizerPortfolioSharpe, {"bounds": [(0.0, 0.05)] * p})
+        for name, (opt_type, opt_kwargs) in problems.items():
+            t_dense, res_dense = run(opt_type(m=m, v=v_dense, x0="aver", **opt_kwargs))
+            t_factor, res_factor = run(opt_type(m=m, v=v_factor, x0="aver", **opt_kwargs))
+            d_fun = abs(res_factor.fun - res_dense.fun)
+            d_w = np.max(np.abs(res_factor.x - res_dense.x))
+            print(f"{name:<16s}{p:>6d}{t_dense:>10.3f}{t_factor:>10.3f}{mb_dense:>10.2f}{mb_factor:>10.2f}"
+                  f"{d_fun:>12.2e}{d_w:>10.2e}  {SFG(f'{t_dense / t_factor:.1f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for qtools_sxzq.qoptimization.COptimizerFrontier
+
+Solve a grid of lbd for the same (m, v) by running COptimizerPortfolioUtility from scratch
+for each lbd (scipy and qp solvers), and by COptimizerFrontier with and without warm starts.
+Then solve the frontiers of several dates with COptimizerFrontierRolling in a process pool.
+
+usage:
+    python benchmarks/bench_qoptimization_frontier.py --assets 200 --lbds 30 --dates 8 --n-jobs 4
+"""
+
+import argparse
+import time
+import numpy as np
+from qtools_sxzq.qoptimization import COptimizerPortfolioUtility, COptimizerFrontier, COptimizerFrontierRolling
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+def make_moments(p: int, k: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    n = max(2 * p, 250)
+    rtn = rng.normal(0, 0.01, (n, k)) @ rng.uniform(0.5, 1.5, (k, p)) + rng.normal(0.0005, 0.015, (n, p))
+    return rtn.mean(axis=0) * 250, np.cov(rtn, rowvar=False) * 250
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for efficient frontier")
+    args_parser.add_argument("--assets", type=int, default=200, help="number of assets")
+    args_parser.add_argument("--lbds", type=int, default=30, help="number of lbd in the grid")
+    args_parser.add_argument("--dates", type=int, default=8, help="number of dates for the rolling run")
+    args_parser.add_argument("--n-jobs", type=int, default=4, help="processes for the rolling run")
+    args = args_parser.parse_args()
+
+    p = args.assets
+    m, v = make_moments(p, 3, seed=0)
+    bounds = [(-0.05, 0.05)] * p
+    lbds = np.geomspace(1, 1000, args.lbds).tolist()
+    print(f"assets = {SFY(p)}, lbds = {SFY(args.lbds)}")
+
+    results = {}
+    for solver in ("scipy", "qp"):
+        t0 = time.perf_counter()
+        res = [COptimizerPortfolioUtility(m=m, v=v, lbd=lbd, x0="aver", bounds=bounds, solver=solver).optimize()
+               for lbd in lbds]
+        results[f"{solver} each"] = (time.perf_counter() - t0, np.array([r.x for r in res]))
+    for label, warm_start in (("frontier cold", False), ("frontier warm", True)):
+        t0 = time.perf_counter()
+        weights, stats = COptimizerFrontier(m=m, v=v, bounds=bounds, warm_start=warm_start).optimize_lbds(lbds)
+        results[label] = (time.perf_counter() - t0, weights.to_numpy())
+
+    t_base, w_base = results["scipy each"]
+    print(f"{'':<16s}{'time(s)':>10s}{'max|dW|':>10s}{'speedup':>10s}")
+    for label, (t, w) in results.items():
+        print(f"{label:<16s}{t:>10.3f}{np.max(np.abs(w - w_base)):>10.4f}{t_base / t:>9.1f}x")
+    print(stats[["returns", "volatility", "sharpe", "nit"]].iloc[::max(args.lbds // 6, 1)])
+
+    dates = [f"D{i:03d}" for i in range(args.dates)]
+    moments = [make_moments(p, 3, seed=i) for i in range(args.dates)]
+    ms, vs = [mi for mi, _ in moments], [vi for _, vi in moments]
+    timings = {}
+    for n_jobs in (1, args.n_jobs):
+        t0 = time.perf_counter()
+        COptimizerFrontierRolling({"bounds": bounds}, n_jobs=n_jobs).optimize(dates, ms, vs, lbds=lbds)
+        timings[n_jobs] = time.perf_counter() - t0
+    print(f"rolling {args.dates} dates: 1 job = {timings[1]:.2f}s, {args.n_jobs} jobs = {timings[args.n_jobs]:.2f}s, "
+          f"speedup = {SFG(f'{timings[1] / timings[args.n_jobs]:.1f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for analytic gradients in qtools_sxzq.qoptimization
+
+Solve the same problems with use_jac = False (finite difference gradients, sum(abs(w)) as a
+nonlinear constraint) and use_jac = True (analytic gradients and jacobians, long/short split
+for sum(abs(w))), report time, function evaluations and the gap of objective values.
+
+usage:
+    python benchmarks/bench_qoptimization_jac.py --assets 50 100 200 500
+"""
+
+import argparse
+import time
+import numpy as np
+from scipy.optimize import OptimizeResult
+from qtools_sxzq.qoptimization import (
+    COptimizerPortfolioUtility, COptimizerPortfolioUtilityRiskCtrl, COptimizerPortfolioSharpe,
+)
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+def make_moments(p: int, k: int, seed: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    n = max(2 * p, 250)
+    exposure = rng.uniform(0.5, 1.5, (k, p))
+    rtn = rng.normal(0, 0.01, (n, k)) @ exposure + rng.normal(0.0005, 0.015, (n, p))
+    m = rtn.mean(axis=0) * 250
+    v = np.cov(rtn, rowvar=False) * 250
+    return m, v, exposure / np.sqrt(p)
+
+
+def run(optimizer) -> tuple[float, OptimizeResult]:
+    t0 = time.perf_counter()
+    res = optimizer.optimize()
+    return time.perf_counter() - t0, res
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for analytic gradients of optimizers")
+    args_parser.add_argument("--assets", type=int, nargs="+", default=[50, 100, 200, 500], help="number of assets")
+    args_parser.add_argument("--factors", type=int, default=3, help="number of risk factors")
+    args_parser.add_argument("--max-iter", type=int, default=50000, help="maximum iteration")
+    args = args_parser.parse_args()
+
+    print(f"{'problem':<12s}{'p':>6s}{'jac':>6s}{'time(s)':>10s}{'nfev':>10s}{'njev':>8s}{'success':>9s}{'dFun':>12s}")
+    for p in args.assets:
+        m, v, exposure = make_moments(p, args.factors, seed=p)
+        problems = {
+            "utility": lambda use_jac: COptimizerPortfolioUtility(
+                m=m, v=v, lbd=20, x0="aver", bounds=[(-0.1, 0.1)] * p, max_iter=args.max_iter, use_jac=use_jac,
+            ),
+            "risk ctrl": lambda use_jac: COptimizerPortfolioUtilityRiskCtrl(
+                risk_exposure=exposure, sig=np.eye(p),
+                m=m, v=v, lbd=20, x0="aver", bounds=[(-0.1, 0.1)] * p, max_iter=args.max_iter, use_jac=use_jac,
+            ),
+            "sharpe": lambda use_jac: COptimizerPortfolioSharpe(
+                m=m, v=v, x0="aver", bounds=[(0.0, 0.1)] * p, max_iter=args.max_iter, use_jac=use_jac,
+            ),
+        }
+        for name, make_optimizer in problems.items():
+            t_fd, res_fd = run(make_optimizer(False))
+            t_an, res_an = run(make_optimizer(True))
+            for label, t, res in (("no", t_fd, res_fd), ("yes", t_an, res_an)):
+                d_fun = res.fun - res_fd.fun
+                print(f"{name:<12s}{p:>6d}{label:>6s}{t:>10.3f}{res.nfev:>10d}{res.get('njev', 0):>8d}"
+                      f"{str(res.success):>9s}{d_fun:>12.2e}")
+            print(f"{name:<12s}{p:>6d} speedup = {SFG(f'{t_fd / t_an:.1f}x')}, "
+                  f"nfev ratio = {SFY(f'{res_fd.nfev / max(res_an.nfev, 1):.0f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for the built-in convex QP solver in qtools_sxzq.qoptimization
+
+Solve the same mean-variance and min-variance problems with solver = "scipy" (SLSQP with
+analytic gradients) and solver = "qp" (CQPSolverADMM), report time, iterations, the gap of
+objective values and the max difference of weights.
+
+usage:
+    python benchmarks/bench_qoptimization_qp.py --assets 50 200 500
+"""
+
+import argparse
+import time
+import numpy as np
+from scipy.optimize import OptimizeResult
+from qtools_sxzq.qoptimization import COptimizerPortfolioUtility, COptimizerPortfolioMinVariance
+from qtools_sxzq.qwidgets import SFG
+
+
+def make_moments(p: int, k: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    n = max(2 * p, 250)
+    rtn = rng.normal(0, 0.01, (n, k)) @ rng.uniform(0.5, 1.5, (k, p)) + rng.normal(0.0005, 0.015, (n, p))
+    return rtn.mean(axis=0) * 250, np.cov(rtn, rowvar=False) * 250
+
+
+def run(optimizer) -> tuple[float, OptimizeResult]:
+    t0 = time.perf_counter()
+    res = optimizer.optimize()
+    return time.perf_counter() - t0, res
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for the convex QP solver")
+    args_parser.add_argument("--assets", type=int, nargs="+", default=[50, 200, 500], help="number of assets")
+    args_parser.add_argument("--factors", type=int, default=3, help="number of risk factors")
+    args = args_parser.parse_args()
+
+    print(f"{'problem':<16s}{'p':>6s}{'solver':>8s}{'time(s)':>10s}{'nit':>8s}{'success':>9s}{'dFun':>12s}{'max|dW|':>10s}")
+    for p in args.assets:
+        m, v = make_moments(p, args.factors, seed=p)
+        problems = {
+            "utility long": (COptimizerPortfolioUtility, {"lbd": 20, "bounds": [(0.0, 0.1)] * p}),
+            "utility l/s": (COptimizerPortfolioUtility, {"lbd": 20, "bounds": [(-0.1, 0.1)] * p}),
+            "min variance": (COptimizerPortfolioMinVariance, {"bounds": [(0.0, 0.1)] * p}),
+        }
+        for name, (opt_type, opt_kwargs) in problems.items():
+            t_sp, res_sp = run(opt_type(m=m, v=v, x0="aver", solver="scipy", **opt_kwargs))
+            t_qp, res_qp = run(opt_type(m=m, v=v, x0="aver", solver="qp", **opt_kwargs))
+            for label, t, res in (("scipy", t_sp, res_sp), ("qp", t_qp, res_qp)):
+                d_fun = res.fun - res_sp.fun
+                d_w = np.max(np.abs(res.x - res_sp.x))
+                print(f"{name:<16s}{p:>6d}{label:>8s}{t:>10.3f}{res.get('nit', -1):>8d}"
+                      f"{str(res.success):>9s}{d_fun:>12.2e}{d_w:>10.4f}")
+            print(f"{name:<16s}{p:>6d} speedup = {SFG(f'{t_sp / t_qp:.1f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for qtools_sxzq.qoptimization.COptimizerRolling
+
+mean and covariance of each date are estimated from a rolling window of synthetic returns,
+so they change slowly from date to date, like a daily rebalance. Compare cold starts for
+each date with warm starts, and warm starts in a process pool, report time, function
+evaluations and the gap of objective values.
+
+usage:
+    python benchmarks/bench_qoptimization_rolling.py --dates 250 --assets 30 --n-jobs 4
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from qtools_sxzq.qoptimization import COptimizerRolling, COptimizerPortfolioUtility, COptimizerPortfolioSharpe
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+def make_moments(n_dates: int, p: int, win: int, seed: int) -> tuple[list[str], list[np.ndarray], list[np.ndarray]]:
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0, 0.01, (n_dates + win, 1))
+    rtn = factor @ rng.uniform(0.5, 1.5, (1, p)) + rng.normal(0.0005, 0.015, (n_dates + win, p))
+    rtn_df = pd.DataFrame(rtn)
+    ms = [rtn_df.iloc[i:i + win].mean().to_numpy() * 250 for i in range(n_dates)]
+    vs = [rtn_df.iloc[i:i + win].cov().to_numpy() * 250 for i in range(n_dates)]
+    dates = pd.bdate_range("2020-01-01", periods=n_dates).strftime("%Y%m%d").tolist()
+    return dates, ms, vs
+
+
+def run(rolling: COptimizerRolling, dates, ms, vs) -> tuple[float, pd.DataFrame, pd.DataFrame]:
+    t0 = time.perf_counter()
+    weights, diagnostics = rolling.optimize(dates, ms, vs)
+    return time.perf_counter() - t0, weights, diagnostics
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for rolling optimization")
+    args_parser.add_argument("--dates", type=int, default=250, help="number of rebalance dates")
+    args_parser.add_argument("--assets", type=int, default=30, help="number of assets")
+    args_parser.add_argument("--win", type=int, default=60, help="window to estimate mean and covariance")
+    args_parser.add_argument("--n-jobs", type=int, default=4, help="processes for the parallel run")
+    args = args_parser.parse_args()
+
+    dates, ms, vs = make_moments(args.dates, args.assets, args.win, seed=0)
+    bounds = [(0.0, 0.2)] * args.assets
+    problems = {
+        "utility": (COptimizerPortfolioUtility, {"lbd": 20, "bounds": bounds}),
+        "sharpe": (COptimizerPortfolioSharpe, {"bounds": bounds}),
+    }
+    print(f"dates = {SFY(args.dates)}, assets = {SFY(args.assets)}")
+    for name, (opt_type, opt_kwargs) in problems.items():
+        block_size = -(-args.dates // args.n_jobs)
+        t_cold, w_cold, d_cold = run(COptimizerRolling(opt_type, opt_kwargs, warm_start=False), dates, ms, vs)
+        t_warm, w_warm, d_warm = run(COptimizerRolling(opt_type, opt_kwargs, block_size=args.dates), dates, ms, vs)
+        t_para, w_para, d_para = run(
+            COptimizerRolling(opt_type, opt_kwargs, n_jobs=args.n_jobs, block_size=block_size), dates, ms, vs
+        )
+        print(f"--- {SFY(name)} ---")
+        print(f"{'':<10s}{'time(s)':>10s}{'nfev':>10s}{'success':>10s}{'max|dFun|':>12s}{'max|dW|':>10s}")
+        for label, t, w, d in (("cold", t_cold, w_cold, d_cold), ("warm", t_warm, w_warm, d_warm),
+                               (f"warm x{args.n_jobs}", t_para, w_para, d_para)):
+            d_fun = (d["fun"] - d_cold["fun"]).abs().max()
+            d_w = (w - w_cold).abs().max().max()
+            print(f"{label:<10s}{t:>10.2f}{d['nfev'].sum():>10d}{d['success'].mean():>10.1%}{d_fun:>12.2e}{d_w:>10.4f}")
+        print(f"speedup = {SFG(f'{t_cold / t_para:.1f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
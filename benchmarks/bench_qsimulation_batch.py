@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for CSimulationBatch
+
+simulate many signals on the same synthetic data with different numbers of
+worker processes, and report throughput (signals per second) of each.
+
+usage:
+    python benchmarks/bench_qsimulation_batch.py --signals 64 --days 1500 --instruments 60
+"""
+
+import os
+import argparse
+import tempfile
+import time
+import qtools_sxzq.qsimulation as qsim
+from qtools_sxzq.qcalendar import CCalendar
+from qtools_sxzq.qwidgets import SFG, SFY
+from sim_data import make_sim_tables, install_fetch, DESC_DOM, DESC_MKT, DESC_SIG
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for CSimulationBatch")
+    args_parser.add_argument("--signals", type=int, default=64, help="signals to simulate")
+    args_parser.add_argument("--days", type=int, default=1500, help="trade dates to simulate")
+    args_parser.add_argument("--instruments", type=int, default=60, help="instruments in universe")
+    args = args_parser.parse_args()
+
+    tables = make_sim_tables(args.days, args.instruments, signals=args.signals)
+    install_fetch(tables)
+    n_jobs_list = sorted({1, 2, 4, 8, os.cpu_count()} & set(range(1, os.cpu_count() + 1)))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        calendar = CCalendar(tables.save_calendar(tmp_dir))
+        batch = qsim.CSimulationBatch(
+            signals=[qsim.CSignal(f"sig{s:03d}", DESC_SIG) for s in range(args.signals)],
+            init_cash=1e8,
+            cost_rate=3e-4,
+            exe_price_type=qsim.TExePriceType.OPEN,
+            mgr_maj_contract=qsim.CMgrMajContract(tables.universe, DESC_DOM),
+            mgr_mkt_data=qsim.CMgrMktDataColumnar(DESC_MKT),
+            sim_save_dir=tmp_dir,
+            vid="bench",
+        )
+        throughputs = {}
+        for n_jobs in n_jobs_list:
+            t0 = time.perf_counter()
+            summary = batch.main(calendar.trade_dates[1], calendar.last_date, calendar, n_jobs=n_jobs)
+            throughputs[n_jobs] = len(summary) / (time.perf_counter() - t0)
+
+    print(f"signals = {SFY(args.signals)}, days = {SFY(args.days)}, instruments = {SFY(args.instruments)}")
+    for n_jobs, throughput in throughputs.items():
+        print(
+            f"n_jobs = {n_jobs:>3d}: {throughput:>8.2f} signals/s, "
+            f"scaling = {SFG(f'{throughput / throughputs[1]:.2f}x')}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+"""
+Equivalence check and benchmark for CSimulationVectorized
+
+run CSimulation and CSimulationVectorized on the same synthetic data, check the saved
+nav files are exactly the same, and report the time of each engine.
+Then inject a NaN weight and a NaN close price, and check both engines raise the same error.
+
+usage:
+    python benchmarks/bench_qsimulation_engine.py --days 2500 --instruments 80
+"""
+
+import os
+import argparse
+import tempfile
+import time
+import numpy as np
+import qtools_sxzq.qsimulation as qsim
+from qtools_sxzq.qcalendar import CCalendar
+from qtools_sxzq.qwidgets import SFG, SFY
+from sim_data import CSimTables, make_sim_tables, install_fetch, DESC_DOM, DESC_MKT, DESC_SIG
+
+
+def run_engine(sim_cls, mgrs: tuple, calendar: CCalendar, save_dir: str, vid: str) -> tuple[float, bytes]:
+    mgr_maj_contract, mgr_mkt_data, signal = mgrs
+    sim = sim_cls(
+        signal=signal,
+        init_cash=1e8,
+        cost_rate=3e-4,
+        exe_price_type=qsim.TExePriceType.OPEN,
+        mgr_maj_contract=mgr_maj_contract,
+        mgr_mkt_data=mgr_mkt_data,
+        sim_save_dir=save_dir,
+        vid=vid,
+    )
+    t0 = time.perf_counter()
+    sim.main(bgn_date=calendar.trade_dates[1], stp_date=calendar.last_date, calendar=calendar)
+    t1 = time.perf_counter()
+    with open(os.path.join(save_dir, f"hsim_{sim.save_id}.{vid}.csv"), "rb") as f:
+        return t1 - t0, f.read()
+
+
+def make_mgrs(tables: CSimTables) -> tuple:
+    return (
+        qsim.CMgrMajContract(tables.universe, DESC_DOM),
+        qsim.CMgrMktDataColumnar(DESC_MKT),
+        qsim.CSignal("sig000", DESC_SIG),
+    )
+
+
+def run_engine_error(sim_cls, tables: CSimTables, dropna: bool, calendar: CCalendar, save_dir: str) -> str:
+    install_fetch(tables, dropna=dropna)
+    try:
+        run_engine(sim_cls, make_mgrs(tables), calendar, save_dir, "err")
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return "ok"
+
+
+def check_nan_cases(tables: CSimTables, calendar: CCalendar, save_dir: str):
+    nan_close = CSimTables(**vars(tables))
+    nan_close.mkt = tables.mkt.copy()
+    nan_close.mkt.loc[nan_close.mkt["datetime"] == nan_close.mkt["datetime"].iloc[5], "close"] = np.nan
+    cases = {
+        "NaN weight": (tables, False),
+        "NaN close": (nan_close, True),
+    }
+    for name, (case_tables, dropna) in cases.items():
+        err_obj = run_engine_error(qsim.CSimulation, case_tables, dropna, calendar, save_dir)
+        err_vec = run_engine_error(qsim.CSimulationVectorized, case_tables, dropna, calendar, save_dir)
+        if err_obj == "ok" or err_obj != err_vec:
+            raise ValueError(f"{name}: CSimulation -> {err_obj}, CSimulationVectorized -> {err_vec}")
+        print(f"{name:<12s}: both engines raise {SFG(err_obj)}")
+    install_fetch(tables)
+    return 0
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Equivalence check and benchmark for CSimulationVectorized")
+    args_parser.add_argument("--days", type=int, default=2500, help="trade dates to simulate")
+    args_parser.add_argument("--instruments", type=int, default=80, help="instruments in universe")
+    args = args_parser.parse_args()
+
+    tables = make_sim_tables(args.days, args.instruments)
+    install_fetch(tables)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        calendar = CCalendar(tables.save_calendar(tmp_dir))
+        mgrs = make_mgrs(tables)
+        t_obj, nav_obj = run_engine(qsim.CSimulation, mgrs, calendar, tmp_dir, "obj")
+        t_vec, nav_vec = run_engine(qsim.CSimulationVectorized, mgrs, calendar, tmp_dir, "vec")
+        check_nan_cases(tables, calendar, tmp_dir)
+
+    if nav_obj != nav_vec:
+        raise ValueError("nav files of CSimulation and CSimulationVectorized are not the same")
+    print(f"nav files are {SFG('the same')}, days = {SFY(args.days)}, instruments = {SFY(args.instruments)}")
+    print(f"CSimulation           : {t_obj:>8.2f}s")
+    print(f"CSimulationVectorized : {t_vec:>8.2f}s, speedup = {SFG(f'{t_obj / t_vec:.1f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
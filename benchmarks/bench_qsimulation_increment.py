@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""
+Equivalence check and benchmark for CSimulation.main_increment
+
+for both engines, simulate the same synthetic data by main, and by main_increment up to
+a split date and then to the end, check the nav files are exactly the same.
+Then change market data before the checkpoint, check main_increment runs the full simulation
+again, and its nav file is the same as the one from main on the changed data.
+
+usage:
+    python benchmarks/bench_qsimulation_increment.py --days 1500 --instruments 40 --split 1200
+"""
+
+import os
+import argparse
+import tempfile
+import time
+import qtools_sxzq.qsimulation as qsim
+from qtools_sxzq.qcalendar import CCalendar
+from qtools_sxzq.qwidgets import SFG, SFY
+from sim_data import CSimTables, make_sim_tables, install_fetch, DESC_DOM, DESC_MKT, DESC_SIG
+
+
+def make_sim(sim_cls, tables: CSimTables, save_dir: str) -> qsim.CSimulation:
+    install_fetch(tables)
+    return sim_cls(
+        signal=qsim.CSignal("sig000", DESC_SIG),
+        init_cash=1e8,
+        cost_rate=3e-4,
+        exe_price_type=qsim.TExePriceType.OPEN,
+        mgr_maj_contract=qsim.CMgrMajContract(tables.universe, DESC_DOM),
+        mgr_mkt_data=qsim.CMgrMktDataColumnar(DESC_MKT),
+        sim_save_dir=save_dir,
+        vid="inc",
+    )
+
+
+def read_nav(sim: qsim.CSimulation) -> bytes:
+    with open(os.path.join(sim.sim_save_dir, f"hsim_{sim.save_id}.{sim.vid}.csv"), "rb") as f:
+        return f.read()
+
+
+def check_reason(sim: qsim.CSimulation, bgn_date: str, stp_date: str, calendar: CCalendar, verify_years: int) -> str:
+    sig_dates, exe_dates = sim.gen_sig_exe_dates(bgn_date, stp_date, calendar)
+    return sim.check_checkpoint(sim.load_checkpoint(), sig_dates, exe_dates, verify_years)
+
+
+def check_engine(sim_cls, tables: CSimTables, calendar: CCalendar, split: int, verify_years: int, tmp_dir: str):
+    bgn_date, mid_date, stp_date = calendar.trade_dates[1], calendar.trade_dates[split], calendar.last_date
+    name = sim_cls.__name__
+
+    # --- resume from the checkpoint
+    sim = make_sim(sim_cls, tables, os.path.join(tmp_dir, f"{name}_full"))
+    t0 = time.perf_counter()
+    sim.main(bgn_date, stp_date, calendar)
+    t_full = time.perf_counter() - t0
+    nav_full = read_nav(sim)
+
+    save_dir = os.path.join(tmp_dir, f"{name}_increment")
+    make_sim(sim_cls, tables, save_dir).main_increment(bgn_date, mid_date, calendar, verify_years=verify_years)
+    sim = make_sim(sim_cls, tables, save_dir)
+    if reason := check_reason(sim, bgn_date, stp_date, calendar, verify_years):
+        raise ValueError(f"{name}: checkpoint is not used, because {reason}")
+    t0 = time.perf_counter()
+    sim.main_increment(bgn_date, stp_date, calendar, verify_years=verify_years)
+    t_resume = time.perf_counter() - t0
+    if read_nav(sim) != nav_full:
+        raise ValueError(f"{name}: nav files of main and main_increment are not the same")
+
+    # --- data before the checkpoint is changed, on the day before it, so it is verified for any verify_years
+    changed = CSimTables(**vars(tables))
+    changed.mkt = tables.mkt.copy()
+    is_changed = changed.mkt["datetime"] == changed.mkt["datetime"].iloc[split - 1]
+    changed.mkt.loc[is_changed, ["open", "close", "settle"]] *= 1.01
+    sim = make_sim(sim_cls, changed, os.path.join(tmp_dir, f"{name}_changed_full"))
+    sim.main(bgn_date, stp_date, calendar)
+    nav_changed = read_nav(sim)
+
+    save_dir = os.path.join(tmp_dir, f"{name}_changed_increment")
+    make_sim(sim_cls, tables, save_dir).main_increment(bgn_date, mid_date, calendar, verify_years=verify_years)
+    sim = make_sim(sim_cls, changed, save_dir)
+    if not check_reason(sim, bgn_date, stp_date, calendar, verify_years):
+        raise ValueError(f"{name}: data before the checkpoint is changed, but the checkpoint is still used")
+    sim.main_increment(bgn_date, stp_date, calendar, verify_years=verify_years)
+    if read_nav(sim) != nav_changed:
+        raise ValueError(f"{name}: nav files of main and main_increment are not the same after data is changed")
+    if nav_changed == nav_full:
+        raise ValueError(f"{name}: changed data does not change the nav, the check is meaningless")
+
+    print(f"{name:<22s}: nav files are {SFG('the same')}, full = {t_full:>6.2f}s, "
+          f"resume = {t_resume:>6.2f}s, speedup = {SFG(f'{t_full / t_resume:.1f}x')}")
+    return 0
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Equivalence check and benchmark for main_increment")
+    args_parser.add_argument("--days", type=int, default=1500, help="trade dates to simulate")
+    args_parser.add_argument("--instruments", type=int, default=40, help="instruments in universe")
+    args_parser.add_argument("--split", type=int, default=1200, help="index of the trade date of the checkpoint")
+    args_parser.add_argument("--verify-years", type=int, default=None, help="see main_increment")
+    args = args_parser.parse_args()
+    if not (1 < args.split < args.days - 1):
+        raise ValueError(f"split = {args.split}, it must be in (1, days - 1)")
+
+    tables = make_sim_tables(args.days, args.instruments)
+    print(f"days = {SFY(args.days)}, instruments = {SFY(args.instruments)}, split = {SFY(args.split)}, "
+          f"verify years = {SFY(args.verify_years)}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        calendar = CCalendar(tables.save_calendar(tmp_dir))
+        for sim_cls in (qsim.CSimulation, qsim.CSimulationVectorized):
+            check_engine(sim_cls, tables, calendar, args.split, args.verify_years, tmp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    main()
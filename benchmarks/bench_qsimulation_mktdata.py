@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for market data managers in qtools_sxzq.qsimulation
+
+compare CMgrMktDataColumnar with CMgrMktData on a synthetic futures table, report
+retained memory, load time, per-lookup latency of get_md and latency of get_md_batch.
+qsimulation.fetch is replaced by a function returning the synthetic table, so no
+database is required.
+
+usage:
+    python benchmarks/bench_qsimulation_mktdata.py --days 2500 --instruments 60
+"""
+
+import argparse
+import random
+import time
+import timeit
+import tracemalloc
+import numpy as np
+import pandas as pd
+import qtools_sxzq.qsimulation as qsim
+from qtools_sxzq.qdata import CDataDescriptor
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+def make_mkt_data(days: int, instruments: int, contracts_per_day: int = 6) -> pd.DataFrame:
+    """
+    each instrument has contracts_per_day contracts listed every day, one of them
+    is delisted and a new one is listed every 20 trade dates.
+    """
+    dates = pd.bdate_range("2010-01-01", periods=days) + pd.Timedelta(hours=15)
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(instruments):
+        for k in range(days // 20 + contracts_per_day):
+            bgn, end = max(k - contracts_per_day, 0) * 20, min(k * 20, days)
+            if bgn >= end:
+                continue
+            n = end - bgn
+            close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+            frames.append(pd.DataFrame({
+                "datetime": dates[bgn:end],
+                "code": f"I{i:02d}{k:04d}_SHF",
+                "open": close * (1 + rng.normal(0, 0.003, n)),
+                "close": close,
+                "settle": close,
+                "contractmultiplier": 10,
+            }))
+    return pd.concat(frames, axis=0, ignore_index=True)
+
+
+def measure_load(cls, fmd: CDataDescriptor) -> tuple[object, float, float]:
+    """
+
+    :return: manager, load time in seconds, retained memory in MB
+    """
+    t0 = time.perf_counter()
+    cls(fmd)
+    t1 = time.perf_counter()
+
+    # trace memory in a second construction, tracemalloc slows down the construction
+    tracemalloc.start()
+    base_mem, _ = tracemalloc.get_traced_memory()
+    mgr = cls(fmd)
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return mgr, t1 - t0, (mem - base_mem) / 1024 ** 2
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for market data managers")
+    args_parser.add_argument("--days", type=int, default=2500, help="trade dates in market data")
+    args_parser.add_argument("--instruments", type=int, default=60, help="instruments in market data")
+    args_parser.add_argument("--repeat", type=int, default=100000, help="calls for lookup benchmark")
+    args = args_parser.parse_args()
+
+    mkt_data = make_mkt_data(args.days, args.instruments)
+    qsim.fetch = lambda lib, table, names, conds: mkt_data.copy()
+    fmd = CDataDescriptor(
+        db_name="meta_data", table_name="future_bar_1day", codes=[],
+        fields=["open", "close", "settle", "contractmultiplier"], lag=0, data_view_type="data3d",
+    )
+    print(f"market data rows = {SFY(len(mkt_data))}")
+
+    mgr_dict, t_dict, m_dict = measure_load(qsim.CMgrMktData, fmd)
+    mgr_cols, t_cols, m_cols = measure_load(qsim.CMgrMktDataColumnar, fmd)
+
+    keys = mkt_data[["datetime", "code"]].sample(n=1000, random_state=0)
+    keys = list(zip(keys["datetime"].dt.strftime("%Y%m%d"), keys["code"]))
+    for trade_date, contract in keys:
+        if mgr_dict.get_md(trade_date, contract, "close") != mgr_cols.get_md(trade_date, contract, "close"):
+            raise ValueError(f"results of get_md are not the same at ({trade_date}, {contract})")
+
+    def lookup(mgr):
+        trade_date, contract = random.choice(keys)
+        return mgr.get_md(trade_date, contract, "close")
+
+    random.seed(0)
+    l_dict = timeit.timeit(lambda: lookup(mgr_dict), number=args.repeat) / args.repeat * 1e9
+    random.seed(0)
+    l_cols = timeit.timeit(lambda: lookup(mgr_cols), number=args.repeat) / args.repeat * 1e9
+
+    trade_date = keys[0][0]
+    contracts = mkt_data.loc[mkt_data["datetime"].dt.strftime("%Y%m%d") == trade_date, "code"].tolist()
+    batch_repeat = max(args.repeat // len(contracts), 1)
+    b_dict = timeit.timeit(
+        lambda: mgr_dict.get_md_batch(trade_date, contracts, "close"), number=batch_repeat) / batch_repeat * 1e6
+    b_cols = timeit.timeit(
+        lambda: mgr_cols.get_md_batch(trade_date, contracts, "close"), number=batch_repeat) / batch_repeat * 1e6
+
+    print(f"{'':<24s} {'CMgrMktData':>14s} {'Columnar':>14s} {'ratio':>8s}")
+    print(f"{'memory(MB)':<24s} {m_dict:>14.1f} {m_cols:>14.1f} {SFG(f'{m_dict / m_cols:>7.1f}x')}")
+    print(f"{'load time(s)':<24s} {t_dict:>14.2f} {t_cols:>14.2f} {SFG(f'{t_dict / t_cols:>7.1f}x')}")
+    print(f"{'get_md(ns)':<24s} {l_dict:>14.0f} {l_cols:>14.0f} {SFG(f'{l_dict / l_cols:>7.1f}x')}")
+    print(f"{f'get_md_batch[{len(contracts)}](us)':<24s} {b_dict:>14.1f} {b_cols:>14.1f} "
+          f"{SFG(f'{b_dict / b_cols:>7.1f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
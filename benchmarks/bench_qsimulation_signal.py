@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for signal readers in qtools_sxzq.qsimulation
+
+compare CSignalMatrix with CSignal on a synthetic dense daily signal table, report
+retained memory, load time, latency of get_signal and get_signal_batch.
+CSignalMatrix with float64 is checked to return exactly the same signals as CSignal.
+
+usage:
+    python benchmarks/bench_qsimulation_signal.py --days 2500 --instruments 80
+"""
+
+import argparse
+import timeit
+import numpy as np
+import qtools_sxzq.qsimulation as qsim
+from qtools_sxzq.qwidgets import SFG, SFY
+from sim_data import make_sim_tables, install_fetch, DESC_SIG
+from bench_qsimulation_mktdata import measure_load
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for signal readers")
+    args_parser.add_argument("--days", type=int, default=2500, help="trade dates in signal table")
+    args_parser.add_argument("--instruments", type=int, default=80, help="instruments in signal table")
+    args_parser.add_argument("--repeat", type=int, default=20000, help="calls for lookup benchmark")
+    args = args_parser.parse_args()
+
+    tables = make_sim_tables(args.days, args.instruments)
+    install_fetch(tables)
+    print(f"signal rows = {SFY(len(tables.sig))}")
+
+    mgr_dict, t_dict, m_dict = measure_load(lambda fmd: qsim.CSignal("sig000", fmd), DESC_SIG)
+    mgr_mtrx, t_mtrx, m_mtrx = measure_load(lambda fmd: qsim.CSignalMatrix("sig000", fmd), DESC_SIG)
+    mgr_f064 = qsim.CSignalMatrix("sig000", DESC_SIG, dtype=np.float64)
+
+    trade_dates = list(mgr_dict.signal)
+    for trade_date in trade_dates:
+        sigs_dict, sigs_f064 = mgr_dict.get_signal(trade_date), mgr_f064.get_signal(trade_date)
+        if list(sigs_dict.items()) != list(sigs_f064.items()):
+            raise ValueError(f"results of get_signal are not the same at {trade_date}")
+
+    lookup_dates = [trade_dates[i] for i in np.random.default_rng(0).integers(0, len(trade_dates), args.repeat)]
+    l_dict = timeit.timeit(lambda: [mgr_dict.get_signal(d) for d in lookup_dates], number=1) / args.repeat * 1e6
+    l_mtrx = timeit.timeit(lambda: [mgr_mtrx.get_signal(d) for d in lookup_dates], number=1) / args.repeat * 1e6
+    b_dict = timeit.timeit(lambda: [mgr_dict.get_signal_batch(d) for d in lookup_dates], number=1) / args.repeat * 1e6
+    b_mtrx = timeit.timeit(lambda: [mgr_mtrx.get_signal_batch(d) for d in lookup_dates], number=1) / args.repeat * 1e6
+
+    print(f"results of CSignalMatrix(float64) and CSignal are {SFG('the same')}")
+    print(f"{'':<24s} {'CSignal':>14s} {'CSignalMatrix':>14s} {'ratio':>8s}")
+    print(f"{'memory(MB)':<24s} {m_dict:>14.1f} {m_mtrx:>14.1f} {SFG(f'{m_dict / m_mtrx:>7.1f}x')}")
+    print(f"{'load time(s)':<24s} {t_dict:>14.2f} {t_mtrx:>14.2f} {SFG(f'{t_dict / t_mtrx:>7.1f}x')}")
+    print(f"{'get_signal(us)':<24s} {l_dict:>14.1f} {l_mtrx:>14.1f} {SFG(f'{l_dict / l_mtrx:>7.1f}x')}")
+    print(f"{'get_signal_batch(us)':<24s} {b_dict:>14.1f} {b_mtrx:>14.1f} {SFG(f'{b_dict / b_mtrx:>7.1f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for qtools_sxzq.qsqlite.CMgrSqlDb.update
+
+Write the same factor table by the legacy per-row loop, by executemany in chunks
+(update), and by executemany with CMgrSqlDb.BULK_PRAGMAS, report rows per second and check
+the tables are the same.
+
+usage:
+    python benchmarks/bench_qsqlite_update.py --rows 1000000 --factors 10 --chunk-size 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import sqlite3 as sql3
+from qtools_sxzq.qsqlite import CMgrSqlDb, CSqlTable, CSqlVar
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+def update_by_rows(db: CMgrSqlDb, update_data: pd.DataFrame, using_index: bool = False):
+    """
+    the legacy implementation of CMgrSqlDb.update, every row is written by one execute
+    """
+
+    if db.check_permission():
+        cmd_upd = db.table.cmd_sql_upd
+        with sql3.connect(db.db_path) as connection:
+            cursor = connection.cursor()
+            for data_cell in update_data.itertuples(index=using_index):  # itertuples is much faster than iterrows
+                cursor.execute(cmd_upd, data_cell)
+            connection.commit()
+        connection.close()
+    return 0
+
+
+def make_data(n_rows: int, n_factors: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n_instruments = 500
+    n_dates = -(-n_rows // n_instruments)
+    dates = pd.bdate_range("2012-01-01", periods=n_dates).strftime("%Y%m%d")
+    df = pd.DataFrame({
+        "trade_date": np.repeat(dates, n_instruments)[:n_rows],
+        "instrument": np.tile([f"I{i:04d}" for i in range(n_instruments)], n_dates)[:n_rows],
+    })
+    for j in range(n_factors):
+        df[f"F{j:02d}"] = rng.normal(size=n_rows)
+    return df
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for CMgrSqlDb.update")
+    args_parser.add_argument("--rows", type=int, default=1000000, help="number of rows")
+    args_parser.add_argument("--factors", type=int, default=10, help="number of factor columns")
+    args_parser.add_argument("--chunk-size", type=int, default=100000, help="rows of each executemany")
+    args = args_parser.parse_args()
+
+    df = make_data(args.rows, args.factors, seed=0)
+    table = CSqlTable(
+        name="factors",
+        primary_keys=[CSqlVar("trade_date", "TEXT"), CSqlVar("instrument", "TEXT")],
+        value_columns=[CSqlVar(c, "REAL") for c in df.columns[2:]],
+    )
+    print(f"rows = {SFY(args.rows)}, factors = {SFY(args.factors)}, chunk size = {SFY(args.chunk_size)}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writers = {
+            "per row": lambda db: update_by_rows(db, df),
+            "executemany": lambda db: db.update(df, chunk_size=args.chunk_size),
+            "executemany+pragma": lambda db: db.update(df, chunk_size=args.chunk_size, pragmas=CMgrSqlDb.BULK_PRAGMAS),
+        }
+        speeds, reads = {}, {}
+        for label, write in writers.items():
+            db = CMgrSqlDb(db_save_dir=tmp_dir, db_name=f"{label.replace(' ', '_')}.db", table=table, mode="w")
+            t0 = time.perf_counter()
+            write(db)
+            speeds[label] = args.rows / (time.perf_counter() - t0)
+            reads[label] = db.read()
+            size = os.path.getsize(db.db_path) / 2 ** 20
+            print(f"{label:<20s}{speeds[label]:>12,.0f} rows/s{size:>10.1f}MB")
+        for label in writers:
+            same = reads[label].equals(reads["per row"])
+            speedup = speeds[label] / speeds["per row"]
+            print(f"{label:<20s} same as per row = {same}, speedup = {SFG(f'{speedup:.1f}x')}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
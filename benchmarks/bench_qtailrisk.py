@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for VaR of qtools_sxzq.qtailrisk
+
+compare cal_var_es with np.percentile for each q (the legacy CNAV.cal_value_at_risk),
+VaR of both are checked to be exactly the same before timing. The error of the
+streaming estimator CTailRiskStream is reported too.
+
+usage:
+    python benchmarks/bench_qtailrisk.py --length 2500 --series 200
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from qtools_sxzq.qtailrisk import cal_var_es, cal_tail_risk, CTailRiskStream
+from qtools_sxzq.qwidgets import SFG, SFY
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Benchmark for VaR and ES")
+    args_parser.add_argument("--length", type=int, default=2500, help="length of each return series")
+    args_parser.add_argument("--series", type=int, default=200, help="number of return series")
+    args_parser.add_argument("--stream", type=int, default=200000, help="length of series for streaming")
+    args = args_parser.parse_args()
+
+    qs = (1, 2, 5, 10)
+    rng = np.random.default_rng(0)
+    rtn = rng.standard_t(4, size=(args.length, args.series)) * 0.01
+
+    t0 = time.perf_counter()
+    legacy = np.array([[np.percentile(rtn[:, j], q) for q in qs] for j in range(args.series)]).T
+    t1 = time.perf_counter()
+    each = np.array([cal_var_es(rtn[:, j], qs)[0] for j in range(args.series)]).T
+    t2 = time.perf_counter()
+    var, _ = cal_var_es(rtn, qs)
+    t3 = time.perf_counter()
+    if not (np.array_equal(legacy, each) and np.array_equal(legacy, var)):
+        raise ValueError("results of VaR are not the same")
+
+    print(f"results are {SFG('the same')}, length = {SFY(args.length)}, series = {SFY(args.series)}, qs = {qs}")
+    print(f"np.percentile for each q : {(t1 - t0) * 1e3:>8.2f} ms")
+    print(f"cal_var_es for each series: {(t2 - t1) * 1e3:>8.2f} ms, speedup = {SFG(f'{(t1 - t0) / (t2 - t1):.1f}x')}")
+    print(f"cal_var_es for the matrix : {(t3 - t2) * 1e3:>8.2f} ms, speedup = {SFG(f'{(t1 - t0) / (t3 - t2):.1f}x')}")
+
+    stream_rtn = rng.standard_t(4, size=args.stream) * 0.001
+    t0 = time.perf_counter()
+    stream = CTailRiskStream(qs)
+    stream.update_batch(stream_rtn)
+    t1 = time.perf_counter()
+    exact, approx = cal_tail_risk(pd.Series(stream_rtn), qs), pd.Series(stream.to_dict())
+    print(f"CTailRiskStream, length = {SFY(args.stream)}, {(t1 - t0) / args.stream * 1e6:.2f} us/update")
+    print(pd.DataFrame({"exact": exact, "stream": approx, "relErr": approx / exact - 1}))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Synthetic tables for benchmarks of qtools_sxzq.qsimulation
+
+make_sim_tables() generates market data, major contracts and signals of some futures,
+install_fetch() replaces qsimulation.fetch by a function querying these tables, so the
+Transquant adapters (CMgrMajContract, CMgrMktData, CSignal) work without any database.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import qtools_sxzq.qsimulation as qsim
+from dataclasses import dataclass
+from qtools_sxzq.qdata import CDataDescriptor
+
+
+@dataclass
+class CSimTables:
+    mkt: pd.DataFrame  # datetime, code, open, close, settle, contractmultiplier
+    dom: pd.DataFrame  # trade_day, dominant
+    sig: pd.DataFrame  # datetime, code, [signal names]
+    universe: list[str]
+    dates: pd.DatetimeIndex
+
+    def save_calendar(self, save_dir: str) -> str:
+        calendar_path = os.path.join(save_dir, "calendar.csv")
+        pd.DataFrame({"trade_date": self.dates.strftime("%Y-%m-%d")}).to_csv(calendar_path, index=False)
+        return calendar_path
+
+
+DESC_DOM = CDataDescriptor("meta_data", "dom", [], ["trade_day", "dominant"], 0, "data3d")
+DESC_MKT = CDataDescriptor("meta_data", "mkt", [], ["open", "close", "settle", "contractmultiplier"], 0, "data3d")
+DESC_SIG = CDataDescriptor("private", "sig", [], [], 0, "data3d")
+
+
+def make_sim_tables(days: int, instruments: int, signals: int = 1, seed: int = 0) -> CSimTables:
+    """
+    each instrument has 3 contracts listed every day, the dominant contract is shifted every 40 trade dates.
+    signals are named as "sig000", "sig001", ..., and about 10% of them are missing.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2012-01-04", periods=days)
+    timestamps = dates + pd.Timedelta(hours=15)
+    mkt, dom, sig = [], [], []
+    names = [chr(65 + i // 26) + chr(65 + i % 26) for i in range(instruments)]  # "AA", "AB", ...
+    universe = [f"{name}9999_SHF" for name in names]
+    for i, name in enumerate(names):
+        close = 1000 * (1 + i) * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+        m = np.arange(days) // 40
+        for j in (-1, 0, 1):
+            mkt.append(pd.DataFrame({
+                "datetime": timestamps,
+                "code": [f"{name}{1000 + k:04d}_SHF" for k in m + j],
+                "open": close * (1 + 0.01 * j) * (1 + rng.normal(0, 0.003, days)),
+                "close": close * (1 + 0.01 * j),
+                "settle": close * (1 + 0.01 * j),
+                "contractmultiplier": [5, 10, 20][i % 3],
+            }))
+        dom.append(pd.DataFrame({
+            "trade_day": dates.strftime("%Y-%m-%d"),
+            "dominant": [f"{name}{1000 + k:04d}_SHF" for k in m],
+        }))
+        weights = pd.DataFrame({"datetime": timestamps, "code": universe[i]})
+        for s in range(signals):
+            weights[f"sig{s:03d}"] = np.where(rng.random(days) > 0.1, rng.normal(0, 0.1, days), np.nan)
+        sig.append(weights)
+    mkt = pd.concat(mkt, ignore_index=True).drop_duplicates(subset=["datetime", "code"], keep="last")
+    return CSimTables(
+        mkt=mkt.reset_index(drop=True),
+        dom=pd.concat(dom, ignore_index=True),
+        sig=pd.concat(sig, ignore_index=True),
+        universe=universe,
+        dates=dates,
+    )
+
+
+def install_fetch(tables: CSimTables, dropna: bool = True):
+    """
+
+    :param dropna: drop the rows of signals with NaN, like a signal table which only saves valid values,
+                   set it to False to keep NaN weights and check how the engines handle them.
+    """
+
+    def fetch(lib: str, table: str, names, conds: str) -> pd.DataFrame:
+        df = {"mkt": tables.mkt, "dom": tables.dom, "sig": tables.sig}[table]
+        if isinstance(names, list):
+            df = df[[z.strip("`") for z in names]]
+        if table == "sig" and dropna:
+            df = df.dropna(axis=0, subset=[c for c in df.columns if c not in ("datetime", "code")], how="all")
+        if conds:
+            df = df.query(conds.replace("AND", "and").replace("datetime", "`datetime`"))
+        return df.reset_index(drop=True)
+
+    qsim.fetch = fetch
+    return 0
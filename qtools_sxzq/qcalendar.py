@@ -1,14 +1,101 @@
+import os
+import glob
+import hashlib
+import threading
 import datetime as dt
+import numpy as np
 import pandas as pd
+from typing import Union, Literal
+from dataclasses import dataclass
+from bisect import bisect_left, bisect_right
+
+TPeriod = Literal["week", "month", "quarter", "year"]
+
+
+@dataclass(frozen=True)
+class CPeriodTable:
+    """
+    boundaries of periods in a calendar, P = number of periods, N = number of trade dates
+    keys: key of each period, like "2024W03"(ISO week), "202403", "2024Q1", "2024", size = P
+    period_ids: period id of each trade date, size = N
+    first_sns: sn of the first trade date of each period, size = P
+    last_sns: sn of the last trade date of each period, size = P
+    """
+    period: TPeriod
+    keys: list[str]
+    period_ids: np.ndarray
+    first_sns: np.ndarray
+    last_sns: np.ndarray
+
+    @property
+    def days(self) -> np.ndarray:
+        # trade days of each period
+        return self.last_sns - self.first_sns + 1
 
 
 class CCalendar(object):
-    def __init__(self, calendar_path: str, header: int = 0):
+    def __init__(self, calendar_path: str, header: int = 0, use_cache: bool = False):
+        """
+
+        :param calendar_path: path of calendar csv file
+        :param header: row number of header, use None if there is no header in the csv file
+        :param use_cache: if True, trade dates are saved in a binary sidecar file in the same directory
+                          as the csv file, like ".calendar.csv.h0.{key}.npy". Later constructions read it
+                          by memory map instead of parsing the csv, the list and dict of trade dates
+                          are still built from it. The key is generated from path, mtime and size of
+                          the csv file and header, so the cache is invalidated automatically when the
+                          csv changes. trade_dates_array is read-only with or without the cache.
+        """
+        if use_cache:
+            self.__trade_dates_arr: np.ndarray = self.__load_with_cache(calendar_path, header)
+        else:
+            self.__trade_dates_arr: np.ndarray = self.__load_from_csv(calendar_path, header)
+        self.__trade_dates: list[str] = self.__trade_dates_arr.tolist()
+        self.__trade_sns: dict[str, int] = {d: i for i, d in enumerate(self.__trade_dates)}
+        self.__trade_dates_int: Union[np.ndarray, None] = None  # lazy, int32 like 20120104
+        self.__trade_dates_dt64: Union[np.ndarray, None] = None  # lazy, datetime64[D]
+        self.__period_tables: dict[str, CPeriodTable] = {}  # lazy, dict[period, CPeriodTable]
+
+    @staticmethod
+    def __load_from_csv(calendar_path: str, header: int) -> np.ndarray:
         if isinstance(header, int):
             calendar_df = pd.read_csv(calendar_path, dtype=str, header=header)
         else:
             calendar_df = pd.read_csv(calendar_path, dtype=str, header=None, names=["trade_date"])
-        self.__trade_dates = [_.replace("-", "") for _ in calendar_df["trade_date"]]
+        trade_dates = np.array([_.replace("-", "") for _ in calendar_df["trade_date"]])  # sorted
+        trade_dates.setflags(write=False)  # same as the memory mapped cache
+        return trade_dates
+
+    @staticmethod
+    def get_cache_path(calendar_path: str, header: int) -> str:
+        stat = os.stat(calendar_path)
+        src = f"{os.path.abspath(calendar_path)}|{stat.st_mtime_ns}|{stat.st_size}|{header}"
+        key = hashlib.md5(src.encode("utf-8")).hexdigest()[0:16]
+        calendar_dir, calendar_file = os.path.split(calendar_path)
+        return os.path.join(calendar_dir, f".{calendar_file}.h{header}.{key}.npy")
+
+    def __load_with_cache(self, calendar_path: str, header: int) -> np.ndarray:
+        cache_path = self.get_cache_path(calendar_path, header)
+        if os.path.exists(cache_path):
+            return np.asarray(np.load(cache_path, mmap_mode="r"))
+
+        trade_dates = self.__load_from_csv(calendar_path, header)
+        calendar_dir, calendar_file = os.path.split(calendar_path)
+        # caches of other headers are kept, they are still valid for their callers
+        stale_pattern = f".{glob.escape(calendar_file)}.h{header}.*.npy"
+        for stale_path in glob.glob(os.path.join(calendar_dir, stale_pattern)):
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass  # may be in use by other processes
+        try:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, trade_dates)
+            os.replace(tmp_path, cache_path)  # atomic, other processes never see a partial file
+        except OSError:
+            pass  # directory may be read-only, cache is optional
+        return trade_dates
 
     @property
     def last_date(self):
@@ -22,18 +109,61 @@ class CCalendar(object):
     def trade_dates(self) -> list[str]:
         return self.__trade_dates
 
+    @property
+    def trade_dates_array(self) -> np.ndarray:
+        return self.__trade_dates_arr
+
+    @property
+    def trade_dates_int(self) -> np.ndarray:
+        if self.__trade_dates_int is None:
+            self.__trade_dates_int = self.convert_d08s_to_ints(self.__trade_dates_arr)
+        return self.__trade_dates_int
+
+    @property
+    def trade_dates_dt64(self) -> np.ndarray:
+        if self.__trade_dates_dt64 is None:
+            self.__trade_dates_dt64 = self.convert_ints_to_dt64s(self.trade_dates_int)
+        return self.__trade_dates_dt64
+
+    def get_iter_array(
+            self, bgn_date: str, stp_date: str, date_type: Literal["str", "int", "dt64"] = "int",
+    ) -> np.ndarray:
+        """
+        array version of get_iter_list
+
+        :param bgn_date: format = "YYYYMMDD"
+        :param stp_date: format = "YYYYMMDD"
+        :param date_type: "str" for "YYYYMMDD", "int" for int32 like 20120104, "dt64" for datetime64[D]
+        :return:
+        """
+        bgn_sn, stp_sn = self.get_range_sns(bgn_date, stp_date)
+        if date_type == "str":
+            return self.__trade_dates_arr[bgn_sn:stp_sn]
+        elif date_type == "int":
+            return self.trade_dates_int[bgn_sn:stp_sn]
+        elif date_type == "dt64":
+            return self.trade_dates_dt64[bgn_sn:stp_sn]
+        else:
+            raise ValueError(f"date_type = {date_type} is illegal, options should from =('str', 'int', 'dt64')")
+
     def is_trade_date(self, d: str) -> bool:
-        return d in self.__trade_dates
+        return d in self.__trade_sns
+
+    def get_range_sns(self, bgn_date: str, stp_date: str) -> tuple[int, int]:
+        """
+
+        :param bgn_date: format = "YYYYMMDD", included
+        :param stp_date: format = "YYYYMMDD", excluded
+        :return: (bgn_sn, stp_sn), trade_dates[bgn_sn:stp_sn] are the trade dates in [bgn_date, stp_date)
+        """
+        bgn_sn = bisect_left(self.__trade_dates, bgn_date)
+        stp_sn = max(bisect_left(self.__trade_dates, stp_date), bgn_sn)
+        return bgn_sn, stp_sn
 
     def get_iter_list(self, bgn_date: str, stp_date: str, ascending: bool = True) -> list[str]:
-        res = []
-        for t_date in self.__trade_dates:
-            if t_date < bgn_date:
-                continue
-            if t_date >= stp_date:
-                break
-            res.append(t_date)
-        return res if ascending else sorted(res, reverse=True)
+        bgn_sn, stp_sn = self.get_range_sns(bgn_date, stp_date)
+        res = self.__trade_dates[bgn_sn:stp_sn]
+        return res if ascending else res[::-1]
 
     def shift_iter_dates(self, iter_dates: list[str], shift: int) -> list[str]:
         """
@@ -44,15 +174,66 @@ class CCalendar(object):
         :return:
         """
         if shift >= 0:
-            new_dates = [self.get_next_date(iter_dates[-1], shift=s) for s in range(1, shift + 1)]
+            last_sn = self.get_sn(iter_dates[-1])
+            new_dates = self.__trade_dates[last_sn + 1:last_sn + 1 + shift]
             shift_dates = iter_dates[shift:] + new_dates
         else:  # shift < 0
-            new_dates = [self.get_next_date(iter_dates[0], shift=s) for s in range(shift, 0)]
+            first_sn = self.get_sn(iter_dates[0])
+            new_dates = self.__trade_dates[max(first_sn + shift, 0):first_sn]
             shift_dates = new_dates + iter_dates[:shift]
+        if len(new_dates) < abs(shift):
+            raise IndexError(f"shift = {shift} is out of the range of calendar")
         return shift_dates
 
     def get_sn(self, base_date: str) -> int:
-        return self.__trade_dates.index(base_date)
+        try:
+            return self.__trade_sns[base_date]
+        except KeyError:
+            raise ValueError(f"{base_date} is not a trade date in calendar")
+
+    def get_sns(self, dates: Union[np.ndarray, pd.Series, pd.Index, list[str]]) -> np.ndarray:
+        """
+        vectorized version of get_sn
+
+        :param dates: trade dates, format = "YYYYMMDD"
+        :return: an int array with the same length as dates
+        """
+        q = np.asarray(dates).astype(self.__trade_dates_arr.dtype)
+        sns = np.searchsorted(self.__trade_dates_arr, q)
+        found = self.__trade_dates_arr[np.minimum(sns, len(self.__trade_dates_arr) - 1)] == q
+        if not np.all(found):
+            raise ValueError(f"{q[~found][0]} is not a trade date in calendar")
+        return sns
+
+    def shift_dates(
+            self,
+            dates: Union[np.ndarray, pd.Series, pd.Index, list[str]],
+            shift: Union[int, np.ndarray],
+            fill_value: str = "",
+    ) -> Union[np.ndarray, pd.Series, pd.Index]:
+        """
+        vectorized version of get_next_date, shift a whole array of trade dates in one pass
+
+        :param dates: trade dates, format = "YYYYMMDD"
+        :param shift: an integer for all dates, or an integer array with the same length as dates.
+                      > 0, get date in the future; < 0, get date in the past
+        :param fill_value: the sentinel for the dates shifted out of the range of calendar
+        :return: a pd.Series (with the same index) if dates is a pd.Series,
+                 a pd.Index if dates is a pd.Index,
+                 else a np.ndarray
+        """
+        new_sns = self.get_sns(dates) + np.asarray(shift, dtype=int)
+        is_in = (new_sns >= 0) & (new_sns < len(self.__trade_dates_arr))
+        res = np.where(
+            is_in,
+            self.__trade_dates_arr[np.where(is_in, new_sns, 0)],
+            fill_value,
+        )
+        if isinstance(dates, pd.Series):
+            return pd.Series(data=res, index=dates.index, name=dates.name)
+        elif isinstance(dates, pd.Index):
+            return pd.Index(data=res, name=dates.name)
+        return res
 
     def get_date(self, sn: int) -> str:
         return self.__trade_dates[sn]
@@ -72,16 +253,98 @@ class CCalendar(object):
     def get_start_date(self, bgn_date: str, max_win: int, shift: int) -> str:
         return self.get_next_date(bgn_date, -max_win + shift)
 
-    def get_last_days_in_range(self, bgn_date: str, stp_date: str) -> list[str]:
-        res = []
-        for this_day, next_day in zip(self.__trade_dates[:-1], self.__trade_dates[1:]):
-            if this_day < bgn_date:
-                continue
-            elif this_day >= stp_date:
-                break
-            else:
-                if this_day[0:6] != next_day[0:6]:
-                    res.append(this_day)
+    def get_period_table(self, period: TPeriod) -> CPeriodTable:
+        """
+        period table is calculated only once, when it is called for the first time
+
+        :param period: "week", "month", "quarter" or "year"
+        :return:
+        """
+        if period in self.__period_tables:
+            return self.__period_tables[period]
+
+        d = self.trade_dates_int.astype(np.int64)
+        if period == "week":
+            # 1970-01-01 is a Thursday, so weeks start from Monday with a shift = 3
+            codes = (self.trade_dates_dt64.astype(np.int64) + 3) // 7
+        elif period == "month":
+            codes = d // 100
+        elif period == "quarter":
+            codes = d // 10000 * 10 + (d // 100 % 100 - 1) // 3 + 1
+        elif period == "year":
+            codes = d // 10000
+        else:
+            raise ValueError(f"period = {period} is illegal, options should from =('week', 'month', 'quarter', 'year')")
+
+        is_new = np.concatenate([[True], codes[1:] != codes[:-1]])
+        first_sns = np.flatnonzero(is_new)
+        last_sns = np.concatenate([first_sns[1:] - 1, [len(d) - 1]])
+        if period == "week":
+            iso = pd.DatetimeIndex(self.trade_dates_dt64[first_sns]).isocalendar()
+            keys = [f"{y:04d}W{w:02d}" for y, w in zip(iso["year"], iso["week"])]
+        elif period == "quarter":
+            keys = [f"{z // 10:04d}Q{z % 10:d}" for z in codes[first_sns]]
+        else:
+            keys = [f"{z}" for z in codes[first_sns]]
+        table = CPeriodTable(
+            period=period,
+            keys=keys,
+            period_ids=np.cumsum(is_new) - 1,
+            first_sns=first_sns,
+            last_sns=last_sns,
+        )
+        self.__period_tables[period] = table
+        return table
+
+    def get_period_key(self, trade_date: str, period: TPeriod) -> str:
+        table = self.get_period_table(period)
+        return table.keys[table.period_ids[self.get_sn(trade_date)]]
+
+    def __select_sns_in_range(self, sns: np.ndarray, bgn_date: str, stp_date: str) -> list[str]:
+        bgn_sn, stp_sn = self.get_range_sns(bgn_date, stp_date)
+        l, r = np.searchsorted(sns, [bgn_sn, stp_sn])
+        return self.__trade_dates_arr[sns[l:r]].tolist()
+
+    def get_last_days_in_range(self, bgn_date: str, stp_date: str, period: TPeriod = "month") -> list[str]:
+        """
+        the last trade date of the calendar is never included, because
+        it is unknown whether it is the last trade date of its period.
+
+        :param bgn_date: format = "YYYYMMDD", included
+        :param stp_date: format = "YYYYMMDD", excluded
+        :param period: "week", "month", "quarter" or "year"
+        :return: last trade date of each period in [bgn_date, stp_date)
+        """
+        return self.__select_sns_in_range(self.get_period_table(period).last_sns[:-1], bgn_date, stp_date)
+
+    def get_first_days_in_range(self, bgn_date: str, stp_date: str, period: TPeriod = "month") -> list[str]:
+        """
+        the first trade date of the calendar is never included, because
+        it is unknown whether it is the first trade date of its period.
+
+        :param bgn_date: format = "YYYYMMDD", included
+        :param stp_date: format = "YYYYMMDD", excluded
+        :param period: "week", "month", "quarter" or "year"
+        :return: first trade date of each period in [bgn_date, stp_date)
+        """
+        return self.__select_sns_in_range(self.get_period_table(period).first_sns[1:], bgn_date, stp_date)
+
+    def split_by_period(self, bgn_date: str, stp_date: str, period: TPeriod = "month") -> dict[str, list[str]]:
+        """
+
+        :param bgn_date: format = "YYYYMMDD", included
+        :param stp_date: format = "YYYYMMDD", excluded
+        :param period: "week", "month", "quarter" or "year"
+        :return: dict[period key, trade dates of this period in [bgn_date, stp_date)]
+        """
+        bgn_sn, stp_sn = self.get_range_sns(bgn_date, stp_date)
+        if bgn_sn >= stp_sn:
+            return {}
+        table = self.get_period_table(period)
+        res = {}
+        for pid in range(table.period_ids[bgn_sn], table.period_ids[stp_sn - 1] + 1):
+            l, r = max(table.first_sns[pid], bgn_sn), min(table.last_sns[pid] + 1, stp_sn)
+            res[table.keys[pid]] = self.__trade_dates[l:r]
         return res
 
     def get_last_day_of_month(self, month: str) -> str:
@@ -91,9 +354,9 @@ class CCalendar(object):
         """
 
         threshold = f"{month}31"
-        for t in self.__trade_dates[::-1]:
-            if t <= threshold:
-                return t
+        sn = bisect_right(self.__trade_dates, threshold) - 1
+        if sn >= 0:
+            return self.__trade_dates[sn]
         raise ValueError(f"Could not find last day for {month}")
 
     def get_first_day_of_month(self, month: str) -> str:
@@ -103,9 +366,9 @@ class CCalendar(object):
         """
 
         threshold = f"{month}01"
-        for t in self.__trade_dates:
-            if t >= threshold:
-                return t
+        sn = bisect_left(self.__trade_dates, threshold)
+        if sn < len(self.__trade_dates):
+            return self.__trade_dates[sn]
         raise ValueError(f"Could not find first day for {month}")
 
     @staticmethod
@@ -139,6 +402,46 @@ class CCalendar(object):
         # "20210-01-01" -> "20210101"
         return date.replace("-", "")
 
+    @staticmethod
+    def convert_d08_to_int(date: str) -> int:
+        # "20210101" -> 20210101
+        return int(date)
+
+    @staticmethod
+    def convert_int_to_d08(date: int) -> str:
+        # 20210101 -> "20210101"
+        return f"{date:08d}"
+
+    @staticmethod
+    def convert_d08s_to_ints(dates: Union[np.ndarray, pd.Series, list[str]]) -> np.ndarray:
+        # ["20210101", ...] -> [20210101, ...], dtype = np.int32
+        return np.asarray(dates).astype(np.int32)
+
+    @staticmethod
+    def convert_ints_to_d08s(dates: Union[np.ndarray, pd.Series, list[int]]) -> np.ndarray:
+        # [20210101, ...] -> ["20210101", ...]
+        return np.asarray(dates).astype("U8")
+
+    @staticmethod
+    def convert_ints_to_dt64s(dates: Union[np.ndarray, pd.Series, list[int]]) -> np.ndarray:
+        # [20210101, ...] -> [np.datetime64("2021-01-01"), ...], dtype = datetime64[D]
+        d = np.asarray(dates, dtype=np.int64)
+        years = (d // 10000 - 1970).astype("datetime64[Y]")
+        months = years.astype("datetime64[M]") + (d // 100 % 100 - 1).astype("timedelta64[M]")
+        return months.astype("datetime64[D]") + (d % 100 - 1).astype("timedelta64[D]")
+
+    @staticmethod
+    def convert_dt64s_to_ints(dates: Union[np.ndarray, pd.Series, pd.DatetimeIndex]) -> np.ndarray:
+        # [np.datetime64("2021-01-01 15:00:00"), ...] -> [20210101, ...], dtype = np.int32
+        # any datetime-like array is accepted, time part is dropped
+        d = np.asarray(dates, dtype="datetime64[D]")
+        years = d.astype("datetime64[Y]")
+        months = d.astype("datetime64[M]")
+        y = years.astype(np.int64) + 1970
+        m = (months - years.astype("datetime64[M]")).astype(np.int64) + 1
+        dd = (d - months.astype("datetime64[D]")).astype(np.int64) + 1
+        return (y * 10000 + m * 100 + dd).astype(np.int32)
+
     @staticmethod
     def get_next_month(month: str, s: int) -> str:
         """
@@ -165,3 +468,35 @@ class CCalendar(object):
 
         h = pd.DataFrame({header_name: self.get_iter_list(bgn_date, stp_date)})
         return h
+
+
+"""
+------ process-wide registry ------
+"""
+
+_CALENDARS: dict[tuple[str, int], tuple[tuple[int, int], CCalendar]] = {}
+_CALENDARS_LOCK = threading.Lock()
+
+
+def get_calendar(calendar_path: str, header: int = 0, use_cache: bool = False) -> CCalendar:
+    """
+    get the shared CCalendar instance of calendar_path in this process.
+    a new instance is created only when it is called for the first time
+    or the csv file is changed. The shared instance should be treated as read-only.
+
+    :param calendar_path: path of calendar csv file
+    :param header: row number of header, use None if there is no header in the csv file
+    :param use_cache: see CCalendar.__init__
+    :return:
+    """
+    key = (os.path.abspath(calendar_path), header)
+    stat = os.stat(calendar_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _CALENDARS_LOCK:
+        if key in _CALENDARS:
+            cached_version, calendar = _CALENDARS[key]
+            if cached_version == version:
+                return calendar
+        calendar = CCalendar(calendar_path, header=header, use_cache=use_cache)
+        _CALENDARS[key] = (version, calendar)
+    return calendar
@@ -0,0 +1,256 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+"""
+created @ 2026-10-17
+0.  mean and covariance of returns for each rebalance date, to feed the optimizers in qoptimization.
+1.  returns are scanned only once, moments are updated by rank-one updates of the sums of x, x @ x.T,
+    |x|^2, |x|^2 * x and |x|^4, instead of recalculating each window with pd.DataFrame.cov().
+2.  CMomentsRolling uses a fixed window, CMomentsEWMA uses exponential weights, the same as
+    pd.DataFrame.ewm(alpha=alpha, adjust=False).cov(bias=True).
+3.  the optional shrinkage is Ledoit-Wolf (2004) towards nu * I with nu = trace(cov) / p, the
+    intensity is estimated from the same sums, so no returns need to be kept for it.
+4.  returns must not contain NaN, fill or drop them before the estimation.
+"""
+
+
+class CMomentsStream(object):
+    def __init__(self, p: int, shrinkage: bool = False):
+        """
+
+        :param p: number of assets
+        :param shrinkage: if True, covariance is shrunk by Ledoit-Wolf
+        """
+        self.p = p
+        self.shrinkage = shrinkage
+
+    @property
+    def ready(self) -> bool:
+        raise NotImplementedError
+
+    def update(self, x: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def weighted_moments(self) -> tuple[np.ndarray, np.ndarray, float, np.ndarray, float, float]:
+        """
+
+        :return: weighted averages of (x, x @ x.T, |x|^2, |x|^2 * x, |x|^4) and sum of squared weights
+        """
+        raise NotImplementedError
+
+    def cov_scale(self) -> float:
+        """
+
+        :return: factor to convert the biased covariance to the reported one, like n / (n - ddof)
+        """
+        return 1.0
+
+    @staticmethod
+    def cal_lw_intensity(
+            e_x: np.ndarray, e_xx: np.ndarray, e_a: float, e_ax: np.ndarray, e_aa: float, w2: float,
+            cov: np.ndarray,
+    ) -> float:
+        """
+        Ledoit-Wolf intensity min(pi, delta) / delta, with pi = w2 * (E[|x - mu|^4] - |cov|^2),
+        delta = |cov - nu * I|^2, |.| is Frobenius norm, and cov is the biased covariance.
+        E[|x - mu|^4] is expanded as E[(a - 2 * b + c)^2] with a = |x|^2, b = x @ mu, c = |mu|^2.
+        """
+        mu, c = e_x, e_x @ e_x
+        e_bb = mu @ e_xx @ mu
+        e_ab = mu @ e_ax
+        e_fourth = e_aa + 4 * e_bb + c ** 2 - 4 * e_ab + 2 * c * e_a - 4 * c ** 2
+        cov_norm2 = np.sum(cov ** 2)
+        nu = np.trace(cov) / len(mu)
+        delta = cov_norm2 - 2 * nu * np.trace(cov) + nu ** 2 * len(mu)
+        if delta <= 0:
+            return 0.0
+        pi = max(w2 * (e_fourth - cov_norm2), 0.0)
+        return min(pi, delta) / delta
+
+    def get_moments(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+
+        :return: (mean, covariance), with size = p and p x p, NaN if not ready
+        """
+        if not self.ready:
+            return np.full(self.p, np.nan), np.full((self.p, self.p), np.nan)
+        e_x, e_xx, e_a, e_ax, e_aa, w2 = self.weighted_moments()
+        cov_biased = e_xx - np.outer(e_x, e_x)
+        cov = cov_biased * self.cov_scale()
+        if self.shrinkage:
+            intensity = self.cal_lw_intensity(e_x, e_xx, e_a, e_ax, e_aa, w2, cov_biased)
+            nu = np.trace(cov) / self.p
+            cov = (1 - intensity) * cov + intensity * nu * np.eye(self.p)
+        return e_x, cov
+
+
+class CMomentsRolling(CMomentsStream):
+    def __init__(self, p: int, win: int, ddof: int = 1, shrinkage: bool = False, resync: int = 1000):
+        """
+        mean and covariance of the last win returns, same as pd.DataFrame.rolling(win).mean() / .cov(ddof)
+
+        :param win: window size, moments are ready after win updates
+        :param ddof: delta degrees of freedom of covariance
+        :param resync: recalculate the sums from the window every resync updates, to stop
+                       the accumulation of rounding errors of adding and removing, 0 to disable.
+        """
+        super().__init__(p=p, shrinkage=shrinkage)
+        if win <= ddof:
+            raise ValueError(f"win = {win} must be greater than ddof = {ddof}")
+        self.win = win
+        self.ddof = ddof
+        self.resync = resync
+        self.buffer = np.zeros((win, p))
+        self.n, self.t = 0, 0
+        self.s_x, self.s_xx = np.zeros(p), np.zeros((p, p))
+        self.s_a, self.s_ax, self.s_aa = 0.0, np.zeros(p), 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.n == self.win
+
+    def add_sums(self, x: np.ndarray, sign: float) -> None:
+        a = x @ x
+        self.s_x += sign * x
+        self.s_xx += sign * np.outer(x, x)
+        self.s_a += sign * a
+        self.s_ax += sign * a * x
+        self.s_aa += sign * a ** 2
+
+    def update(self, x: np.ndarray) -> None:
+        pos = self.t % self.win
+        if self.n == self.win:
+            self.add_sums(self.buffer[pos], -1.0)
+        else:
+            self.n += 1
+        self.buffer[pos] = x
+        self.add_sums(x, 1.0)
+        self.t += 1
+        if self.resync > 0 and self.t % self.resync == 0:
+            rows = self.buffer[:self.n]
+            a = np.sum(rows ** 2, axis=1)
+            self.s_x, self.s_xx = rows.sum(axis=0), rows.T @ rows
+            self.s_a, self.s_ax, self.s_aa = a.sum(), a @ rows, a @ a
+
+    def weighted_moments(self) -> tuple[np.ndarray, np.ndarray, float, np.ndarray, float, float]:
+        n = self.n
+        return self.s_x / n, self.s_xx / n, self.s_a / n, self.s_ax / n, self.s_aa / n, 1 / n
+
+    def cov_scale(self) -> float:
+        return self.n / (self.n - self.ddof)
+
+
+class CMomentsEWMA(CMomentsStream):
+    def __init__(self, p: int, alpha: float = None, halflife: float = None, min_periods: int = 1,
+                 shrinkage: bool = False):
+        """
+        exponentially weighted mean and covariance, weights of the latest return is alpha, same as
+        pd.DataFrame.ewm(alpha=alpha, adjust=False).mean() / .cov(bias=True)
+
+        :param alpha: smoothing factor, in (0, 1]
+        :param halflife: used to calculate alpha = 1 - exp(-ln(2) / halflife) if alpha is not provided
+        :param min_periods: moments are ready after min_periods updates
+        """
+        super().__init__(p=p, shrinkage=shrinkage)
+        if alpha is None:
+            if halflife is None:
+                raise ValueError("one of alpha and halflife must be provided")
+            alpha = 1 - np.exp(-np.log(2) / halflife)
+        if not (0 < alpha <= 1):
+            raise ValueError(f"alpha = {alpha} is illegal, it must be in (0, 1]")
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.n = 0
+        self.e_x, self.e_xx = np.zeros(p), np.zeros((p, p))
+        self.e_a, self.e_ax, self.e_aa = 0.0, np.zeros(p), 0.0
+        self.w2 = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.n >= self.min_periods
+
+    def update(self, x: np.ndarray) -> None:
+        # weight of the first return is 1, then each update is e = (1 - alpha) * e + alpha * f(x)
+        k = 1.0 if self.n == 0 else self.alpha
+        a = x @ x
+        self.e_x += k * (x - self.e_x)
+        self.e_xx += k * (np.outer(x, x) - self.e_xx)
+        self.e_a += k * (a - self.e_a)
+        self.e_ax += k * (a * x - self.e_ax)
+        self.e_aa += k * (a ** 2 - self.e_aa)
+        self.w2 = (1 - k) ** 2 * self.w2 + k ** 2
+        self.n += 1
+
+    def weighted_moments(self) -> tuple[np.ndarray, np.ndarray, float, np.ndarray, float, float]:
+        return self.e_x, self.e_xx, self.e_a, self.e_ax, self.e_aa, self.w2
+
+
+@dataclass
+class CMomentsStack:
+    """
+    dates: rebalance dates
+    assets: names of assets
+    ms: means with shape = (dates, p)
+    vs: covariances with shape = (dates, p, p)
+    """
+    dates: list[str]
+    assets: list[str]
+    ms: np.ndarray
+    vs: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def get(self, date: str) -> tuple[np.ndarray, np.ndarray]:
+        i = self.dates.index(date)
+        return self.ms[i], self.vs[i]
+
+    def to_lists(self) -> tuple[list[str], list[np.ndarray], list[np.ndarray]]:
+        """
+
+        :return: (dates, ms, vs), ready for COptimizerRolling.optimize(dates, ms, vs, assets=self.assets)
+        """
+        return self.dates, list(self.ms), list(self.vs)
+
+
+def cal_moments(
+        rtn: pd.DataFrame,
+        estimator: CMomentsStream,
+        rebalance_dates: list[str] = None,
+        scale: float = 1.0,
+) -> CMomentsStack:
+    """
+
+    :param rtn: returns, index = unique dates in ascending order, columns = assets, without NaN
+    :param estimator: a fresh CMomentsRolling or CMomentsEWMA, with p = number of columns of rtn
+    :param rebalance_dates: dates to output, unique and in ascending order, moments of a date
+                            include the return of the date, all the dates of rtn if not provided
+    :param scale: multiplier of mean and covariance, like 250 to annualize daily returns
+    :return: a CMomentsStack, dates not ready (like the first win - 1 dates of a rolling window) are NaN
+    """
+    values = rtn.to_numpy(dtype=np.float64)
+    if np.isnan(values).any():
+        raise ValueError("rtn contains NaN, fill or drop them before the estimation")
+    if values.shape[1] != estimator.p:
+        raise ValueError(f"rtn has {values.shape[1]} columns, estimator p = {estimator.p}")
+    if not (rtn.index.is_unique and rtn.index.is_monotonic_increasing):
+        raise ValueError("dates of rtn must be unique and in ascending order")
+    dates = rtn.index.tolist()
+    if rebalance_dates is None:
+        rebalance_dates = dates
+    else:
+        missing = set(rebalance_dates) - set(dates)
+        if missing:
+            raise ValueError(f"rebalance dates {sorted(missing)[:5]} are not found in rtn")
+    if any(d0 >= d1 for d0, d1 in zip(rebalance_dates[:-1], rebalance_dates[1:])):
+        raise ValueError("rebalance dates must be unique and in ascending order")
+    loc = {d: i for i, d in enumerate(rebalance_dates)}
+    n, p = len(rebalance_dates), estimator.p
+    ms, vs = np.full((n, p), np.nan), np.full((n, p, p), np.nan)
+    for date, x in zip(dates, values):
+        estimator.update(x)
+        if date in loc:
+            m, v = estimator.get_moments()
+            ms[loc[date]], vs[loc[date]] = m * scale, v * scale
+    return CMomentsStack(dates=list(rebalance_dates), assets=rtn.columns.tolist(), ms=ms, vs=vs)
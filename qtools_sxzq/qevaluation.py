@@ -1,7 +1,10 @@
+import time
 import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Union
+from typing import Union, Literal, Callable
+from qtools_sxzq.qtailrisk import cal_var_es, cal_quantiles_from_sorted, cal_es_from_sorted
 
 '''
 created @ 2024-01-05
@@ -50,6 +53,187 @@ class CIndicatorsWithDict(CIndicatorsGeneric):
         return ",".join([f"{k}={v * self.display_scale:{self.display_fmt}}" for k, v in self.val.items()])
 
 
+def cal_high_locs(nav: np.ndarray, high: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+
+    :param nav: net assets values, 1-D, or 2-D with shape = (strategies, dates)
+    :param high: running maximum of nav along the last axis, calculated if not provided
+    :return: (running maximum, is new high, location of last high) along the last axis,
+             a new high is a value strictly greater than all the previous values, the first
+             value is always a new high.
+    """
+    if high is None:
+        high = np.maximum.accumulate(nav, axis=-1)
+    is_new_high = np.ones(nav.shape, dtype=bool)
+    is_new_high[..., 1:] = nav[..., 1:] > high[..., :-1]
+    locs = np.broadcast_to(np.arange(nav.shape[-1]), nav.shape)
+    high_locs = np.maximum.accumulate(np.where(is_new_high, locs, 0), axis=-1)
+    return high, is_new_high, high_locs
+
+
+def cal_drawdown_durations(nav: np.ndarray, high_locs_res: tuple = None) -> np.ndarray:
+    """
+    for each i, the distance from the last high to the location of the max drawdown after it.
+    The location of max drawdown is kept until a larger drawdown after the new high appears,
+    so the duration may be negative just after a new high.
+
+    :param nav: net assets values, 1-D, or 2-D with shape = (strategies, dates)
+    :param high_locs_res: result of cal_high_locs(nav), calculated if not provided
+    :return: an int64 array with the same shape as nav
+    """
+    if nav.shape[-1] == 0:
+        return np.zeros(nav.shape, dtype=np.int64)
+    high, is_new_high, high_locs = high_locs_res or cal_high_locs(nav)
+    drawdown_scale = 1 - nav / high
+    # each row starts with a new high, so groups never cross rows
+    grp_ids = np.cumsum(is_new_high.ravel())
+    grp_max = pd.Series(drawdown_scale.ravel()).groupby(grp_ids).cummax().to_numpy().reshape(nav.shape)
+    prev_max = np.zeros(nav.shape)
+    prev_max[..., 1:] = grp_max[..., :-1]
+    prev_max[is_new_high] = 0
+    is_new_drawdown = drawdown_scale > prev_max
+    locs = np.broadcast_to(np.arange(nav.shape[-1]), nav.shape)
+    drawdown_locs = np.maximum.accumulate(np.where(is_new_drawdown, locs, 0), axis=-1)
+    return drawdown_locs - high_locs
+
+
+def cal_recover_durations(nav: np.ndarray, high_locs_res: tuple = None) -> np.ndarray:
+    """
+    for each i, the distance from the last high
+
+    :param nav: net assets values, 1-D, or 2-D with shape = (strategies, dates)
+    :param high_locs_res: result of cal_high_locs(nav), calculated if not provided
+    :return: an int64 array with the same shape as nav
+    """
+    if nav.shape[-1] == 0:
+        return np.zeros(nav.shape, dtype=np.int64)
+    _, _, high_locs = high_locs_res or cal_high_locs(nav)
+    return np.arange(nav.shape[-1]) - high_locs
+
+
+def cal_next_high_locs(nav: np.ndarray) -> np.ndarray:
+    """
+    with a monotonic stack, O(n)
+
+    :param nav: net assets values, 1-D
+    :return: for each k, location of the first value strictly greater than nav[k] after k, len(nav) if not found
+    """
+    nxt = np.full(len(nav), len(nav), dtype=np.int64)
+    stack: list[int] = []
+    for j, nav_j in enumerate(nav.tolist()):
+        while stack and nav[stack[-1]] < nav_j:
+            nxt[stack.pop()] = j
+        stack.append(j)
+    return nxt
+
+
+def cal_rolling_max_drawdown(nav: np.ndarray, win: int) -> np.ndarray:
+    """
+    Each block of 2^p values is summarized as (max, min, min of nav[j]/nav[k] for k <= j),
+    block tables are built by doubling, and each window is composed of at most log2(win) blocks,
+    so the cost is O(n * log(win)).
+
+    :param nav: net assets values, 1-D
+    :param win: window size
+    :return: max drawdown of each window nav[s:s + win], with length = len(nav) - win + 1
+    """
+    if len(nav) < win:
+        return np.zeros(0)
+    levels = [(nav, nav, np.ones(len(nav)))]
+    while (1 << len(levels)) <= win:
+        h = 1 << (len(levels) - 1)
+        hi, lo, ratio = levels[-1]
+        levels.append((
+            np.maximum(hi[:-h], hi[h:]),
+            np.minimum(lo[:-h], lo[h:]),
+            np.minimum(np.minimum(ratio[:-h], ratio[h:]), lo[h:] / hi[:-h]),
+        ))
+    pos = np.arange(len(nav) - win + 1)
+    cur_hi, cur_ratio = None, None
+    for p in range(len(levels) - 1, -1, -1):
+        if (win >> p) & 1:
+            hi, lo, ratio = (z[pos] for z in levels[p])
+            if cur_hi is None:
+                cur_hi, cur_ratio = hi, ratio
+            else:
+                cur_ratio = np.minimum(np.minimum(cur_ratio, ratio), lo / cur_hi)
+                cur_hi = np.maximum(cur_hi, hi)
+            pos = pos + (1 << p)
+    return 1 - cur_ratio
+
+
+def cal_rolling_durations(nav: np.ndarray, win: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    In a window starting from s, the highs are s, nxt[s], nxt[nxt[s]], ..., where nxt is from
+    cal_next_high_locs, and the values between 2 highs are a group. The longest drawdown and
+    recover durations of a complete group are fixed, so for each window, they are the max of
+    complete groups, found by binary lifting along nxt, and the last incomplete group,
+    found by a sparse table of range argmin. The cost is O(n * log(win)).
+
+    :param nav: net assets values, 1-D
+    :param win: window size
+    :return: (longest drawdown duration, longest recover duration) of each window nav[s:s + win],
+             with length = len(nav) - win + 1, the same as CNAV.cal_longest_drawdown_duration and
+             CNAV.cal_longest_recover_duration on each window.
+    """
+    n = len(nav)
+    if n < win:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    n_levels = win.bit_length()
+
+    # sparse table of range argmin, the first location is kept for ties
+    argmin_table = np.tile(np.arange(n), (n_levels, 1))
+    for p in range(1, n_levels):
+        h = 1 << (p - 1)
+        lft, rgt = argmin_table[p - 1, :n - h], argmin_table[p - 1, h:]
+        argmin_table[p, :n - h] = np.where(nav[rgt] < nav[lft], rgt, lft)
+
+    def range_argmin(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        # a <= b, b - a < 2^n_levels
+        p = np.log2(b - a + 1).astype(np.int64)
+        lft, rgt = argmin_table[p, a], argmin_table[p, b - (1 << p) + 1]
+        return np.where(nav[rgt] < nav[lft], rgt, lft)
+
+    # durations of complete groups, only groups shorter than win could be complete in a window
+    locs = np.arange(n)
+    nxt = cal_next_high_locs(nav)
+    grp_rcv = nxt - 1 - locs
+    grp_ddn = np.zeros(n, dtype=np.int64)
+    is_valid = (nxt - locs >= 2) & (nxt - locs < win)
+    k = locs[is_valid]
+    m = range_argmin(k + 1, nxt[is_valid] - 1)
+    grp_ddn[is_valid] = np.where(nav[m] < nav[k], m - k, 0)
+
+    # binary lifting, n is a sentinel node
+    up = np.full((n_levels, n + 1), n, dtype=np.int64)
+    up_rcv = np.zeros((n_levels, n + 1), dtype=np.int64)
+    up_ddn = np.zeros((n_levels, n + 1), dtype=np.int64)
+    up[0, :n], up_rcv[0, :n], up_ddn[0, :n] = nxt, grp_rcv, grp_ddn
+    for p in range(1, n_levels):
+        mid = up[p - 1]
+        up[p] = mid[mid]
+        up_rcv[p] = np.maximum(up_rcv[p - 1], up_rcv[p - 1, mid])
+        up_ddn[p] = np.maximum(up_ddn[p - 1], up_ddn[p - 1, mid])
+
+    node = np.arange(n - win + 1)
+    ends = node + win - 1
+    ldd, lrd = np.zeros(len(node), dtype=np.int64), np.zeros(len(node), dtype=np.int64)
+    for p in range(n_levels - 1, -1, -1):
+        nxt_node = up[p, node]
+        ok = nxt_node <= ends
+        lrd = np.where(ok, np.maximum(lrd, up_rcv[p, node]), lrd)
+        ldd = np.where(ok, np.maximum(ldd, up_ddn[p, node]), ldd)
+        node = np.where(ok, nxt_node, node)
+
+    # the last incomplete group
+    lrd = np.maximum(lrd, ends - node)
+    has_tail = node < ends
+    k = node[has_tail]
+    m = range_argmin(k + 1, ends[has_tail])
+    ldd[has_tail] = np.maximum(ldd[has_tail], np.where(nav[m] < nav[k], m - k, 0))
+    return ldd, lrd
+
+
 class CNAV(object):
     def __init__(self, input_srs: pd.Series, input_type: str, annual_factor: float = 250,
                  annual_rf_rate: float = 0, ret_scale_display: float = 100):
@@ -100,6 +284,7 @@ class CNAV(object):
         self.sharpe_ratio: CIndicators = CIndicators(1, display_fmt=".3f")
         self.calmar_ratio: CIndicators = CIndicators(1, display_fmt=".3f")
         self.value_at_risks: CIndicatorsWithDict = CIndicatorsWithDict(ret_scale_display, display_fmt=".3f")
+        self.expected_shortfalls: CIndicatorsWithDict = CIndicatorsWithDict(ret_scale_display, display_fmt=".3f")
 
         # secondary
         self.max_drawdown_scale: CIndicatorsWithSeries = CIndicatorsWithSeries(
@@ -112,15 +297,101 @@ class CNAV(object):
             display_scale=1, display_fmt="d", srs=pd.Series(data=0, index=self.nav_srs.index),
         )
 
+        # memoized intermediates and indicators, see get_node
+        self.nodes: dict[str, object] = {}
+        self.node_timings: dict[str, float] = {}
+        self.node_hooks: list[Callable[[str, float], None]] = []
+        self.__node_child_time: list[float] = []
+
+    """
+    ------ indicator graph ------
+    each node is a method named node_{name}, its dependencies are fetched by get_node,
+    so any subset of indicators calculates each intermediate only once.
+    dependencies:
+        mean, std <- rtn_srs
+        excess_mean, excess_std <- excess_rtn <- rtn_srs, the same as mean and std if annual_rf_rate = 0
+        drawdown <- cummax <- nav_srs
+        high_locs <- cummax, nav
+        drawdown_durations, recover_durations <- high_locs
+        sorted_rtn <- rtn, shared by VaR and expected shortfall
+    """
+
+    def add_node_hook(self, hook: Callable[[str, float], None]):
+        """
+
+        :param hook: called as hook(name, seconds) after a node is calculated, seconds excludes the time
+                     spent on its dependencies, like lambda name, t: print(f"{name}: {t * 1e3:.3f}ms")
+        """
+        self.node_hooks.append(hook)
+        return 0
+
+    def get_node(self, name: str):
+        if name in self.nodes:
+            return self.nodes[name]
+        self.__node_child_time.append(0.0)
+        t0 = time.perf_counter()
+        self.nodes[name] = getattr(self, f"node_{name}")()
+        elapsed = time.perf_counter() - t0
+        self_time = elapsed - self.__node_child_time.pop()
+        if self.__node_child_time:
+            self.__node_child_time[-1] += elapsed
+        self.node_timings[name] = self_time
+        for hook in self.node_hooks:
+            hook(name, self_time)
+        return self.nodes[name]
+
+    def node_rtn(self) -> np.ndarray:
+        return self.rtn_srs.to_numpy(dtype=np.float64)
+
+    def node_nav(self) -> np.ndarray:
+        return self.nav_srs.to_numpy(dtype=np.float64)
+
+    def node_mean(self) -> float:
+        return self.rtn_srs.mean()
+
+    def node_std(self) -> float:
+        return self.rtn_srs.std()
+
+    def node_excess_rtn(self) -> pd.Series:
+        return self.rtn_srs - self.annual_rf_rate / self.annual_factor
+
+    def node_excess_mean(self) -> float:
+        return self.get_node("mean") if self.annual_rf_rate == 0 else self.get_node("excess_rtn").mean()
+
+    def node_excess_std(self) -> float:
+        return self.get_node("std") if self.annual_rf_rate == 0 else self.get_node("excess_rtn").std()
+
+    def node_cummax(self) -> pd.Series:
+        return self.nav_srs.cummax()
+
+    def node_drawdown(self) -> pd.Series:
+        return 1 - self.nav_srs / self.get_node("cummax")
+
+    def node_high_locs(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return cal_high_locs(self.get_node("nav"), high=self.get_node("cummax").to_numpy(dtype=np.float64))
+
+    def node_drawdown_durations(self) -> np.ndarray:
+        return cal_drawdown_durations(self.get_node("nav"), high_locs_res=self.get_node("high_locs"))
+
+    def node_recover_durations(self) -> np.ndarray:
+        return cal_recover_durations(self.get_node("nav"), high_locs_res=self.get_node("high_locs"))
+
+    def node_sorted_rtn(self) -> np.ndarray:
+        return np.sort(self.get_node("rtn"))
+
+    """
+    ------ indicators ------
+    """
+
     def cal_return_mean(self):
         if not self.return_mean.avlb:
-            self.return_mean.val = self.rtn_srs.mean()
+            self.return_mean.val = self.get_node("mean")
             self.return_mean.avlb = True
         return 0
 
     def cal_return_std(self):
         if not self.return_std.avlb:
-            self.return_std.val = self.rtn_srs.std()
+            self.return_std.val = self.get_node("std")
             self.return_std.avlb = True
         return 0
 
@@ -133,7 +404,7 @@ class CNAV(object):
     def cal_annual_return(self, method: str = "linear"):
         if not self.annual_return.avlb:
             if method.lower() == "linear":
-                self.annual_return.val = self.rtn_srs.mean() * self.annual_factor
+                self.annual_return.val = self.get_node("mean") * self.annual_factor
             elif method.lower() == "compound":
                 self.annual_return.val = np.power(self.nav_srs.iloc[-1], self.annual_factor / self.obs) - 1
             else:
@@ -143,22 +414,21 @@ class CNAV(object):
 
     def cal_annual_volatility(self):
         if not self.annual_volatility.avlb:
-            self.annual_volatility.val = self.rtn_srs.std() * np.sqrt(self.annual_factor)
+            self.annual_volatility.val = self.get_node("std") * np.sqrt(self.annual_factor)
             self.annual_volatility.avlb = True
         return 0
 
     def cal_sharpe_ratio(self):
         if not self.sharpe_ratio.avlb:
-            diff_srs = self.rtn_srs - self.annual_rf_rate / self.annual_factor
-            mu = diff_srs.mean()
-            sd = diff_srs.std()
+            mu = self.get_node("excess_mean")
+            sd = self.get_node("excess_std")
             self.sharpe_ratio.val = mu / sd * np.sqrt(self.annual_factor)
             self.sharpe_ratio.avlb = True
         return 0
 
     def cal_max_drawdown_scale(self):
         if not self.max_drawdown_scale.avlb:
-            self.max_drawdown_scale.srs = (1 - self.nav_srs / self.nav_srs.cummax())
+            self.max_drawdown_scale.srs = self.get_node("drawdown")
             self.max_drawdown_scale.val = self.max_drawdown_scale.srs.max()
             self.max_drawdown_scale.idx = self.max_drawdown_scale.srs.idxmax()
             self.max_drawdown_scale.avlb = True
@@ -175,20 +445,8 @@ class CNAV(object):
     def cal_longest_drawdown_duration(self):
         if self.longest_drawdown_duration.avlb:
             return 0
-        prev_high = self.nav_srs.iloc[0]
-        prev_high_loc = 0
-        prev_drawdown_scale = 0.0
-        drawdown_loc = 0
-        for i, nav_i in enumerate(self.nav_srs):
-            if nav_i > prev_high:
-                prev_high = nav_i
-                prev_high_loc = i
-                prev_drawdown_scale = 0
-            drawdown_scale = 1 - nav_i / prev_high  # type:ignore
-            if drawdown_scale > prev_drawdown_scale:
-                prev_drawdown_scale = drawdown_scale
-                drawdown_loc = i
-            self.longest_drawdown_duration.srs.iloc[i] = drawdown_loc - prev_high_loc
+        durations = self.get_node("drawdown_durations")
+        self.longest_drawdown_duration.srs = pd.Series(data=durations, index=self.nav_srs.index)
         self.longest_drawdown_duration.val = self.longest_drawdown_duration.srs.max()
         self.longest_drawdown_duration.idx = self.longest_drawdown_duration.srs.idxmax()
         self.longest_drawdown_duration.avlb = True
@@ -197,26 +455,108 @@ class CNAV(object):
     def cal_longest_recover_duration(self):
         if self.longest_recover_duration.avlb:
             return 0
-        prev_high = self.nav_srs.iloc[0]
-        prev_high_loc = 0
-        for i, nav_i in enumerate(self.nav_srs):
-            if nav_i > prev_high:
-                self.longest_recover_duration.srs.iloc[i] = 0
-                prev_high = nav_i
-                prev_high_loc = i
-            else:
-                self.longest_recover_duration.srs.iloc[i] = i - prev_high_loc
+        durations = self.get_node("recover_durations")
+        self.longest_recover_duration.srs = pd.Series(data=durations, index=self.nav_srs.index)
         self.longest_recover_duration.val = self.longest_recover_duration.srs.max()
         self.longest_recover_duration.idx = self.longest_recover_duration.srs.idxmax()
         self.longest_recover_duration.avlb = True
         return 0
 
+    def cal_expected_shortfall(self, qs: tuple[int, ...]):
+        """
+        not included in cal_all_indicators, to keep the keys of to_dict() unchanged
+
+        :param qs: percentages, like (1, 5), expected shortfall is the mean of returns not greater than VaR
+        """
+        if (not self.expected_shortfalls.avlb) and qs:
+            sorted_rtn = self.get_node("sorted_rtn")
+            es = cal_es_from_sorted(sorted_rtn, cal_quantiles_from_sorted(sorted_rtn, qs))
+            self.expected_shortfalls.val = {f"es{q:02d}": v for q, v in zip(qs, es)}
+            self.expected_shortfalls.avlb = True
+        return 0
+
     def cal_value_at_risk(self, qs: tuple[int, ...]):
         if (not self.value_at_risks.avlb) and qs:
-            self.value_at_risks.val = {f"q{q:02d}": np.percentile(self.rtn_srs, q) for q in qs}
+            var = cal_quantiles_from_sorted(self.get_node("sorted_rtn"), qs)
+            self.value_at_risks.val = {f"q{q:02d}": v for q, v in zip(qs, var)}
             self.value_at_risks.avlb = True
         return 0
 
+    def cal_rolling_indicators(self, win: int, method: str = "linear", qs: tuple[int, ...] = ()) -> pd.DataFrame:
+        """
+        indicators of the window with win returns ending at each date, which are the same as
+        CNAV(input_srs=self.rtn_srs.iloc[i - win + 1:i + 1], input_type="RET") up to float rounding.
+        All of them are calculated in one pass instead of one CNAV for each window.
+
+        :param win: window size, like 250 for 1 year
+        :param method: "linear" or "compound", same as cal_annual_return
+        :param qs: percentages for VaR, same as cal_value_at_risk
+        :return: a pd.DataFrame with index = self.nav_srs.index, columns = ["retAnnual", "volAnnual",
+                 "sharpe", "mdd", "lddDur", "lrd"] + ["q01", ...], NaN for the first win - 1 dates.
+        """
+        nav = (self.rtn_srs + 1).cumprod()
+        if method.lower() == "linear":
+            ret_annual = self.rtn_srs.rolling(win).mean() * self.annual_factor
+        elif method.lower() == "compound":
+            hpr = nav / nav.shift(win).fillna(1)  # nav before the first return is 1
+            ret_annual = np.power(hpr, self.annual_factor / win) - 1
+            ret_annual.iloc[:win - 1] = np.nan
+        else:
+            raise ValueError(f"method = {method} is not a legal option")
+        diff_srs = self.rtn_srs - self.annual_rf_rate / self.annual_factor
+        nav_val = nav.to_numpy(dtype=np.float64)
+        ldd, lrd = cal_rolling_durations(nav_val, win)
+
+        def align(x: np.ndarray) -> np.ndarray:
+            # results of the first win - 1 dates are NaN
+            return np.concatenate([np.full(len(nav_val) - len(x), np.nan), x])
+
+        res = pd.DataFrame({
+            "retAnnual": ret_annual.to_numpy(),
+            "volAnnual": self.rtn_srs.rolling(win).std().to_numpy() * np.sqrt(self.annual_factor),
+            "sharpe": (diff_srs.rolling(win).mean() / diff_srs.rolling(win).std()).to_numpy() * np.sqrt(
+                self.annual_factor),
+            "mdd": align(cal_rolling_max_drawdown(nav_val, win)),
+            "lddDur": align(ldd),
+            "lrd": align(lrd),
+        }, index=self.nav_srs.index)
+        for q in qs:
+            res[f"q{q:02d}"] = self.rtn_srs.rolling(win).quantile(q / 100).to_numpy()
+        return res
+
+    def cal_expanding_indicators(self, method: str = "linear", qs: tuple[int, ...] = ()) -> pd.DataFrame:
+        """
+        indicators from the first date to each date, which are the same as
+        CNAV(input_srs=self.nav_srs.iloc[:i + 1], input_type=self.return_type) up to float rounding.
+
+        :param method: "linear" or "compound", same as cal_annual_return
+        :param qs: percentages for VaR, same as cal_value_at_risk
+        :return: a pd.DataFrame with index = self.nav_srs.index, columns = ["retAnnual", "volAnnual",
+                 "sharpe", "mdd", "lddDur", "lrd"] + ["q01", ...]
+        """
+        if method.lower() == "linear":
+            ret_annual = self.rtn_srs.expanding().mean() * self.annual_factor
+        elif method.lower() == "compound":
+            obs = np.arange(1, len(self.nav_srs) + 1)
+            ret_annual = np.power(self.nav_srs, self.annual_factor / obs) - 1
+        else:
+            raise ValueError(f"method = {method} is not a legal option")
+        diff_srs = self.rtn_srs - self.annual_rf_rate / self.annual_factor
+        nav = self.nav_srs.to_numpy(dtype=np.float64)
+        res = pd.DataFrame({
+            "retAnnual": ret_annual.to_numpy(),
+            "volAnnual": self.rtn_srs.expanding().std().to_numpy() * np.sqrt(self.annual_factor),
+            "sharpe": (diff_srs.expanding().mean() / diff_srs.expanding().std()).to_numpy() * np.sqrt(
+                self.annual_factor),
+            "mdd": np.maximum.accumulate(1 - nav / np.maximum.accumulate(nav)),
+            # durations of a date do not depend on later dates, so the results of prefix are the prefix of results
+            "lddDur": np.maximum.accumulate(cal_drawdown_durations(nav)),
+            "lrd": np.maximum.accumulate(cal_recover_durations(nav)),
+        }, index=self.nav_srs.index)
+        for q in qs:
+            res[f"q{q:02d}"] = self.rtn_srs.expanding().quantile(q / 100).to_numpy()
+        return res
+
     def cal_all_indicators(self, method: str = "linear",
                            excluded: tuple[str, ...] = (),
                            qs: tuple[int, ...] = ()):
@@ -292,6 +632,9 @@ class CNAV(object):
 
         if self.value_at_risks.avlb:
             d.update(self.value_at_risks.val)
+
+        if self.expected_shortfalls.avlb:
+            d.update(self.expected_shortfalls.val)
         return d
 
     def reformat_to_display(self):
@@ -335,9 +678,377 @@ class CNAV(object):
                 "lrdT": self.longest_recover_duration.displayIdx(),
             })
 
-        if self.value_at_risks.avlb:
-            s = self.value_at_risks.display()
-            for val in s.split(","):
-                k, v = val.split("=")
-                d[k] = v
+        for indicator in (self.value_at_risks, self.expected_shortfalls):
+            if indicator.avlb:
+                s = indicator.display()
+                for val in s.split(","):
+                    k, v = val.split("=")
+                    d[k] = v
+        return d
+
+
+class CNAVPanel(object):
+    def __init__(self, input_df: Union[pd.DataFrame, np.ndarray], input_type: str, annual_factor: float = 250,
+                 annual_rf_rate: float = 0):
+        """
+        Evaluate many strategies at once, each column is a strategy. The indicators are the same
+        as CNAV, and they are calculated column-wise by numpy instead of one CNAV for each column.
+
+        :param input_df: a pd.DataFrame with shape = (dates, strategies), or a 2-D np.ndarray,
+                         in which case the dates are 0, 1, 2, ... and the strategies are 0, 1, 2, ...
+                         A. if input_type == "NAV": the Net-Assets-Value of each strategy
+                            elif input_type == "RET": the Assets Return of each strategy
+                         B. NaN is not supported, strategies with different dates should be
+                            evaluated separately.
+        :param input_type: "NAV" or "RET"
+        :param annual_factor: same as CNAV
+        :param annual_rf_rate: same as CNAV
+        """
+        if isinstance(input_df, np.ndarray):
+            input_df = pd.DataFrame(input_df)
+        self.return_type = input_type.upper()
+        self.annual_factor = annual_factor
+        self.annual_rf_rate: float = annual_rf_rate
+        self.dates: pd.Index = input_df.index
+        self.strategies: pd.Index = input_df.columns
+
+        # shape = (strategies, dates), so each strategy is contiguous in memory
+        input_val = np.ascontiguousarray(input_df.to_numpy(dtype=np.float64).T)
+        if self.return_type == "NAV":
+            self.nav: np.ndarray = input_val / input_val[:, [0]]
+            self.rtn: np.ndarray = np.zeros(input_val.shape)
+            self.rtn[:, 1:] = input_val[:, 1:] / input_val[:, :-1] - 1
+        elif self.return_type == "RET":
+            self.rtn: np.ndarray = input_val
+            self.nav: np.ndarray = np.cumprod(input_val + 1, axis=1)
+        else:
+            raise ValueError(f"input type = {input_type} is illegal, please check again.")
+
+        self.obs: int = len(input_df)
+        self.indicators: dict[str, np.ndarray] = {}  # same keys as CNAV.to_dict()
+
+    def cal_return_indicators(self, method: str = "linear"):
+        mu, sd = self.rtn.mean(axis=1), self.rtn.std(axis=1, ddof=1)
+        diff = self.rtn - self.annual_rf_rate / self.annual_factor
+        self.indicators["retMean"] = mu
+        self.indicators["retStd"] = sd
+        self.indicators["hpr"] = self.nav[:, -1] - 1
+        if method.lower() == "linear":
+            self.indicators["retAnnual"] = mu * self.annual_factor
+        elif method.lower() == "compound":
+            self.indicators["retAnnual"] = np.power(self.nav[:, -1], self.annual_factor / self.obs) - 1
+        else:
+            raise ValueError(f"method = {method} is not a legal option")
+        self.indicators["volAnnual"] = sd * np.sqrt(self.annual_factor)
+        self.indicators["sharpe"] = diff.mean(axis=1) / diff.std(axis=1, ddof=1) * np.sqrt(self.annual_factor)
+        return 0
+
+    def cal_drawdown_indicators(self):
+        drawdown_scale = 1 - self.nav / np.maximum.accumulate(self.nav, axis=1)
+        mdd_locs = np.argmax(drawdown_scale, axis=1)
+        self.indicators["mdd"] = drawdown_scale[np.arange(len(self.strategies)), mdd_locs]
+        self.indicators["mddT"] = self.dates[mdd_locs].to_numpy()
+        self.indicators["calmar"] = self.indicators["retAnnual"] / self.indicators["mdd"]
+        return 0
+
+    def cal_duration_indicator(self, durations: np.ndarray, key: str):
+        locs = np.argmax(durations, axis=1)
+        self.indicators[key] = durations[np.arange(len(self.strategies)), locs]
+        self.indicators[f"{key}T"] = self.dates[locs].to_numpy()
+        return 0
+
+    def cal_value_at_risk(self, qs: tuple[int, ...]):
+        if qs:
+            values, _ = cal_var_es(self.rtn.T, qs)
+            for q, val in zip(qs, values):
+                self.indicators[f"q{q:02d}"] = val
+        return 0
+
+    def cal_all_indicators(self, method: str = "linear",
+                           excluded: tuple[str, ...] = (),
+                           qs: tuple[int, ...] = ()):
+        """
+
+        :param method: same as CNAV.cal_all_indicators
+        :param excluded: same as CNAV.cal_all_indicators
+        :param qs: same as CNAV.cal_all_indicators
+        :return:
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.cal_return_indicators(method=method)
+            self.cal_drawdown_indicators()
+        if "ldd" not in excluded:
+            self.cal_duration_indicator(cal_drawdown_durations(self.nav), "lddDur")
+        if "lrd" not in excluded:
+            self.cal_duration_indicator(cal_recover_durations(self.nav), "lrd")
+        if "var" not in excluded:
+            self.cal_value_at_risk(qs=qs)
+        return 0
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+
+        :return: a pd.DataFrame with index = strategies, columns = keys of CNAV.to_dict(),
+                 in the same order
+        """
+        keys = ["retMean", "retStd", "hpr", "retAnnual", "volAnnual", "sharpe", "calmar", "mdd", "mddT",
+                "lddDur", "lddDurT", "lrd", "lrdT"]
+        keys += [k for k in self.indicators if k not in keys]
+        return pd.DataFrame({k: self.indicators[k] for k in keys if k in self.indicators}, index=self.strategies)
+
+
+class CNAVOnline(object):
+    def __init__(self, annual_factor: float = 250, annual_rf_rate: float = 0, qs: tuple[int, ...] = ()):
+        """
+        Evaluate a return series one return at a time, the state costs O(1) memory and each update
+        costs O(1) time, except VaR. to_dict() is the same as CNAV.to_dict() on the same returns
+        with input_type = "RET", up to float rounding of mean and std.
+
+        :param annual_factor: same as CNAV
+        :param annual_rf_rate: same as CNAV
+        :param qs: percentages for VaR, same as CNAV.cal_value_at_risk. If provided, all the returns
+                   are kept to calculate the exact percentiles.
+        """
+        self.annual_factor = annual_factor
+        self.annual_rf_rate: float = annual_rf_rate
+        self.qs: tuple[int, ...] = tuple(qs)
+        self.rets: list[float] = []  # only kept if qs is provided
+
+        self.obs: int = 0
+        self.ret_mean: float = 0.0
+        self.ret_m2: float = 0.0  # sum of squared deviations from mean, Welford's algorithm
+        self.nav: float = 1.0
+
+        # max drawdown
+        self.peak: float = 0.0
+        self.mdd: float = 0.0
+        self.mdd_idx = None
+
+        # drawdown and recover durations, same as the states in CNAV.cal_longest_drawdown_duration
+        self.prev_high: float = 0.0
+        self.prev_high_loc: int = 0
+        self.prev_drawdown_scale: float = 0.0
+        self.drawdown_loc: int = 0
+        self.ldd: int = 0
+        self.ldd_idx = None
+        self.lrd: int = 0
+        self.lrd_idx = None
+
+    def update(self, ret: float, idx: Union[str, int] = None):
+        """
+
+        :param ret: return of the new date, should NOT be multiplied by RETURN_SCALE
+        :param idx: index of the new date, like "20250407", None for the number of returns before it,
+                    i.e. 0, 1, 2, ..., the same as a pd.Series with the default RangeIndex
+        :return:
+        """
+        i, ret = self.obs, float(ret)
+        if idx is None:
+            idx = i
+        self.obs += 1
+        delta = ret - self.ret_mean
+        self.ret_mean += delta / self.obs
+        self.ret_m2 += delta * (ret - self.ret_mean)
+        self.nav = self.nav * (ret + 1) if i > 0 else ret + 1
+        if self.qs:
+            self.rets.append(ret)
+        if i == 0:
+            self.peak = self.prev_high = self.nav
+
+        # max drawdown
+        self.peak = max(self.peak, self.nav)
+        drawdown_scale = 1 - self.nav / self.peak
+        if i == 0 or drawdown_scale > self.mdd:
+            self.mdd, self.mdd_idx = drawdown_scale, idx
+
+        # drawdown and recover durations
+        if self.nav > self.prev_high:
+            self.prev_high = self.nav
+            self.prev_high_loc = i
+            self.prev_drawdown_scale = 0.0
+        drawdown_scale = 1 - self.nav / self.prev_high
+        if drawdown_scale > self.prev_drawdown_scale:
+            self.prev_drawdown_scale = drawdown_scale
+            self.drawdown_loc = i
+        ldd, lrd = self.drawdown_loc - self.prev_high_loc, i - self.prev_high_loc
+        if i == 0 or ldd > self.ldd:
+            self.ldd, self.ldd_idx = ldd, idx
+        if i == 0 or lrd > self.lrd:
+            self.lrd, self.lrd_idx = lrd, idx
+        return 0
+
+    def update_series(self, rtn_srs: pd.Series):
+        for idx, ret in rtn_srs.items():
+            self.update(ret, idx)
+        return 0
+
+    def to_dict(self, method: str = "linear") -> dict:
+        """
+
+        :param method: "linear" or "compound", same as CNAV.cal_annual_return
+        :return: same keys as CNAV.to_dict() after CNAV.cal_all_indicators(method=method, qs=self.qs)
+        """
+        if self.obs == 0:
+            return {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mu = np.float64(self.ret_mean)
+            sd = np.sqrt(np.float64(self.ret_m2) / (self.obs - 1)) if self.obs > 1 else np.float64(np.nan)
+            if method.lower() == "linear":
+                ret_annual = mu * self.annual_factor
+            elif method.lower() == "compound":
+                ret_annual = np.power(np.float64(self.nav), self.annual_factor / self.obs) - 1
+            else:
+                raise ValueError(f"method = {method} is not a legal option")
+            d = {
+                "retMean": mu,
+                "retStd": sd,
+                "hpr": np.float64(self.nav) - 1,
+                "retAnnual": ret_annual,
+                "volAnnual": sd * np.sqrt(self.annual_factor),
+                "sharpe": (mu - self.annual_rf_rate / self.annual_factor) / sd * np.sqrt(self.annual_factor),
+                "calmar": ret_annual / np.float64(self.mdd),
+                "mdd": np.float64(self.mdd),
+                "mddT": self.mdd_idx,
+                "lddDur": self.ldd,
+                "lddDurT": self.ldd_idx,
+                "lrd": self.lrd,
+                "lrdT": self.lrd_idx,
+            }
+        if self.qs:
+            var, _ = cal_var_es(np.array(self.rets, dtype=np.float64), self.qs)
+            d.update({f"q{q:02d}": v for q, v in zip(self.qs, var)})
         return d
+
+    def get_state(self) -> dict:
+        """
+
+        :return: a dict of python objects, which could be saved by json or pickle,
+                 indices like pd.Timestamp are converted to str, int and str are kept
+        """
+        state = dict(self.__dict__)
+        for key in ("mdd_idx", "ldd_idx", "lrd_idx"):
+            idx = state[key]
+            if isinstance(idx, np.integer):
+                state[key] = int(idx)
+            elif not (idx is None or isinstance(idx, (str, int))):
+                state[key] = str(idx)
+        return state
+
+    @staticmethod
+    def from_state(state: dict) -> "CNAVOnline":
+        nav = CNAVOnline(state["annual_factor"], state["annual_rf_rate"], tuple(state["qs"]))
+        nav.__dict__.update(state)
+        nav.qs = tuple(nav.qs)
+        return nav
+
+
+"""
+------ bootstrap ------
+"""
+
+TBootstrap = Literal["stationary", "block", "iid"]
+
+
+def gen_bootstrap_indices(
+    n: int, n_samples: int, rng: np.random.Generator, method: TBootstrap = "stationary", block_size: int = 20,
+) -> np.ndarray:
+    """
+
+    :param n: length of the original series, and the length of each resample
+    :param n_samples: number of resamples
+    :param rng: random generator
+    :param method: "stationary": blocks with random lengths, which follow a geometric distribution
+                                 with mean = block_size (Politis & Romano, 1994).
+                   "block": blocks with fixed length = block_size.
+                   "iid": each value is drawn independently, i.e. block_size = 1.
+                   Blocks wrap around the end of the series.
+    :param block_size: mean or fixed length of blocks
+    :return: an int array with shape = (n_samples, n), locations of values in the original series
+    """
+    t = np.arange(n)
+    if method == "stationary":
+        is_new_block = rng.random((n_samples, n)) < 1 / block_size
+        is_new_block[:, 0] = True
+    elif method == "block":
+        is_new_block = np.broadcast_to(t % block_size == 0, (n_samples, n))
+    elif method == "iid":
+        is_new_block = np.ones((n_samples, n), dtype=bool)
+    else:
+        raise ValueError(f"method = {method} is illegal, options should from =('stationary', 'block', 'iid')")
+    block_bgn_locs = np.maximum.accumulate(np.where(is_new_block, t, 0), axis=1)
+    starts = rng.integers(0, n, size=(n_samples, n))
+    block_starts = np.take_along_axis(starts, block_bgn_locs, axis=1)
+    return (block_starts + t - block_bgn_locs) % n
+
+
+def _cal_bootstrap_chunk(boot: "CNAVBootstrap", n_samples: int, seed: np.random.SeedSequence, kwargs: dict) -> pd.DataFrame:
+    indices = gen_bootstrap_indices(len(boot.rtn), n_samples, np.random.default_rng(seed), boot.method, boot.block_size)
+    panel = CNAVPanel(boot.rtn[indices].T, "RET", annual_factor=boot.annual_factor,
+                      annual_rf_rate=boot.annual_rf_rate)
+    panel.cal_all_indicators(**kwargs)
+    res = panel.to_frame()
+    # locations in a resample are meaningless
+    return res.drop(columns=["mddT", "lddDurT", "lrdT"], errors="ignore").astype(np.float64)
+
+
+class CNAVBootstrap(object):
+    def __init__(self, rtn_srs: pd.Series, annual_factor: float = 250, annual_rf_rate: float = 0,
+                 method: TBootstrap = "stationary", block_size: int = 20):
+        """
+        Confidence intervals of CNAV indicators by bootstrap. All the resamples of a chunk are
+        generated as one 2-D array and evaluated by CNAVPanel.
+
+        :param rtn_srs: the Assets Return series, same as CNAV with input_type = "RET"
+        :param annual_factor: same as CNAV
+        :param annual_rf_rate: same as CNAV
+        :param method: "stationary", "block" or "iid", see gen_bootstrap_indices
+        :param block_size: mean or fixed length of blocks, see gen_bootstrap_indices
+        """
+        self.rtn_srs = rtn_srs
+        self.rtn: np.ndarray = rtn_srs.to_numpy(dtype=np.float64)
+        self.annual_factor = annual_factor
+        self.annual_rf_rate = annual_rf_rate
+        self.method: TBootstrap = method
+        self.block_size = block_size
+
+    def cal_samples(self, n_samples: int = 1000, chunk_size: int = 500, n_jobs: int = 1, seed: int = 0,
+                    method: str = "linear", excluded: tuple[str, ...] = (), qs: tuple[int, ...] = ()) -> pd.DataFrame:
+        """
+
+        :param n_samples: number of resamples
+        :param chunk_size: number of resamples evaluated at once, memory cost is about
+                           chunk_size * len(rtn_srs) * 8 bytes * 10
+        :param n_jobs: number of worker processes to evaluate chunks, 1 to run in this process
+        :param seed: random seed, chunks use independent child seeds, so the results do not depend on n_jobs
+        :param method, excluded, qs: same as CNAV.cal_all_indicators
+        :return: a pd.DataFrame with one row for each resample, columns = numeric keys of CNAV.to_dict()
+        """
+        sizes = [min(chunk_size, n_samples - i) for i in range(0, n_samples, chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        kwargs = {"method": method, "excluded": excluded, "qs": qs}
+        if n_jobs == 1:
+            res = [_cal_bootstrap_chunk(self, size, sd, kwargs) for size, sd in zip(sizes, seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                res = list(executor.map(_cal_bootstrap_chunk, [self] * len(sizes), sizes, seeds, [kwargs] * len(sizes)))
+        return pd.concat(res, axis=0, ignore_index=True)
+
+    def cal_intervals(self, ci: float = 0.95, n_samples: int = 1000, chunk_size: int = 500, n_jobs: int = 1,
+                      seed: int = 0, method: str = "linear", excluded: tuple[str, ...] = (),
+                      qs: tuple[int, ...] = ()) -> pd.DataFrame:
+        """
+
+        :param ci: confidence level, like 0.95 for the percentile interval [2.5%, 97.5%]
+        :param n_samples, chunk_size, n_jobs, seed: same as cal_samples
+        :param method, excluded, qs: same as CNAV.cal_all_indicators
+        :return: a pd.DataFrame with index = ["estimate", "lower", "upper"], columns = numeric keys of
+                 CNAV.to_dict(), "estimate" is calculated from the original series.
+        """
+        samples = self.cal_samples(n_samples, chunk_size, n_jobs, seed, method, excluded, qs)
+        nav = CNAV(self.rtn_srs, input_type="RET", annual_factor=self.annual_factor,
+                   annual_rf_rate=self.annual_rf_rate)
+        nav.cal_all_indicators(method=method, excluded=excluded, qs=qs)
+        estimate = pd.Series(nav.to_dict())
+        lower = samples.quantile((1 - ci) / 2)
+        upper = samples.quantile((1 + ci) / 2)
+        return pd.DataFrame({"estimate": estimate[samples.columns], "lower": lower, "upper": upper}).T
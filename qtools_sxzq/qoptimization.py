@@ -1,15 +1,253 @@
+import time
 import numpy as np
-from scipy.optimize import minimize, NonlinearConstraint, OptimizeResult
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy.linalg import cho_factor, cho_solve, lu_factor, lu_solve
+from scipy.optimize import minimize, NonlinearConstraint, LinearConstraint, OptimizeResult
 from typing import Union
 
 
+"""
+------ structured covariance ------
+"""
+
+
+class CCovarianceFactor:
+    # let numpy defer w @ cov to CCovarianceFactor.__rmatmul__
+    __array_ufunc__ = None
+
+    def __init__(self, b: np.ndarray, sigma: np.ndarray, d: np.ndarray, scale: float = 1.0):
+        """
+        covariance matrix V = scale * (b @ sigma @ b.T + diag(d)), it is never formed, so the
+        products with vectors cost O(p * k) instead of O(p ^ 2), and memory is O(p * k).
+
+        :param b: exposure matrix with size = p x k
+        :param sigma: factor covariance matrix with size = k x k
+        :param d: specific variances with size = p
+        :param scale: used to represent lbd * V without copying b, sigma and d
+        """
+        self.b = b
+        self.sigma = sigma
+        self.d = d
+        self.scale = scale
+        self.p, self.k = self.b.shape
+        if self.sigma.shape != (self.k, self.k):
+            raise ValueError(f"Shape of exposure is = {self.b.shape}, factor covariance is = {self.sigma.shape}")
+        if self.d.shape != (self.p,):
+            raise ValueError(f"Shape of exposure is = {self.b.shape}, specific variances is = {self.d.shape}")
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.p, self.p
+
+    def __matmul__(self, w: np.ndarray) -> np.ndarray:
+        return self.scale * (self.b @ (self.sigma @ (self.b.T @ w)) + self.d * w)
+
+    def __rmatmul__(self, w: np.ndarray) -> np.ndarray:
+        # V is symmetric
+        return self @ w
+
+    def __mul__(self, c: float) -> "CCovarianceFactor":
+        return CCovarianceFactor(b=self.b, sigma=self.sigma, d=self.d, scale=self.scale * c)
+
+    __rmul__ = __mul__
+
+    def diagonal(self) -> np.ndarray:
+        return self.scale * (np.einsum("ij,jk,ik->i", self.b, self.sigma, self.b) + self.d)
+
+    def to_dense(self) -> np.ndarray:
+        return self.scale * (self.b @ self.sigma @ self.b.T + np.diag(self.d))
+
+    def shifted_solver(self, rho: float) -> callable:
+        """
+
+        :param rho: shift
+        :return: a function r -> (V + rho * I)^{-1} @ r, by the Woodbury identity
+                 (A + B S B')^{-1} = A^{-1} - A^{-1} B S (I + B' A^{-1} B S)^{-1} B' A^{-1}
+                 with A = scale * diag(d) + rho * I and S = scale * sigma, only a k x k system is solved.
+        """
+        a_inv = 1 / (self.scale * self.d + rho)
+        s = self.scale * self.sigma
+        core = np.eye(self.k) + (self.b.T * a_inv) @ self.b @ s
+        lu = lu_factor(core)
+
+        def solve(r: np.ndarray) -> np.ndarray:
+            y = a_inv * r
+            return y - a_inv * (self.b @ (s @ lu_solve(lu, self.b.T @ y)))
+
+        return solve
+
+
+"""
+------ convex QP solver ------
+"""
+
+
+class CQPSolverADMM:
+    def __init__(
+            self,
+            p_mat: Union[np.ndarray, CCovarianceFactor], q: np.ndarray,
+            bounds: list[tuple[float, float]] = None,
+            l1_ub: float = None,
+            budget: float = None,
+            rho: float = None,
+            alpha: float = 1.6,
+            max_iter: int = 50000,
+            tol: float = 1e-6,
+    ):
+        """
+        minimize 0.5 * w @ p_mat @ w - q @ w, subject to bounds, sum(abs(w)) <= l1_ub and sum(w) = budget,
+        by ADMM with w - z = 0, where z is projected onto the feasible set at each iteration, and the
+        linear system of the w update is solved by a cached Cholesky factorization of p_mat + rho * I.
+        The factorizations are kept for each rho, so solving a sequence of problems sharing p_mat,
+        with different q, reuses them.
+
+        :param p_mat: positive semi-definite matrix with size = p x p, or a CCovarianceFactor, whose
+                      linear systems are solved by the Woodbury identity instead
+        :param q: vector with size = p
+        :param bounds: bounds of w, None is used to specify no bound
+        :param l1_ub: upper bound of sum(abs(w)), None is used to specify no bound
+        :param budget: sum(w) = budget if provided, can not be used with l1_ub
+        :param rho: initial penalty, mean of diag(p_mat) if not provided, it is adapted during
+                    iterations to balance the primal and dual residuals
+        :param alpha: over-relaxation parameter, in (0, 2)
+        :param max_iter: maximum iteration
+        :param tol: absolute and relative tolerance of primal and dual residuals
+        """
+        self.p_mat = p_mat
+        self.q = q
+        self.p = len(q)
+        w_bounds = bounds if bounds is not None else [(None, None)] * self.p
+        self.lo = np.array([-np.inf if lo is None else lo for lo, _ in w_bounds], dtype=float)
+        self.hi = np.array([np.inf if hi is None else hi for _, hi in w_bounds], dtype=float)
+        if l1_ub is not None and budget is not None:
+            raise ValueError("l1_ub and budget can not be used at the same time")
+        if np.any(self.lo > self.hi):
+            raise ValueError("lower bounds are greater than upper bounds")
+        if l1_ub is not None and np.sum(np.abs(np.clip(0, self.lo, self.hi))) > l1_ub:
+            raise ValueError(f"sum(abs(w)) <= {l1_ub} is infeasible with the bounds")
+        if budget is not None and not (np.sum(self.lo) <= budget <= np.sum(self.hi)):
+            raise ValueError(f"sum(w) = {budget} is infeasible with the bounds")
+        self.l1_ub = l1_ub
+        self.budget = budget
+        diag = p_mat.diagonal() if isinstance(p_mat, CCovarianceFactor) else np.diag(p_mat)
+        self.rho = rho if rho is not None else max(float(np.mean(diag)), 1e-8)
+        self.alpha = alpha
+        self.max_iter = max_iter
+        self.tol = tol
+        self.shifted_solvers: dict[float, callable] = {}
+
+    @staticmethod
+    def bisect(fun: callable, target: float, lo: float, hi: float, n: int = 100) -> float:
+        """
+        find x in [lo, hi] with fun(x) = target for a non-increasing fun, fun(lo) >= target >= fun(hi)
+        """
+        for _ in range(n):
+            mid = 0.5 * (lo + hi)
+            if fun(mid) > target:
+                lo = mid
+            else:
+                hi = mid
+            if hi - lo <= 1e-14 * max(1.0, abs(hi)):
+                break
+        return hi
+
+    def project(self, y: np.ndarray) -> np.ndarray:
+        z = np.clip(y, self.lo, self.hi)
+        if self.l1_ub is not None and np.sum(np.abs(z)) > self.l1_ub:
+            # the projection is clip(soft_threshold(y, tau)) with the smallest tau >= 0 satisfying the l1 bound
+            shrink = lambda tau: np.clip(np.sign(y) * np.maximum(np.abs(y) - tau, 0), self.lo, self.hi)
+            tau = self.bisect(lambda t: np.sum(np.abs(shrink(t))), self.l1_ub, 0.0, np.max(np.abs(y)))
+            z = shrink(tau)
+        elif self.budget is not None:
+            # the projection is clip(y - nu) with nu satisfying the budget
+            shift = lambda nu: np.sum(np.clip(y - nu, self.lo, self.hi))
+            nu_lo, nu_hi = -1.0, 1.0
+            while shift(nu_lo) < self.budget:
+                nu_lo *= 2
+            while shift(nu_hi) > self.budget:
+                nu_hi *= 2
+            z = np.clip(y - self.bisect(shift, self.budget, nu_lo, nu_hi), self.lo, self.hi)
+        return z
+
+    def shifted_solver(self, rho: float) -> callable:
+        """
+
+        :return: a function r -> (p_mat + rho * I)^{-1} @ r
+        """
+        if rho not in self.shifted_solvers:
+            if isinstance(self.p_mat, CCovarianceFactor):
+                self.shifted_solvers[rho] = self.p_mat.shifted_solver(rho)
+            else:
+                factor = cho_factor(self.p_mat + rho * np.eye(self.p))
+                self.shifted_solvers[rho] = lambda r: cho_solve(factor, r)
+        return self.shifted_solvers[rho]
+
+    def solve(
+            self,
+            x0: np.ndarray = None,
+            q: np.ndarray = None,
+            u0: np.ndarray = None,
+    ) -> OptimizeResult:
+        """
+
+        :param x0: init guess, warm starts the iterations if provided
+        :param q: solve with this q instead of self.q, p_mat and the constraints are unchanged
+        :param u0: init scaled dual variable, like u of a previous result, it is scaled with self.rho
+        :return: result in the format of scipy.optimize.OptimizeResult, x is always feasible,
+                 u is the final scaled dual variable w.r.t self.rho, to warm start the next solve.
+        """
+        q = self.q if q is None else q
+        p, rho = self.p, self.rho
+        shifted_solve = self.shifted_solver(rho)
+        z = self.project(np.zeros(p) if x0 is None else np.asarray(x0, dtype=float))
+        u = np.zeros(p) if u0 is None else u0
+        status, message, nit = 1, "Iteration limit reached", self.max_iter
+        for k in range(self.max_iter):
+            w = shifted_solve(q + rho * (z - u))
+            w_hat = self.alpha * w + (1 - self.alpha) * z
+            z_prev = z
+            z = self.project(w_hat + u)
+            u = u + w_hat - z
+
+            r_prim = np.linalg.norm(w - z)
+            r_dual = rho * np.linalg.norm(z - z_prev)
+            eps_prim = self.tol * (np.sqrt(p) + max(np.linalg.norm(w), np.linalg.norm(z)))
+            eps_dual = self.tol * (np.sqrt(p) + rho * np.linalg.norm(u))
+            if r_prim <= eps_prim and r_dual <= eps_dual:
+                status, message, nit = 0, "Optimization terminated successfully", k + 1
+                break
+
+            # residual balancing, u is the scaled dual variable, so it is rescaled with rho
+            if (k + 1) % 50 == 0 and (r_prim > 10 * r_dual or r_dual > 10 * r_prim):
+                scale = 2.0 if r_prim > r_dual else 0.5
+                rho, u = rho * scale, u / scale
+                shifted_solve = self.shifted_solver(rho)
+        fun = 0.5 * z @ (self.p_mat @ z) - q @ z
+        return OptimizeResult(
+            x=z, fun=fun, success=status == 0, status=status, message=message, nit=nit, u=u * rho / self.rho,
+        )
+
+
 class COptimizerPortfolio:
-    def __init__(self, m: np.ndarray, v: np.ndarray):
+    SOLVERS = ("scipy", "qp")
+    qp_supported = False
+
+    def __init__(self, m: np.ndarray, v: Union[np.ndarray, CCovarianceFactor], solver: str = "scipy"):
         """
 
         :param m: mean matrix with size = p x 1
-        :param v: covariance matrix with size = p x p
+        :param v: covariance matrix with size = p x p, or a CCovarianceFactor for a factor model
+                  covariance, then all the evaluations of variance and its gradient cost O(p * k)
+        :param solver: "scipy" to solve by scipy.optimize.minimize, "qp" to solve by the built-in
+                       convex QP solver CQPSolverADMM, only available for optimizers whose target
+                       is quadratic and constraints are convex, see qp_supported.
         """
+        if solver not in self.SOLVERS:
+            raise ValueError(f"solver = {solver} is illegal, available options = {self.SOLVERS}")
+        if solver == "qp" and not self.qp_supported:
+            raise ValueError(f"solver = 'qp' is not supported by {type(self).__name__}")
+        self.solver = solver
         self.m = m
         self.v = v
         self.p, _ = self.v.shape
@@ -26,7 +264,7 @@ class COptimizerPortfolio:
         return w @ self.m
 
     def covariance(self, w: np.ndarray):
-        return w @ self.v @ w
+        return w @ (self.v @ w)
 
     def volatility(self, w: np.ndarray):
         return self.covariance(w) ** 0.5
@@ -34,9 +272,33 @@ class COptimizerPortfolio:
     def sharpe(self, w: np.ndarray):
         return self.returns(w) / self.volatility(w)
 
+    def returns_grad(self, w: np.ndarray) -> np.ndarray:
+        return self.m
+
+    def covariance_grad(self, w: np.ndarray) -> np.ndarray:
+        # covariance matrix is symmetric
+        return 2 * (self.v @ w)
+
+    def volatility_grad(self, w: np.ndarray) -> np.ndarray:
+        return self.v @ w / self.volatility(w)
+
+    def sharpe_grad(self, w: np.ndarray) -> np.ndarray:
+        vol = self.volatility(w)
+        return self.m / vol - self.returns(w) * (self.v @ w) / vol ** 3
+
     def target(self, w: np.ndarray):
         raise NotImplementedError
 
+    def target_grad(self, w: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def quadratic_form(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+
+        :return: (p_mat, q) with target(w) = 0.5 * w @ p_mat @ w - q @ w, used by the QP solver
+        """
+        raise NotImplementedError
+
     def optimize(self) -> tuple[np.ndarray, float]:
         raise NotImplementedError
 
@@ -53,7 +315,8 @@ class COptimizerPortfolio:
 
 
 class _COptimizerScipyMinimize(COptimizerPortfolio):
-    def __init__(self, m: np.ndarray, v: np.ndarray, x0: Union[np.ndarray, str], max_iter: int, tol: float):
+    def __init__(self, m: np.ndarray, v: Union[np.ndarray, CCovarianceFactor], x0: Union[np.ndarray, str],
+                 max_iter: int, tol: float, use_jac: bool = True, solver: str = "scipy"):
         """
 
         :param x0: init guess, or a string to indicate the method to generate init guess, available
@@ -62,8 +325,12 @@ class _COptimizerScipyMinimize(COptimizerPortfolio):
         :param tol: when too small, the target may be sensitive to the change of the input, and
                     results maybe overfitted. You may want to adjust it to adapt to your input
                     data scale.
+        :param use_jac: if True, analytic gradients of target and constraints are passed to the solver,
+                        and sum(abs(w)) <= ub is solved as a linear constraint with w = u - l, u, l >= 0.
+                        if False, gradients are estimated by finite differences.
+        :param solver: see COptimizerPortfolio
         """
-        super().__init__(m, v)
+        super().__init__(m, v, solver=solver)
         if isinstance(x0, str):
             if x0 == "aver":
                 self.x0 = np.ones(self.p) / self.p
@@ -73,16 +340,135 @@ class _COptimizerScipyMinimize(COptimizerPortfolio):
             self.x0 = x0
         self.max_iter = max_iter
         self.tol = tol
+        self.use_jac = use_jac
+
+    @staticmethod
+    def split_bounds(bounds: list[tuple[float, float]], p: int) -> list[tuple[float, float]]:
+        """
+
+        :param bounds: bounds of w, None is used to specify no bound
+        :param p: number of assets
+        :return: bounds of [u, l], u = max(w, 0), l = max(-w, 0)
+        """
+        w_bounds = bounds if bounds is not None else [(None, None)] * p
+        pos = lambda z: None if z is None else max(z, 0.0)
+        neg = lambda z: None if z is None else max(-z, 0.0)
+        u_bounds = [(pos(lo) or 0.0, pos(hi)) for lo, hi in w_bounds]
+        l_bounds = [(neg(hi) or 0.0, neg(lo)) for lo, hi in w_bounds]
+        return u_bounds + l_bounds
+
+    def minimize_with_l1(
+            self,
+            tot_mkt_val_bds: tuple[float, float],
+            bounds: list[tuple[float, float]],
+            w_cons: list[tuple[callable, callable, float, float]],
+    ) -> OptimizeResult:
+        """
+        minimize self.target subject to lb <= sum(abs(w)) <= ub, bounds and other constraints
+
+        :param tot_mkt_val_bds: (lb, ub) of sum(abs(w))
+        :param bounds: bounds of w
+        :param w_cons: other constraints on w, each is (fun, jac, lb, ub)
+        :return: result of scipy.optimize.minimize, x is always w
+        """
+        lb, ub = tot_mkt_val_bds
+        if not self.use_jac:
+            cons = [NonlinearConstraint(lambda z: np.sum(np.abs(z)), lb=lb, ub=ub)]
+            cons += [NonlinearConstraint(fun, lb=c_lb, ub=c_ub) for fun, _, c_lb, c_ub in w_cons]
+            # noinspection PyTypeChecker
+            return minimize(
+                fun=self.target, x0=self.x0,
+                bounds=bounds,
+                constraints=cons,
+                options={"maxiter": self.max_iter},
+                tol=self.tol,
+            )
+
+        if lb > 0:
+            # lb > 0 could be satisfied by u and l offsetting each other, so sum(abs(w)) is kept
+            # with its subgradient
+            cons = [NonlinearConstraint(lambda z: np.sum(np.abs(z)), lb=lb, ub=ub, jac=lambda z: np.sign(z)[None, :])]
+            cons += [NonlinearConstraint(fun, lb=c_lb, ub=c_ub, jac=jac) for fun, jac, c_lb, c_ub in w_cons]
+            # noinspection PyTypeChecker
+            return minimize(
+                fun=self.target, x0=self.x0, jac=self.target_grad,
+                bounds=bounds,
+                constraints=cons,
+                options={"maxiter": self.max_iter},
+                tol=self.tol,
+            )
+
+        if bounds is not None and all(lo is not None and lo >= 0 for lo, _ in bounds):
+            # long only, sum(abs(w)) = sum(w) is linear already
+            cons = [LinearConstraint(np.ones((1, self.p)), lb=lb, ub=ub)]
+            cons += [NonlinearConstraint(fun, lb=c_lb, ub=c_ub, jac=jac) for fun, jac, c_lb, c_ub in w_cons]
+            # noinspection PyTypeChecker
+            return minimize(
+                fun=self.target, x0=self.x0, jac=self.target_grad,
+                bounds=bounds,
+                constraints=cons,
+                options={"maxiter": self.max_iter},
+                tol=self.tol,
+            )
+
+        # x = [u, l], w = u - l, sum(abs(w)) <= sum(u + l) and they are equal at the optimum
+        # whenever the constraint is binding
+        p = self.p
+        to_w = lambda x: x[:p] - x[p:]
+        split_jac = lambda g: np.concatenate([g, -g], axis=-1)
+        cons = [LinearConstraint(np.ones((1, 2 * p)), lb=lb, ub=ub)]
+        cons += [
+            NonlinearConstraint(
+                lambda x, _fun=fun: _fun(to_w(x)), lb=c_lb, ub=c_ub,
+                jac=lambda x, _jac=jac: split_jac(np.atleast_2d(_jac(to_w(x)))),
+            ) for fun, jac, c_lb, c_ub in w_cons
+        ]
+        x0 = np.concatenate([np.maximum(self.x0, 0), np.maximum(-self.x0, 0)])
+        # noinspection PyTypeChecker
+        res = minimize(
+            fun=lambda x: self.target(to_w(x)), x0=x0, jac=lambda x: split_jac(self.target_grad(to_w(x))),
+            bounds=self.split_bounds(bounds, p),
+            constraints=cons,
+            options={"maxiter": self.max_iter},
+            tol=self.tol,
+        )
+        res.x = to_w(res.x)
+        return res
+
+    def minimize_qp(
+            self,
+            bounds: list[tuple[float, float]],
+            l1_ub: float = None,
+            budget: float = None,
+    ) -> OptimizeResult:
+        """
+        minimize self.target by CQPSolverADMM, starting from self.x0
+
+        :param bounds: bounds of w
+        :param l1_ub: upper bound of sum(abs(w))
+        :param budget: sum(w) = budget
+        :return: result in the format of scipy.optimize.OptimizeResult
+        """
+        p_mat, q = self.quadratic_form()
+        solver = CQPSolverADMM(
+            p_mat=p_mat, q=q, bounds=bounds, l1_ub=l1_ub, budget=budget,
+            max_iter=self.max_iter, tol=self.tol,
+        )
+        return solver.solve(x0=self.x0)
 
 
 class COptimizerPortfolioUtility(_COptimizerScipyMinimize):
+    qp_supported = True
+
     def __init__(
             self,
-            m: np.ndarray, v: np.ndarray, lbd: float, x0: Union[np.ndarray, str],
+            m: np.ndarray, v: Union[np.ndarray, CCovarianceFactor], lbd: float, x0: Union[np.ndarray, str],
             tot_mkt_val_bds: tuple[float, float] = (0.0, 1.0),
             bounds: list[tuple[float, float]] = None,
             max_iter: int = 50000,
             tol: float = 1e-6,
+            use_jac: bool = True,
+            solver: str = "scipy",
     ):
         """
 
@@ -91,10 +477,14 @@ class COptimizerPortfolioUtility(_COptimizerScipyMinimize):
                                  the problem will not be convex
         :param bounds: bounds[0] <= w_i <= bounds[1], Sequence of (min, max) pairs for each
                        element in x. None is used to specify no bound.
+        :param use_jac: see _COptimizerScipyMinimize
+        :param solver: see COptimizerPortfolio, "qp" requires lb = 0 in tot_mkt_val_bds
         :return:
         """
 
-        super().__init__(m=m, v=v, x0=x0, max_iter=max_iter, tol=tol)
+        super().__init__(m=m, v=v, x0=x0, max_iter=max_iter, tol=tol, use_jac=use_jac, solver=solver)
+        if solver == "qp" and tot_mkt_val_bds[0] > 0:
+            raise ValueError(f"solver = 'qp' requires lb = 0, tot_mkt_val_bds = {tot_mkt_val_bds} is not convex")
         self.lbd = lbd
         self.tot_mkt_val_bds = tot_mkt_val_bds
         self.bounds = bounds
@@ -102,81 +492,445 @@ class COptimizerPortfolioUtility(_COptimizerScipyMinimize):
     def utility(self, w: np.ndarray):
         return self.returns(w) - 0.5 * self.lbd * self.covariance(w)
 
+    def utility_grad(self, w: np.ndarray) -> np.ndarray:
+        return self.returns_grad(w) - 0.5 * self.lbd * self.covariance_grad(w)
+
     def target(self, w: np.ndarray):
         return -self.utility(w)
 
+    def target_grad(self, w: np.ndarray) -> np.ndarray:
+        return -self.utility_grad(w)
+
+    def quadratic_form(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.lbd * self.v, self.m
+
     @COptimizerPortfolio.parse_res
     def optimize(self) -> OptimizeResult:
-        lb, ub = self.tot_mkt_val_bds
-        cons = NonlinearConstraint(lambda z: np.sum(np.abs(z)), lb=lb, ub=ub)  # control total market value
-
-        # noinspection PyTypeChecker
-        res = minimize(
-            fun=self.target, x0=self.x0,
-            bounds=self.bounds,
-            constraints=[cons],
-            options={"maxiter": self.max_iter},
-            tol=self.tol,
-        )
-        return res
+        # control total market value
+        if self.solver == "qp":
+            return self.minimize_qp(self.bounds, l1_ub=self.tot_mkt_val_bds[1])
+        return self.minimize_with_l1(self.tot_mkt_val_bds, self.bounds, w_cons=[])
 
 
 class COptimizerPortfolioUtilityRiskCtrl(COptimizerPortfolioUtility):
+    qp_supported = False  # risk control is a quadratic constraint
+
     def __init__(self, risk_exposure: np.ndarray, sig: np.ndarray, **kwargs):
         super().__init__(**kwargs)
         self.risk_exposure = risk_exposure
         self.sig = sig
         self.fh = self.risk_exposure @ self.sig
 
+    def risk(self, w: np.ndarray):
+        return (self.fh @ w) @ (self.fh @ w)
+
+    def risk_grad(self, w: np.ndarray) -> np.ndarray:
+        return 2 * ((self.fh @ w) @ self.fh)
+
     @COptimizerPortfolio.parse_res
     def optimize(self) -> OptimizeResult:
-        lb, ub = self.tot_mkt_val_bds
-        cons1 = NonlinearConstraint(lambda z: np.sum(np.abs(z)), lb=lb, ub=ub)
-        cons2 = NonlinearConstraint(lambda z: (self.fh @ z) @ (self.fh @ z), lb=0, ub=1e-2 * self.fh.shape[0])
-
-        # noinspection PyTypeChecker
-        res = minimize(
-            fun=self.target,
-            x0=self.x0,
-            bounds=self.bounds,
-            constraints=[cons1, cons2],
-            options={"maxiter": self.max_iter},
-            tol=self.tol,
-        )
-        return res
+        risk_cons = (self.risk, self.risk_grad, 0, 1e-2 * self.fh.shape[0])
+        return self.minimize_with_l1(self.tot_mkt_val_bds, self.bounds, w_cons=[risk_cons])
 
 
 class COptimizerPortfolioSharpe(_COptimizerScipyMinimize):
     def __init__(
             self,
-            m: np.ndarray, v: np.ndarray, x0: Union[np.ndarray, str],
+            m: np.ndarray, v: Union[np.ndarray, CCovarianceFactor], x0: Union[np.ndarray, str],
             bounds: list[tuple[float, float]],
             max_iter: int = 50000,
             tol: float = 1e-6,
+            use_jac: bool = True,
     ):
         """
 
         :param bounds: bounds[0] <= w_i <= bounds[1], Sequence of (min, max) pairs for each
                        element in x. None is used to specify no bound.
+        :param use_jac: see _COptimizerScipyMinimize
         """
-        super().__init__(m=m, v=v, x0=x0, max_iter=max_iter, tol=tol)
+        super().__init__(m=m, v=v, x0=x0, max_iter=max_iter, tol=tol, use_jac=use_jac)
         self.bounds = bounds
 
     def target(self, w: np.ndarray):
         return -self.sharpe(w)
 
+    def target_grad(self, w: np.ndarray) -> np.ndarray:
+        return -self.sharpe_grad(w)
+
     @COptimizerPortfolio.parse_res
     def optimize(self) -> OptimizeResult:
         # sharpe ratio is irrelevant to ths scale of z, i.e. the total market value
         # as the result of this, we provide a FIX scope for it
-        cons = NonlinearConstraint(lambda z: np.sum(np.abs(z)), lb=0.0, ub=1.0)
+        return self.minimize_with_l1((0.0, 1.0), self.bounds, w_cons=[])
+
+
+class COptimizerPortfolioMinVariance(_COptimizerScipyMinimize):
+    qp_supported = True
+
+    def __init__(
+            self,
+            m: np.ndarray, v: Union[np.ndarray, CCovarianceFactor], x0: Union[np.ndarray, str],
+            bounds: list[tuple[float, float]] = None,
+            budget: float = 1.0,
+            max_iter: int = 50000,
+            tol: float = 1e-6,
+            use_jac: bool = True,
+            solver: str = "scipy",
+    ):
+        """
 
+        :param m: mean is irrelevant to the target, it is kept for returns and sharpe of the result
+        :param bounds: bounds[0] <= w_i <= bounds[1], Sequence of (min, max) pairs for each
+                       element in x. None is used to specify no bound.
+        :param budget: sum(w) = budget
+        :param use_jac: see _COptimizerScipyMinimize
+        :param solver: see COptimizerPortfolio
+        """
+        super().__init__(m=m, v=v, x0=x0, max_iter=max_iter, tol=tol, use_jac=use_jac, solver=solver)
+        self.bounds = bounds
+        self.budget = budget
+
+    def target(self, w: np.ndarray):
+        return self.covariance(w)
+
+    def target_grad(self, w: np.ndarray) -> np.ndarray:
+        return self.covariance_grad(w)
+
+    def quadratic_form(self) -> tuple[np.ndarray, np.ndarray]:
+        return 2 * self.v, np.zeros(self.p)
+
+    @COptimizerPortfolio.parse_res
+    def optimize(self) -> OptimizeResult:
+        if self.solver == "qp":
+            return self.minimize_qp(self.bounds, budget=self.budget)
+        cons = [LinearConstraint(np.ones((1, self.p)), lb=self.budget, ub=self.budget)]
         # noinspection PyTypeChecker
-        res = minimize(
-            fun=self.target, x0=self.x0,
+        return minimize(
+            fun=self.target, x0=self.x0, jac=self.target_grad if self.use_jac else None,
             bounds=self.bounds,
-            constraints=[cons],
+            constraints=cons,
             options={"maxiter": self.max_iter},
             tol=self.tol,
         )
-        return res
+
+
+"""
+------ rolling optimization ------
+"""
+
+
+def _optimize_block(
+        opt_type: type[_COptimizerScipyMinimize], opt_kwargs: dict,
+        ms: list[np.ndarray], vs: list[Union[np.ndarray, CCovarianceFactor]], date_kwargs: list[dict],
+        x0: Union[np.ndarray, str], warm_start: bool,
+) -> tuple[list[np.ndarray], list[dict]]:
+    """
+    solve the dates of one block sequentially, each solve starts from the solution of the previous date
+    if warm_start and the previous solve succeeded, otherwise starts from x0.
+
+    :return: (weights, diagnostics) for each date
+    """
+    weights, diagnostics = [], []
+    prev_x: Union[np.ndarray, None] = None
+    for m, v, kwargs in zip(ms, vs, date_kwargs):
+        is_warm = warm_start and (prev_x is not None)
+        optimizer = opt_type(m=m, v=v, x0=prev_x if is_warm else x0, **opt_kwargs, **kwargs)
+        t0 = time.perf_counter()
+        res = optimizer.optimize()
+        elapsed = time.perf_counter() - t0
+        weights.append(res.x)
+        diagnostics.append({
+            "success": bool(res.success),
+            "status": int(res.status),
+            "message": str(res.message),
+            "nit": int(res.get("nit", -1)),
+            "nfev": int(res.get("nfev", -1)),
+            "fun": float(res.fun),
+            "warm": is_warm,
+            "elapsed": elapsed,
+        })
+        # a failed or degenerated solution, like all zeros for Sharpe, is not a good start for the next date
+        if res.success and np.all(np.isfinite(res.x)) and np.any(res.x != 0):
+            prev_x = res.x
+        else:
+            prev_x = None
+    return weights, diagnostics
+
+
+class COptimizerRolling:
+    def __init__(
+            self,
+            opt_type: type[_COptimizerScipyMinimize],
+            opt_kwargs: dict = None,
+            warm_start: bool = True,
+            n_jobs: int = 1,
+            block_size: int = 250,
+    ):
+        """
+        Solve the same optimization problem on a sequence of rebalance dates. Dates are split
+        into blocks of consecutive dates, blocks are solved in parallel, and in each block
+        the solve of a date starts from the solution of the previous date.
+
+        :param opt_type: COptimizerPortfolioUtility, COptimizerPortfolioUtilityRiskCtrl,
+                         COptimizerPortfolioSharpe, COptimizerPortfolioMinVariance or other
+                         subclasses of _COptimizerScipyMinimize
+        :param opt_kwargs: arguments shared by all the dates, except m, v and x0,
+                           like {"lbd": 10, "bounds": [(0, 0.2)] * p, "solver": "qp"}
+        :param warm_start: if False, all the solves start from x0
+        :param n_jobs: number of processes, 1 to solve all the blocks in this process
+        :param block_size: number of dates in a block, only the first date of a block starts cold,
+                           a larger block means more warm starts but less parallelism.
+        """
+        self.opt_type = opt_type
+        self.opt_kwargs = opt_kwargs or {}
+        self.warm_start = warm_start
+        self.n_jobs = n_jobs
+        self.block_size = block_size
+
+    def optimize(
+            self,
+            dates: list[str],
+            ms: list[np.ndarray],
+            vs: list[Union[np.ndarray, CCovarianceFactor]],
+            assets: list[str] = None,
+            date_kwargs: list[dict] = None,
+            x0: Union[np.ndarray, str] = "aver",
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+
+        :param dates: rebalance dates
+        :param ms: mean of each date, with size = p x 1, p must be the same for all the dates
+        :param vs: covariance of each date, with size = p x p, or a CCovarianceFactor
+        :param assets: names of the p assets, 0, 1, ..., p - 1 if not provided
+        :param date_kwargs: arguments for each date, like [{"risk_exposure": ..., "sig": ...}, ...]
+                            for COptimizerPortfolioUtilityRiskCtrl
+        :param x0: init guess for the first date of each block, and for the dates after a failure
+        :return: (weights, diagnostics)
+                 weights: a pd.DataFrame with index = dates, columns = assets
+                 diagnostics: a pd.DataFrame with index = dates, columns = ["success", "status",
+                 "message", "nit", "nfev", "fun", "warm", "elapsed"], nit is -1 if not provided by the method.
+        """
+        if not (len(dates) == len(ms) == len(vs)):
+            raise ValueError(f"length of dates = {len(dates)}, ms = {len(ms)}, vs = {len(vs)}, not aligned")
+        if date_kwargs is None:
+            date_kwargs = [{}] * len(dates)
+        elif len(date_kwargs) != len(dates):
+            raise ValueError(f"length of dates = {len(dates)}, date_kwargs = {len(date_kwargs)}, not aligned")
+
+        blocks = [(i, min(i + self.block_size, len(dates))) for i in range(0, len(dates), self.block_size)]
+        args = [
+            (self.opt_type, self.opt_kwargs, ms[b:e], vs[b:e], date_kwargs[b:e], x0, self.warm_start)
+            for b, e in blocks
+        ]
+        if self.n_jobs > 1 and len(blocks) > 1:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                results = list(executor.map(_optimize_block, *zip(*args)))
+        else:
+            results = [_optimize_block(*a) for a in args]
+
+        weights = [w for block_weights, _ in results for w in block_weights]
+        diagnostics = [d for _, block_diagnostics in results for d in block_diagnostics]
+        weights_df = pd.DataFrame(weights, index=dates, columns=assets)
+        diagnostics_df = pd.DataFrame(diagnostics, index=dates)
+        return weights_df, diagnostics_df
+
+
+"""
+------ efficient frontier ------
+"""
+
+
+class COptimizerFrontier:
+    def __init__(
+            self,
+            m: np.ndarray, v: Union[np.ndarray, CCovarianceFactor],
+            bounds: list[tuple[float, float]] = None,
+            tot_mkt_val_ub: float = 1.0,
+            solver: str = "qp",
+            warm_start: bool = True,
+            max_iter: int = 50000,
+            tol: float = 1e-6,
+    ):
+        """
+        Solve COptimizerPortfolioUtility for a grid of lbd, or for a grid of target volatilities,
+        with the same (m, v). With solver = "qp", the target is rewritten as
+        0.5 * w @ v @ w - (m / lbd) @ w, so all the points share the factorizations of v + rho * I
+        in one CQPSolverADMM, and each point starts from the solution and the rescaled dual variable
+        of the previous point.
+
+        :param bounds: bounds[0] <= w_i <= bounds[1], Sequence of (min, max) pairs for each
+                       element in x. None is used to specify no bound.
+        :param tot_mkt_val_ub: sum(abs(w)) <= tot_mkt_val_ub
+        :param solver: "qp" or "scipy", see COptimizerPortfolio
+        :param warm_start: if False, all the points start from scratch
+        """
+        if solver not in COptimizerPortfolio.SOLVERS:
+            raise ValueError(f"solver = {solver} is illegal, available options = {COptimizerPortfolio.SOLVERS}")
+        self.m = m
+        self.v = v
+        self.p = len(m)
+        self.bounds = bounds
+        self.tot_mkt_val_ub = tot_mkt_val_ub
+        self.solver = solver
+        self.warm_start = warm_start
+        self.max_iter = max_iter
+        self.tol = tol
+        if solver == "qp":
+            self.qp_solver = CQPSolverADMM(
+                p_mat=v, q=m, bounds=bounds, l1_ub=tot_mkt_val_ub, max_iter=max_iter, tol=tol,
+            )
+        self.state: dict = {}
+
+    def solve_point(self, lbd: float) -> tuple[np.ndarray, dict]:
+        """
+
+        :param lbd: risk aversion
+        :return: (weights, diagnostics), warm starts from self.state and updates it
+        """
+        t0 = time.perf_counter()
+        if self.solver == "qp":
+            if self.state:
+                # scaled dual variable is proportional to 1 / lbd for the same weights
+                u0 = self.state["u"] * self.state["lbd"] / lbd
+                res = self.qp_solver.solve(x0=self.state["x"], q=self.m / lbd, u0=u0)
+            else:
+                res = self.qp_solver.solve(q=self.m / lbd)
+        else:
+            optimizer = COptimizerPortfolioUtility(
+                m=self.m, v=self.v, lbd=lbd, x0=self.state.get("x", "aver"),
+                tot_mkt_val_bds=(0.0, self.tot_mkt_val_ub), bounds=self.bounds,
+                max_iter=self.max_iter, tol=self.tol,
+            )
+            res = optimizer.optimize()
+        elapsed = time.perf_counter() - t0
+        if self.warm_start and res.success:
+            self.state = {"x": res.x, "lbd": lbd, "u": res.get("u")}
+        w = res.x
+        ret, vol = w @ self.m, np.sqrt(max(w @ (self.v @ w), 0.0))
+        return w, {
+            "lbd": lbd,
+            "returns": ret,
+            "volatility": vol,
+            "sharpe": ret / vol if vol > 0 else np.nan,
+            "success": bool(res.success),
+            "nit": int(res.get("nit", -1)),
+            "elapsed": elapsed,
+        }
+
+    def optimize_lbds(self, lbds: list[float], assets: list[str] = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+
+        :param lbds: grid of risk aversion, solved in the given order, so a monotonic order is suggested
+        :param assets: names of the p assets, 0, 1, ..., p - 1 if not provided
+        :return: (weights, stats)
+                 weights: a pd.DataFrame with index = lbds, columns = assets
+                 stats: a pd.DataFrame with index = lbds, columns = ["lbd", "returns", "volatility",
+                 "sharpe", "success", "nit", "elapsed"]
+        """
+        self.state = {}
+        weights, stats = zip(*[self.solve_point(lbd) for lbd in lbds])
+        index = pd.Index(lbds, name="lbd")
+        return pd.DataFrame(list(weights), index=index, columns=assets), pd.DataFrame(list(stats), index=index)
+
+    def optimize_target_vols(
+            self,
+            vols: list[float],
+            lbd_range: tuple[float, float] = (1e-2, 1e4),
+            n_bisect: int = 40,
+            vol_tol: float = 1e-4,
+            assets: list[str] = None,
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        for each target volatility, find lbd by bisection on log(lbd), volatility is non-increasing in lbd.
+
+        :param vols: grid of target volatilities
+        :param lbd_range: search range of lbd, if a target is not reachable in the range,
+                          the point at the nearest end is returned.
+        :param n_bisect: maximum bisection steps for each target
+        :param vol_tol: relative tolerance of volatility
+        :param assets: names of the p assets, 0, 1, ..., p - 1 if not provided
+        :return: (weights, stats) with index = vols, stats has the same columns as optimize_lbds
+        """
+        self.state = {}
+        end_lo, end_hi = self.solve_point(lbd_range[0]), self.solve_point(lbd_range[1])
+        weights, stats = [], []
+        for vol in vols:
+            lo, hi = np.log(lbd_range[0]), np.log(lbd_range[1])
+            (w_lo, s_lo), (w_hi, s_hi) = end_lo, end_hi
+            if s_lo["volatility"] > vol > s_hi["volatility"]:
+                for _ in range(n_bisect):
+                    mid = 0.5 * (lo + hi)
+                    w_mid, s_mid = self.solve_point(np.exp(mid))
+                    if s_mid["volatility"] > vol:
+                        lo, w_lo, s_lo = mid, w_mid, s_mid
+                    else:
+                        hi, w_hi, s_hi = mid, w_mid, s_mid
+                    if abs(s_mid["volatility"] - vol) <= vol_tol * vol:
+                        break
+            w, s = (w_lo, s_lo) if abs(s_lo["volatility"] - vol) < abs(s_hi["volatility"] - vol) else (w_hi, s_hi)
+            weights.append(w)
+            stats.append(s)
+        index = pd.Index(vols, name="vol")
+        return pd.DataFrame(weights, index=index, columns=assets), pd.DataFrame(stats, index=index)
+
+
+def _optimize_frontier(
+        m: np.ndarray, v: Union[np.ndarray, CCovarianceFactor], frontier_kwargs: dict,
+        lbds: list[float], vols: list[float],
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    frontier = COptimizerFrontier(m=m, v=v, **frontier_kwargs)
+    if lbds is not None:
+        return frontier.optimize_lbds(lbds)
+    return frontier.optimize_target_vols(vols)
+
+
+class COptimizerFrontierRolling:
+    def __init__(self, frontier_kwargs: dict = None, n_jobs: int = 1):
+        """
+        Solve the frontier of each rebalance date, dates are independent and solved in parallel.
+
+        :param frontier_kwargs: arguments of COptimizerFrontier shared by all the dates, except m and v
+        :param n_jobs: number of processes, 1 to solve all the dates in this process
+        """
+        self.frontier_kwargs = frontier_kwargs or {}
+        self.n_jobs = n_jobs
+
+    def optimize(
+            self,
+            dates: list[str],
+            ms: list[np.ndarray],
+            vs: list[Union[np.ndarray, CCovarianceFactor]],
+            lbds: list[float] = None,
+            vols: list[float] = None,
+            assets: list[str] = None,
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+
+        :param dates: rebalance dates
+        :param ms: mean of each date, with size = p x 1
+        :param vs: covariance of each date, with size = p x p, or a CCovarianceFactor
+        :param lbds: grid of risk aversion, see COptimizerFrontier.optimize_lbds
+        :param vols: grid of target volatilities, used only if lbds is None, see
+                     COptimizerFrontier.optimize_target_vols
+        :param assets: names of the p assets, 0, 1, ..., p - 1 if not provided
+        :return: (weights, stats), with index = (date, lbd) or (date, vol)
+        """
+        if not (len(dates) == len(ms) == len(vs)):
+            raise ValueError(f"length of dates = {len(dates)}, ms = {len(ms)}, vs = {len(vs)}, not aligned")
+        if lbds is None and vols is None:
+            raise ValueError("one of lbds and vols must be provided")
+
+        n = len(dates)
+        args = (ms, vs, [self.frontier_kwargs] * n, [lbds] * n, [vols] * n)
+        if self.n_jobs > 1 and n > 1:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                chunksize = max(n // (4 * self.n_jobs), 1)
+                results = list(executor.map(_optimize_frontier, *args, chunksize=chunksize))
+        else:
+            results = [_optimize_frontier(*a) for a in zip(*args)]
+
+        weights = pd.concat([w for w, _ in results], keys=dates, names=["date"])
+        stats = pd.concat([s for _, s in results], keys=dates, names=["date"])
+        if assets is not None:
+            weights.columns = assets
+        return weights, stats
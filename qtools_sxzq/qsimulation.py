@@ -1,14 +1,81 @@
 import os
+import hashlib
+import pickle
+import traceback
+import multiprocessing as mp
 import numpy as np
 import pandas as pd
 from tqdm.contrib import tzip
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from enum import Enum, IntEnum
-from typing import Union, Literal
+from typing import Union, Literal, Callable
 from qtools_sxzq.qcalendar import CCalendar
 from qtools_sxzq.qwidgets import check_and_makedirs, SFG, SFY, parse_instrument_from_contract
 from qtools_sxzq.qdata import CDataDescriptor
 from qtools_sxzq.qdataviewer import fetch
+from qtools_sxzq.qevaluation import CNAV
+
+
+TDateType = Literal["str", "int"]  # "str" for "YYYYMMDD", "int" for int32 like 20250407
+
+
+def convert_to_trade_dates(srs: pd.Series, date_type: TDateType = "str") -> np.ndarray:
+    """
+    convert a column of dates to trade dates, without any per-row python calls
+
+    :param srs: datetime-like series, or string series with format "YYYY-MM-DD" or "YYYYMMDD"
+    :param date_type: "str" for "YYYYMMDD", "int" for int32 like 20250407
+    :return:
+    """
+    if isinstance(srs.dtype, pd.DatetimeTZDtype):
+        srs = srs.dt.tz_localize(None)
+    if pd.api.types.is_datetime64_any_dtype(srs):
+        int_dates = CCalendar.convert_dt64s_to_ints(srs)
+    else:
+        int_dates = CCalendar.convert_d08s_to_ints(srs.str.replace("-", ""))
+    if date_type == "int":
+        return int_dates
+    elif date_type == "str":
+        return CCalendar.convert_ints_to_d08s(int_dates)
+    else:
+        raise ValueError(f"date_type = {date_type} is illegal, options should from =('str', 'int')")
+
+
+def cal_date_digests(data: pd.DataFrame, date_col: str = "trade_date") -> dict[int, int]:
+    """
+    hash all the rows of each trade date, the digest of a date does not depend on the order of rows
+
+    :param data: a pd.DataFrame with a column of trade dates, like "20250407" or 20250407
+    :param date_col: name of the column of trade dates
+    :return: dict[trade_date as int, digest]
+    """
+    if data.empty:
+        return {}
+    row_hashes = pd.util.hash_pandas_object(data, index=False).to_numpy()
+    dates = data[date_col].to_numpy().astype(np.int64)
+    order = np.argsort(dates, kind="stable")
+    dates, row_hashes = dates[order], row_hashes[order]
+    bgn_rows = np.flatnonzero(np.concatenate([[True], dates[1:] != dates[:-1]]))
+    digests = np.add.reduceat(row_hashes, bgn_rows)  # uint64, overflow wraps around
+    return dict(zip(dates[bgn_rows].tolist(), digests.tolist()))
+
+
+def digest_date_range(date_digests: dict[int, int], bgn_date: Union[str, int], stp_date: Union[str, int]) -> str:
+    """
+
+    :param date_digests: output of cal_date_digests
+    :param bgn_date: first date of range, included
+    :param stp_date: stop date of range, not included
+    :return: digest of all the data in [bgn_date, stp_date)
+    """
+    bgn, stp = int(bgn_date), int(stp_date)
+    m = hashlib.md5()
+    for d in sorted(d for d in date_digests if bgn <= d < stp):
+        m.update(f"{d}:{date_digests[d]};".encode())
+    return m.hexdigest()
 
 
 class TExePriceType(Enum):
@@ -129,9 +196,20 @@ def print_positions(positions: TPositions, color: bool = True):
 
 
 class CMgrMajContractBase:
-    def get_contract(self, trade_date: str, instrument: str) -> str:
+    def get_contract(self, trade_date: Union[str, int], instrument: str) -> str:
         raise NotImplementedError
 
+    def get_contract_batch(self, trade_date: Union[str, int], instruments: list[str]) -> list[str]:
+        return [self.get_contract(trade_date, instrument) for instrument in instruments]
+
+    def digest(self, bgn_date: str, stp_date: str) -> Union[str, None]:
+        """
+        digest of data in [bgn_date, stp_date), used by CSimulation.main_increment to check whether
+        data before the checkpoint has changed. Override it to enable this check,
+        None means data is never checked and assumed unchanged.
+        """
+        return None
+
 
 """
 ------ manger market data ------ 
@@ -141,12 +219,33 @@ class CMgrMajContractBase:
 class CMgrMktDataBase:
     def get_md(
         self,
-        trade_date: str,
+        trade_date: Union[str, int],
         contract: str,
         md: Literal["open", "close", "settle", "multiplier"],
     ) -> Union[int, float]:
         raise NotImplementedError
 
+    def get_md_batch(
+        self,
+        trade_date: Union[str, int],
+        contracts: list[str],
+        md: Literal["open", "close", "settle", "multiplier"],
+        strict: bool = False,
+    ) -> np.ndarray:
+        """
+        market data of many contracts at one trade date, override this method
+        with a vectorized version if possible
+
+        :param strict: if True, raise KeyError for a missing (trade_date, contract) row, like get_md.
+                       NaN values stored in existing rows are returned as they are.
+        :return: a float array with the same length as contracts
+        """
+        return np.array([self.get_md(trade_date, contract, md) for contract in contracts], dtype=np.float64)
+
+    def digest(self, bgn_date: str, stp_date: str) -> Union[str, None]:
+        # see CMgrMajContractBase.digest
+        return None
+
 
 """
 ------ signal reader ------
@@ -158,9 +257,23 @@ class CSignalBase:
     def sid(self) -> str:
         raise NotImplementedError
 
-    def get_signal(self, trade_date: str) -> dict[str, float]:
+    def get_signal(self, trade_date: Union[str, int]) -> dict[str, float]:
         raise NotImplementedError
 
+    def get_signal_batch(self, trade_date: Union[str, int]) -> tuple[list[str], np.ndarray]:
+        """
+        signal of one trade date as arrays, override this method
+        with a vectorized version if possible
+
+        :return: (instruments, weights)
+        """
+        sigs = self.get_signal(trade_date)
+        return list(sigs), np.array(list(sigs.values()), dtype=np.float64)
+
+    def digest(self, bgn_date: str, stp_date: str) -> Union[str, None]:
+        # see CMgrMajContractBase.digest
+        return None
+
 
 """
 ------ account ------
@@ -194,7 +307,7 @@ class CAccount:
         self.tot_unrealized_pnl = this_day_unrealized_pnl
         return 0
 
-    def take_snapshot(self, trade_date: str, this_day_realized_pnl: float, this_day_cost: float):
+    def take_snapshot(self, trade_date: Union[str, int], this_day_realized_pnl: float, this_day_cost: float):
         snapshot = {
             "trade_date": trade_date,
             "init_cash": self.init_cash,
@@ -217,6 +330,23 @@ class CAccount:
     def export_snapshots(self) -> pd.DataFrame:
         return pd.DataFrame(self.snapshots)
 
+    def get_state(self) -> dict:
+        return {
+            "tot_realized_pnl": self.tot_realized_pnl,
+            "tot_unrealized_pnl": self.tot_unrealized_pnl,
+            "positions": self.positions,
+            "snapshots": self.snapshots,
+            "last_nav": self.last_nav,
+        }
+
+    def set_state(self, state: dict):
+        self.tot_realized_pnl = state["tot_realized_pnl"]
+        self.tot_unrealized_pnl = state["tot_unrealized_pnl"]
+        self.positions = state["positions"]
+        self.snapshots = state["snapshots"]
+        self.last_nav = state["last_nav"]
+        return 0
+
 
 """
 ------ simulation ------
@@ -226,8 +356,12 @@ class CAccount:
 class CSimulation:
     """
     This class provides a complex method to test signals using market data.
-    0.  this class DOES NOT support increment test. In other words, user CAN NOT use this class to do
-        daily increment to get a quick result.
+    0.  main() simulates all the dates every time. For daily increment, use main_increment(), which
+        saves the state of account as a checkpoint file alongside the nav file, and simulates only
+        the new dates next time. If data before the checkpoint has changed (detected by digest() of
+        signal and managers), or settings are changed, it falls back to a full simulation.
+        Digests are saved for each year, verify_years of main_increment limits the check to the latest
+        years, otherwise all the data before the checkpoint is read again on every run.
     1.  the results may be a slightly WORSE than the results in husfort.qsimquick because of:
         1.1 major contract shifting is considered.
         1.2 a specific quantity instead of a precise weight number is used.
@@ -250,7 +384,14 @@ class CSimulation:
         mgr_mkt_data: CMgrMktDataBase,
         sim_save_dir: str,
         vid: str,
+        date_type: TDateType = "str",
     ):
+        """
+
+        :param date_type: type of trade dates used to query mgr_maj_contract, mgr_mkt_data and signal,
+                          must be the same as the date_type of them. "int" costs less memory and hashing
+                          than "str", and the saved nav file is the same.
+        """
         self.signal: CSignalBase = signal
         self.account: CAccount = CAccount(init_cash, cost_rate)
         self.exe_price_type: TExePriceType = exe_price_type
@@ -258,6 +399,7 @@ class CSimulation:
         self.mgr_mkt_data: CMgrMktDataBase = mgr_mkt_data
         self.sim_save_dir = sim_save_dir
         self.vid = vid
+        self.date_type: TDateType = date_type
 
     @property
     def save_id(self) -> str:
@@ -277,7 +419,7 @@ class CSimulation:
         sig_dates, exe_dates = iter_dates[0:-1], iter_dates[1:]
         return sig_dates, exe_dates
 
-    def covert_sig_to_target_pos(self, sig_date: str) -> TPositions:
+    def covert_sig_to_target_pos(self, sig_date: Union[str, int]) -> TPositions:
         sigs = self.signal.get_signal(sig_date)
         target_pos: TPositions = {}
         for instru, weight in sigs.items():
@@ -297,7 +439,7 @@ class CSimulation:
             )
         return target_pos
 
-    def cal_trades(self, target_pos: TPositions, trade_date: str) -> list[CTrade]:
+    def cal_trades(self, target_pos: TPositions, trade_date: Union[str, int]) -> list[CTrade]:
         trades: list[CTrade] = []
         for pos_key, tgt_pos in target_pos.items():
             exe_price = self.mgr_mkt_data.get_md(trade_date, pos_key.contract, md=self.exe_price_type.value)
@@ -341,7 +483,7 @@ class CSimulation:
             cost += trade_cost
         return realized_pnl, cost
 
-    def update_from_market(self, trade_date: str) -> float:
+    def update_from_market(self, trade_date: Union[str, int]) -> float:
         """
 
         :param trade_date:
@@ -362,13 +504,26 @@ class CSimulation:
             del self.account.positions[pos_key]
         return unrealized_pnl
 
-    def main(self, bgn_date: str, stp_date: str, calendar: CCalendar, verbose: bool = False):
-        sig_dates, exe_dates = self.gen_sig_exe_dates(bgn_date, stp_date, calendar)
+    @property
+    def positions(self) -> TPositions:
+        return self.account.positions
+
+    def step(self, sig_date: Union[str, int], exe_date: Union[str, int]) -> tuple[float, float, float]:
+        """
+
+        :param sig_date: date to generate target positions from signal
+        :param exe_date: date to execute trades
+        :return: realized_pnl, cost, unrealized_pnl of exe_date
+        """
+        target_pos = self.covert_sig_to_target_pos(sig_date=sig_date)
+        trades = self.cal_trades(target_pos, trade_date=exe_date)
+        this_day_realized_pnl, this_day_cost = self.update_from_trades(trades=trades)
+        this_day_unrealized_pnl = self.update_from_market(trade_date=exe_date)
+        return this_day_realized_pnl, this_day_cost, this_day_unrealized_pnl
+
+    def simulate(self, sig_dates: list, exe_dates: list, verbose: bool = False):
         for sig_date, exe_date in tzip(sig_dates, exe_dates):
-            target_pos = self.covert_sig_to_target_pos(sig_date=sig_date)
-            trades = self.cal_trades(target_pos, trade_date=exe_date)
-            this_day_realized_pnl, this_day_cost = self.update_from_trades(trades=trades)
-            this_day_unrealized_pnl = self.update_from_market(trade_date=exe_date)
+            this_day_realized_pnl, this_day_cost, this_day_unrealized_pnl = self.step(sig_date, exe_date)
             self.account.update_pnl(
                 this_day_unrealized_pnl=this_day_unrealized_pnl,
                 this_day_realized_pnl=this_day_realized_pnl,
@@ -378,11 +533,472 @@ class CSimulation:
             self.account.update_last_nav()
             if verbose:
                 print(f"----------{exe_date}----------")
-                print_positions(self.account.positions)
+                print_positions(self.positions)
+        return 0
+
+    def main(self, bgn_date: str, stp_date: str, calendar: CCalendar, verbose: bool = False):
+        sig_dates, exe_dates = self.gen_sig_exe_dates(bgn_date, stp_date, calendar)
+        if self.date_type == "int":
+            sig_dates = CCalendar.convert_d08s_to_ints(sig_dates).tolist()
+            exe_dates = CCalendar.convert_d08s_to_ints(exe_dates).tolist()
+        self.simulate(sig_dates, exe_dates, verbose=verbose)
         snapshots = self.account.export_snapshots()
         self.save_nav(snapshots)
         return 0
 
+    @property
+    def ckp_path(self) -> str:
+        return os.path.join(self.sim_save_dir, f"hsim_{self.save_id}.{self.vid}.ckp.pkl")
+
+    @property
+    def ckp_settings(self) -> dict:
+        return {
+            "init_cash": self.account.init_cash,
+            "cost_rate": self.account.cost_rate,
+            "exe_price_type": self.exe_price_type.value,
+            "date_type": self.date_type,
+        }
+
+    def cal_digests(self, bgn_date: str, stp_date: str) -> dict[str, dict[int, Union[str, None]]]:
+        """
+        digests of data in [bgn_date, stp_date), one for each year, so a checkpoint can be checked
+        and updated year by year
+
+        :return: dict[source, dict[year, digest]]
+        """
+        digests = {"signal": {}, "mgr_maj_contract": {}, "mgr_mkt_data": {}}
+        for year in range(int(bgn_date) // 10000, int(stp_date) // 10000 + 1):
+            year_bgn_date, year_stp_date = max(bgn_date, f"{year}0101"), min(stp_date, f"{year + 1}0101")
+            if year_bgn_date < year_stp_date:
+                digests["signal"][year] = self.signal.digest(year_bgn_date, year_stp_date)
+                digests["mgr_maj_contract"][year] = self.mgr_maj_contract.digest(year_bgn_date, year_stp_date)
+                digests["mgr_mkt_data"][year] = self.mgr_mkt_data.digest(year_bgn_date, year_stp_date)
+        return digests
+
+    @staticmethod
+    def get_verify_bgn_date(sig_bgn_date: str, last_exe_date: str, verify_years: Union[int, None]) -> str:
+        """
+
+        :return: data in [verify_bgn_date, last_exe_date] is verified, data before it is trusted
+        """
+        if verify_years is None:
+            return sig_bgn_date
+        return max(sig_bgn_date, f"{int(last_exe_date) // 10000 - verify_years + 1}0101")
+
+    def save_checkpoint(
+            self, sig_bgn_date: str, last_exe_date: str,
+            verify_bgn_date: str = None, trusted_digests: dict[str, dict[int, Union[str, None]]] = None,
+    ):
+        """
+
+        :param sig_bgn_date: first signal date of simulation
+        :param last_exe_date: last execution date of simulation
+        :param verify_bgn_date: digests are calculated from the year of this date, sig_bgn_date if None
+        :param trusted_digests: digests of the years before verify_bgn_date, from the previous checkpoint
+        """
+        verify_bgn_date = verify_bgn_date or sig_bgn_date
+        digests = self.cal_digests(verify_bgn_date, CCalendar.move_date_string(last_exe_date, 1))
+        if trusted_digests:
+            verify_year = int(verify_bgn_date) // 10000
+            for src, year_digests in digests.items():
+                year_digests.update({y: d for y, d in trusted_digests[src].items() if y < verify_year})
+        ckp = {
+            "sig_bgn_date": sig_bgn_date,
+            "last_exe_date": last_exe_date,
+            "settings": self.ckp_settings,
+            "digests": digests,
+            "account": self.account.get_state(),
+        }
+        check_and_makedirs(self.sim_save_dir)
+        tmp_path = f"{self.ckp_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(ckp, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.ckp_path)  # atomic, the old checkpoint is kept if interrupted
+        return 0
+
+    def load_checkpoint(self) -> Union[dict, None]:
+        if not os.path.exists(self.ckp_path):
+            return None
+        with open(self.ckp_path, "rb") as f:
+            return pickle.load(f)
+
+    def check_checkpoint(
+            self, ckp: Union[dict, None], sig_dates: list[str], exe_dates: list[str], verify_years: int = None,
+    ) -> str:
+        """
+
+        :param verify_years: see main_increment
+        :return: reason why the checkpoint can not be used, "" if it can be used
+        """
+        if ckp is None:
+            return "checkpoint not found"
+        if not all(isinstance(v, dict) for v in ckp["digests"].values()):
+            return "checkpoint is saved by an old version without yearly digests"
+        if ckp["sig_bgn_date"] != sig_dates[0]:
+            return f"bgn date is changed, checkpoint starts from signal date {ckp['sig_bgn_date']}"
+        if ckp["settings"] != self.ckp_settings:
+            return f"settings are changed, checkpoint settings = {ckp['settings']}"
+        if ckp["last_exe_date"] not in exe_dates:
+            return f"checkpoint date {ckp['last_exe_date']} is out of simulation dates"
+        verify_bgn_date = self.get_verify_bgn_date(sig_dates[0], ckp["last_exe_date"], verify_years)
+        digests = self.cal_digests(verify_bgn_date, CCalendar.move_date_string(ckp["last_exe_date"], 1))
+        for src, year_digests in digests.items():
+            for year, digest in year_digests.items():
+                if ckp["digests"][src].get(year) != digest:
+                    return f"data of {src} in {year} before checkpoint date {ckp['last_exe_date']} is changed"
+        return ""
+
+    def main_increment(
+            self, bgn_date: str, stp_date: str, calendar: CCalendar, verbose: bool = False, verify_years: int = None,
+    ):
+        """
+        Same as main, but resume from the checkpoint if possible, and save a new checkpoint when finished.
+        The nav file is exactly the same as the one from main.
+
+        :param verify_years: data of the latest verify_years years up to the checkpoint date is re-digested
+                             to check whether it is changed, data of earlier years is trusted and its digests
+                             are copied from the checkpoint. None to verify all the history, which reads all
+                             the data before the checkpoint on every run, for the stream managers it means
+                             loading every yearly window, so a daily update costs O(history) I/O.
+                             With verify_years = 1, it costs O(days in the current year + new days).
+        """
+        if verify_years is not None and verify_years < 1:
+            raise ValueError(f"verify_years = {verify_years}, it must be None or >= 1")
+        sig_dates, exe_dates = self.gen_sig_exe_dates(bgn_date, stp_date, calendar)
+        if not sig_dates:
+            print(f"... {SFY(self.save_id)} no trade dates in [{bgn_date}, {stp_date}), nothing to simulate")
+            return 0
+        ckp = self.load_checkpoint()
+        if reason := self.check_checkpoint(ckp, sig_dates, exe_dates, verify_years):
+            print(f"... {SFY(self.save_id)} full simulation, because {reason}")
+            self.account = CAccount(self.account.init_cash, self.account.cost_rate)
+            new_sig_dates, new_exe_dates = sig_dates, exe_dates
+            verify_bgn_date, trusted_digests = sig_dates[0], None
+        else:
+            self.account.set_state(ckp["account"])
+            n = exe_dates.index(ckp["last_exe_date"]) + 1
+            new_sig_dates, new_exe_dates = sig_dates[n:], exe_dates[n:]
+            print(f"... {SFG(self.save_id)} resumed from {ckp['last_exe_date']}, {len(new_exe_dates)} new dates")
+            verify_bgn_date = self.get_verify_bgn_date(sig_dates[0], ckp["last_exe_date"], verify_years)
+            trusted_digests = ckp["digests"]
+        if self.date_type == "int":
+            new_sig_dates = CCalendar.convert_d08s_to_ints(new_sig_dates).tolist()
+            new_exe_dates = CCalendar.convert_d08s_to_ints(new_exe_dates).tolist()
+        self.simulate(new_sig_dates, new_exe_dates, verbose=verbose)
+        snapshots = self.account.export_snapshots()
+        self.save_nav(snapshots)
+        self.save_checkpoint(sig_dates[0], exe_dates[-1], verify_bgn_date, trusted_digests)
+        return 0
+
+
+"""
+------ vectorized simulation ------
+"""
+
+
+def sum_in_order(x: np.ndarray, init: Union[int, float] = 0.0) -> Union[int, float]:
+    # sum from left to right, so the result is exactly the same as a python for-loop starting from init
+    return (init + np.cumsum(x)[-1]).item() if len(x) > 0 else init
+
+
+@dataclass
+class CPositionArrays:
+    """
+    positions saved as arrays, one element for each CPosKey, in the same order as TPositions
+    """
+    contracts: np.ndarray  # object
+    directions: np.ndarray  # int64, 1 for TPosDirection.LNG, -1 for TPosDirection.SRT
+    qty: np.ndarray  # int64
+    multiplier: np.ndarray  # float64
+    cost_price: np.ndarray  # float64
+    last_price: np.ndarray  # float64
+
+    @staticmethod
+    def from_positions(positions: TPositions) -> "CPositionArrays":
+        values = list(positions.values())
+        return CPositionArrays(
+            contracts=np.array([pos.key.contract for pos in values], dtype=object),
+            directions=np.array([int(pos.key.direction) for pos in values], dtype=np.int64),
+            qty=np.array([pos.qty for pos in values], dtype=np.int64),
+            multiplier=np.array([pos.multiplier for pos in values], dtype=np.float64),
+            cost_price=np.array([pos.cost_price for pos in values], dtype=np.float64),
+            last_price=np.array([pos.last_price for pos in values], dtype=np.float64),
+        )
+
+    def to_positions(self) -> TPositions:
+        positions: TPositions = {}
+        for contract, direction, qty, multiplier, cost_price, last_price in zip(
+                self.contracts.tolist(), self.directions.tolist(), self.qty.tolist(),
+                self.multiplier.tolist(), self.cost_price.tolist(), self.last_price.tolist(),
+        ):
+            key = CPosKey(contract, direction=TPosDirection(direction))
+            positions[key] = CPosition(
+                key=key, qty=qty, multiplier=multiplier, cost_price=cost_price, last_price=last_price,
+            )
+        return positions
+
+    def append(self, contracts: np.ndarray, directions: np.ndarray, multiplier: np.ndarray):
+        n = len(contracts)
+        self.contracts = np.concatenate([self.contracts, contracts])
+        self.directions = np.concatenate([self.directions, directions])
+        self.qty = np.concatenate([self.qty, np.zeros(n, dtype=np.int64)])
+        self.multiplier = np.concatenate([self.multiplier, multiplier])
+        self.cost_price = np.concatenate([self.cost_price, np.zeros(n)])
+        self.last_price = np.concatenate([self.last_price, np.zeros(n)])
+        return 0
+
+    def select(self, mask: np.ndarray):
+        self.contracts = self.contracts[mask]
+        self.directions = self.directions[mask]
+        self.qty = self.qty[mask]
+        self.multiplier = self.multiplier[mask]
+        self.cost_price = self.cost_price[mask]
+        self.last_price = self.last_price[mask]
+        return 0
+
+
+class CSimulationVectorized(CSimulation):
+    """
+    Same as CSimulation, but positions, target positions and trades of each trade date are
+    handled as numpy arrays instead of CPosKey/CPosition/CTrade objects, market data are
+    fetched by get_md_batch, and signals are fetched by get_signal_batch.
+    Trades are applied in the same order as CSimulation, and pnl is summed in the same order,
+    so the nav file is exactly the same as CSimulation.
+    account.positions is synchronized only when simulate() finishes or positions are printed.
+    """
+
+    pos_arrays: CPositionArrays = None
+
+    @property
+    def positions(self) -> TPositions:
+        return self.pos_arrays.to_positions()
+
+    def get_md_batch_strict(self, trade_date: Union[str, int], contracts: np.ndarray, md: str) -> np.ndarray:
+        # missing rows raise KeyError, same as CMgrMktData.get_md in CSimulation, NaN values are returned
+        # as they are, so callers must check them where CSimulation would fail on them
+        return self.mgr_mkt_data.get_md_batch(trade_date, contracts.tolist(), md, strict=True)
+
+    def step(self, sig_date: Union[str, int], exe_date: Union[str, int]) -> tuple[float, float, float]:
+        pa, exe_md = self.pos_arrays, self.exe_price_type.value
+
+        # --- target positions
+        instruments, weights = self.signal.get_signal_batch(sig_date)
+        is_valid = ~(np.abs(weights) < 1e-6)  # keep NaN weights, CSimulation does not skip them
+        instruments, weights = np.array(instruments, dtype=object)[is_valid], weights[is_valid]
+        tgt_contracts = np.array(self.mgr_maj_contract.get_contract_batch(sig_date, instruments.tolist()), dtype=object)
+        tgt_multiplier = self.get_md_batch_strict(sig_date, tgt_contracts, "multiplier")
+        sig_price = self.get_md_batch_strict(sig_date, tgt_contracts, TExePriceType.CLOSE.value)
+        tgt_qty = np.round(self.account.last_nav * np.abs(weights) / tgt_multiplier / sig_price)
+        if not np.all(np.isfinite(tgt_qty)):
+            # raise the same error as int() in CSimulation.covert_sig_to_target_pos, instead of a garbage cast
+            int(tgt_qty[~np.isfinite(tgt_qty)][0])
+        tgt_qty = tgt_qty.astype(np.int64)
+        tgt_directions = np.where(weights > 0, int(TPosDirection.LNG), int(TPosDirection.SRT))
+
+        # --- match target positions with actual positions
+        act_sns = {key: i for i, key in enumerate(zip(pa.contracts.tolist(), pa.directions.tolist()))}
+        tgt_sns = np.array(
+            [act_sns.get(key, -1) for key in zip(tgt_contracts.tolist(), tgt_directions.tolist())], dtype=np.int64
+        )
+        is_new = tgt_sns < 0
+        is_closed = np.ones(len(pa.qty), dtype=bool)
+        is_closed[tgt_sns[~is_new]] = False
+        cls_sns = np.flatnonzero(is_closed)
+
+        # --- trades, target positions first, and then positions not in target
+        tgt_exe_price = self.get_md_batch_strict(exe_date, tgt_contracts, exe_md)
+        cls_exe_price = self.get_md_batch_strict(exe_date, pa.contracts[cls_sns], exe_md)
+        new_sns = np.arange(len(pa.qty), len(pa.qty) + np.sum(is_new))
+        tgt_sns[is_new] = new_sns
+        pa.append(tgt_contracts[is_new], tgt_directions[is_new], tgt_multiplier[is_new])
+        act_qty = pa.qty[tgt_sns]
+        trd_sns = np.concatenate([tgt_sns, cls_sns])
+        trd_qty = np.concatenate([np.abs(tgt_qty - act_qty), pa.qty[cls_sns]])
+        trd_is_opn = np.concatenate([act_qty <= tgt_qty, np.zeros(len(cls_sns), dtype=bool)])
+        trd_exe_price = np.concatenate([tgt_exe_price, cls_exe_price])
+        is_traded = trd_qty > 0
+        trd_sns, trd_qty = trd_sns[is_traded], trd_qty[is_traded]
+        trd_is_opn, trd_exe_price = trd_is_opn[is_traded], trd_exe_price[is_traded]
+
+        # --- update positions from trades
+        trd_multiplier = pa.multiplier[trd_sns]
+        trd_cost = trd_exe_price * trd_multiplier * trd_qty * self.account.cost_rate
+        trd_rpnl = np.where(
+            trd_is_opn, 0.0,
+            (trd_exe_price - pa.cost_price[trd_sns]) * trd_multiplier * trd_qty * pa.directions[trd_sns].astype(float),
+        )
+        opn_sns, opn_qty, opn_price = trd_sns[trd_is_opn], trd_qty[trd_is_opn], trd_exe_price[trd_is_opn]
+        sum_qty = pa.qty[opn_sns] + opn_qty
+        pa.cost_price[opn_sns] = (pa.cost_price[opn_sns] * pa.qty[opn_sns] + opn_price * opn_qty) / sum_qty
+        pa.qty[opn_sns] = sum_qty
+        pa.qty[trd_sns[~trd_is_opn]] -= trd_qty[~trd_is_opn]
+
+        # --- update positions from market
+        is_held = pa.qty > 0
+        pa.select(is_held)
+        pa.last_price = self.get_md_batch_strict(exe_date, pa.contracts, "close")
+        upnl = (pa.last_price - pa.cost_price) * pa.multiplier * pa.qty * pa.directions.astype(float)
+        return sum_in_order(trd_rpnl), sum_in_order(trd_cost), sum_in_order(upnl, init=0)
+
+    def simulate(self, sig_dates: list, exe_dates: list, verbose: bool = False):
+        self.pos_arrays = CPositionArrays.from_positions(self.account.positions)
+        super().simulate(sig_dates, exe_dates, verbose=verbose)
+        self.account.positions = self.pos_arrays.to_positions()
+        return 0
+
+
+"""
+------ batch simulation ------
+"""
+
+# objects shared by all the simulations in a worker process, set by _init_batch_worker
+_BATCH_SHARED: dict = {}
+
+
+def _init_batch_worker(shared: dict):
+    _BATCH_SHARED.update(shared)
+
+
+def _simulate_one_signal(sn: int, bgn_date: str, stp_date: str) -> dict:
+    sid = f"#{sn}"
+    try:
+        signal = _BATCH_SHARED["signals"][sn]
+        if not isinstance(signal, CSignalBase):
+            signal = signal()  # a function to load signal in worker process
+        sid = signal.sid
+        sim: CSimulation = _BATCH_SHARED["sim_type"](
+            signal=signal,
+            mgr_maj_contract=_BATCH_SHARED["mgr_maj_contract"],
+            mgr_mkt_data=_BATCH_SHARED["mgr_mkt_data"],
+            **_BATCH_SHARED["sim_kwargs"],
+        )
+        sim.main(bgn_date, stp_date, calendar=_BATCH_SHARED["calendar"])
+        snapshots = sim.account.export_snapshots()
+        nav = CNAV(input_srs=snapshots.set_index("trade_date")["ret"], input_type="RET")
+        nav.cal_all_indicators(excluded=("var",))
+        return {"sid": sid, "status": "ok", "error": "", "days": len(snapshots), **nav.to_dict()}
+    except Exception as e:
+        return {"sid": sid, "status": "failed", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+
+
+class CSimulationBatch:
+    """
+    Simulate many signals with the same major contract and market data managers.
+    1.  mgr_maj_contract and mgr_mkt_data are loaded only once, and shared read-only by worker
+        processes. With the start method "fork" (Linux), they are inherited copy-on-write without
+        any pickling; otherwise they are pickled only once for each worker. CMgrMktDataColumnar
+        is suggested, its numpy columns are not touched by reference counting, so pages are
+        actually shared among processes.
+    2.  a failed signal does not affect others, its error is recorded in the summary table. If a worker
+        process is killed, the signals not finished yet are run again, each in its own process.
+    """
+
+    def __init__(
+        self,
+        signals: list[Union[CSignalBase, Callable[[], CSignalBase]]],
+        init_cash: float,
+        cost_rate: float,
+        exe_price_type: TExePriceType,
+        mgr_maj_contract: CMgrMajContractBase,
+        mgr_mkt_data: CMgrMktDataBase,
+        sim_save_dir: str,
+        vid: str,
+        date_type: TDateType = "str",
+        sim_type: type = CSimulationVectorized,
+    ):
+        """
+
+        :param signals: each element is a CSignalBase, or a function without arguments returning a CSignalBase.
+                        In the latter case, the function is called in the worker process, which saves the cost
+                        of loading all the signals in the main process and sending them to workers.
+        :param sim_type: CSimulation or CSimulationVectorized
+        """
+        if not signals:
+            raise ValueError("signals is empty, at least one signal is required")
+        self.signals = signals
+        self.mgr_maj_contract = mgr_maj_contract
+        self.mgr_mkt_data = mgr_mkt_data
+        self.sim_save_dir = sim_save_dir
+        self.vid = vid
+        self.sim_type = sim_type
+        self.sim_kwargs = {
+            "init_cash": init_cash,
+            "cost_rate": cost_rate,
+            "exe_price_type": exe_price_type,
+            "sim_save_dir": sim_save_dir,
+            "vid": vid,
+            "date_type": date_type,
+        }
+
+    def save_summary(self, summary: pd.DataFrame):
+        check_and_makedirs(self.sim_save_dir)
+        save_path = os.path.join(self.sim_save_dir, f"hsim_summary.{self.vid}.csv")
+        summary.drop(columns="traceback", errors="ignore").to_csv(save_path, index=False, float_format="%.8f")
+        return 0
+
+    def main(self, bgn_date: str, stp_date: str, calendar: CCalendar, n_jobs: int = None) -> pd.DataFrame:
+        """
+
+        :param n_jobs: number of worker processes, None for os.cpu_count(), 1 to run in this process.
+        :return: summary table, one row for each signal, with columns = ["sid", "status", "error", "days"]
+                 + keys of CNAV.to_dict() + ["traceback"]
+        """
+        shared = {
+            "signals": self.signals,
+            "sim_type": self.sim_type,
+            "mgr_maj_contract": self.mgr_maj_contract,
+            "mgr_mkt_data": self.mgr_mkt_data,
+            "sim_kwargs": self.sim_kwargs,
+            "calendar": calendar,
+        }
+        n_jobs = n_jobs or os.cpu_count()
+        if n_jobs == 1:
+            try:
+                _init_batch_worker(shared)
+                results = [_simulate_one_signal(sn, bgn_date, stp_date) for sn in range(len(self.signals))]
+            finally:
+                _BATCH_SHARED.clear()
+        else:
+            results = [{}] * len(self.signals)
+            mp_ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else None
+            pool_kwargs = {"mp_context": mp_ctx, "initializer": _init_batch_worker, "initargs": (shared,)}
+            with ProcessPoolExecutor(max_workers=n_jobs, **pool_kwargs) as executor:
+                futures = {
+                    executor.submit(_simulate_one_signal, sn, bgn_date, stp_date): sn
+                    for sn in range(len(self.signals))
+                }
+                unfinished = []
+                for future in as_completed(futures):
+                    sn = futures[future]
+                    try:
+                        results[sn] = future.result()
+                    except BrokenProcessPool:
+                        # once a worker is killed (by OOM for example), all the pending futures are broken,
+                        # so which signal killed it is unknown here
+                        unfinished.append(sn)
+
+            # run each unfinished signal in its own process, so a killed worker only fails its own signal
+            unfinished.sort()
+            for i in range(0, len(unfinished), n_jobs):
+                executors = {sn: ProcessPoolExecutor(max_workers=1, **pool_kwargs) for sn in unfinished[i:i + n_jobs]}
+                futures = {
+                    executor.submit(_simulate_one_signal, sn, bgn_date, stp_date): sn
+                    for sn, executor in executors.items()
+                }
+                for future in as_completed(futures):
+                    sn = futures[future]
+                    try:
+                        results[sn] = future.result()
+                    except BrokenProcessPool as e:
+                        results[sn] = {"sid": f"#{sn}", "status": "failed", "error": f"BrokenProcessPool: {e}"}
+                for executor in executors.values():
+                    executor.shutdown()
+        summary = pd.DataFrame(results)
+        self.save_summary(summary)
+        if failed := int(np.sum(summary["status"] != "ok")):
+            print(f"... {SFY(failed)} of {len(summary)} signals failed, see 'error' in summary")
+        return summary
+
 
 """
 ------ classes for Transquant ------
@@ -393,22 +1009,53 @@ by inherit from base class
 """
 
 
+def gen_date_conds(date_field: str, bgn_date: str = None, stp_date: str = None) -> str:
+    """
+
+    :param date_field: name of a date or datetime field, with values like "2025-04-07" or "2025-04-07 15:00:00"
+    :param bgn_date: like "20250101", included, None for no lower bound
+    :param stp_date: like "20260101", not included, None for no upper bound
+    :return: conditions for the WHERE clause, like "datetime >= '2025-01-01' AND datetime < '2026-01-01'"
+    """
+    conds = []
+    if bgn_date:
+        conds.append(f"{date_field} >= '{CCalendar.convert_d08_to_d10(bgn_date)}'")
+    if stp_date:
+        conds.append(f"{date_field} < '{CCalendar.convert_d08_to_d10(stp_date)}'")
+    return " AND ".join(conds)
+
+
 class CMgrMajContract(CMgrMajContractBase):
-    def __init__(self, universe: list[str], dominant: CDataDescriptor):
+    def __init__(
+        self,
+        universe: list[str],
+        dominant: CDataDescriptor,
+        date_type: TDateType = "str",
+        bgn_date: str = None,
+        stp_date: str = None,
+    ):
+        """
+
+        :param date_type: "str" for "YYYYMMDD", "int" for int32 like 20250407
+        :param bgn_date: like "20250101", only data in [bgn_date, stp_date) is loaded, None for no limit.
+                         To simulate from bgn_date D, it should be no later than the trade date before D,
+                         where the first signal is generated.
+        :param stp_date: like "20260101", not included
+        """
         major_data = fetch(
             lib=dominant.db_name,
             table=dominant.table_name,
             names=dominant.fields,
-            conds="",
+            conds=gen_date_conds("trade_day", bgn_date, stp_date),
         ).dropna(axis=0, subset="dominant")
-        major_data["trade_date"] = major_data["trade_day"].map(lambda z: z.replace("-", ""))
+        major_data["trade_date"] = convert_to_trade_dates(major_data["trade_day"], date_type)
         major_data["instrument"] = major_data["dominant"].map(self.get_instrument_from_contract)
-        self.major_data: dict[str, dict[str, str]] = {}  # dict[instrument, dict[trade_date, major_contract]]
+        major_data = major_data[major_data["instrument"].isin(universe)]
+        self.date_digests: dict[int, int] = cal_date_digests(major_data[["trade_date", "dominant"]])
+        self.major_data: dict[str, dict[Union[str, int], str]] = {}  # dict[instrument, dict[trade_date, major_contract]]
         for instrument, instrument_data in major_data.groupby(by="instrument"):  # type:ignore
             instrument: str
             instrument_data: pd.DataFrame
-            if instrument not in universe:
-                continue
             self.major_data[instrument] = instrument_data.set_index("trade_date")["dominant"].to_dict()
         print(f"... Major contract loaded")
 
@@ -418,41 +1065,82 @@ class CMgrMajContract(CMgrMajContractBase):
         instru, exchange = n0.split("_")
         return f"{instru}9999_{exchange}"
 
-    def get_contract(self, trade_date: str, instrument: str) -> str:
+    def get_contract(self, trade_date: Union[str, int], instrument: str) -> str:
         """
 
-        :param trade_date: like "20250407"
+        :param trade_date: like "20250407", or 20250407 if date_type = "int"
         :param instrument: "CU.SHF"
         :return: "CU2506.SHF"
         """
         return self.major_data[instrument][trade_date]
 
+    def digest(self, bgn_date: str, stp_date: str) -> str:
+        return digest_date_range(self.date_digests, bgn_date, stp_date)
+
+
+def fetch_mkt_data(
+    fmd: CDataDescriptor,
+    date_type: TDateType = "str",
+    bgn_date: str = None,
+    stp_date: str = None,
+    fields: list[str] = None,
+) -> pd.DataFrame:
+    """
+
+    :param fmd: descriptor of market data table
+    :param date_type: "str" for "YYYYMMDD", "int" for int32 like 20250407
+    :param bgn_date: like "20250101", only data in [bgn_date, stp_date) is loaded, None for no limit
+    :param stp_date: like "20260101", not included
+    :param fields: fields to load, like ["open", "close", "contractmultiplier"], fmd.fields if None
+    :return: a pd.DataFrame with columns = ["datetime", "contract"] + fields + ["trade_date"],
+             "contractmultiplier" is renamed as "multiplier"
+    """
+    fmt_fields = [f"`{z}`" if z in ["open", "close"] else z for z in (fields or fmd.fields)]
+    major_data = fetch(
+        lib=fmd.db_name,
+        table=fmd.table_name,
+        names=["datetime", "code"] + fmt_fields,
+        conds=gen_date_conds("datetime", bgn_date, stp_date),
+    )
+    major_data = major_data.rename(columns={"contractmultiplier": "multiplier", "code": "contract"})
+    major_data["trade_date"] = convert_to_trade_dates(major_data["datetime"], date_type)
+    return major_data
+
 
 class CMgrMktData(CMgrMktDataBase):
-    def __init__(self, fmd: CDataDescriptor):
-        fmt_fields = [f"`{z}`" if z in ["open", "close"] else z for z in fmd.fields]
-        major_data = fetch(
-            lib=fmd.db_name,
-            table=fmd.table_name,
-            names=["datetime", "code"] + fmt_fields,
-            conds="",
-        )
-        major_data = major_data.rename(columns={"contractmultiplier": "multiplier", "code": "contract"})
-        major_data["trade_date"] = major_data["datetime"].map(lambda z: z.strftime("%Y%m%d"))
+    def __init__(
+        self,
+        fmd: CDataDescriptor,
+        date_type: TDateType = "str",
+        bgn_date: str = None,
+        stp_date: str = None,
+        fields: list[str] = None,
+    ):
+        """
+
+        :param date_type: "str" for "YYYYMMDD", "int" for int32 like 20250407
+        :param bgn_date: like "20250101", only data in [bgn_date, stp_date) is loaded, None for no limit.
+                         To simulate from bgn_date D, it should be no later than the trade date before D.
+        :param stp_date: like "20260101", not included
+        :param fields: fields to load, fmd.fields if None. CSimulation needs only
+                       ["open", "close", "contractmultiplier"] when exe_price_type is OPEN.
+        """
+        major_data = fetch_mkt_data(fmd, date_type, bgn_date, stp_date, fields)
+        self.date_digests: dict[int, int] = cal_date_digests(major_data)
         keys = ["trade_date", "contract"]
         # dict[(trade_date, contract), dict[md, value]]
-        self.md: dict[tuple[str, str], dict] = major_data.set_index(keys).to_dict(orient="index")  # type:ignore
+        self.md: dict[tuple[Union[str, int], str], dict] = major_data.set_index(keys).to_dict(orient="index")  # type:ignore
         print(f"... Market data loaded")
 
     def get_md(
         self,
-        trade_date: str,
+        trade_date: Union[str, int],
         contract: str,
         md: Literal["open", "close", "settle", "multiplier"],
     ) -> Union[int, float]:
         """
 
-        :param trade_date:
+        :param trade_date: like "20250407", or 20250407 if date_type = "int"
         :param contract:
         :param md:  ["pre_close", "pre_settle",
                      "open", "high", "low", "close", "settle",
@@ -461,20 +1149,150 @@ class CMgrMktData(CMgrMktDataBase):
         """
         return self.md[(trade_date, contract)][md]
 
+    def digest(self, bgn_date: str, stp_date: str) -> str:
+        return digest_date_range(self.date_digests, bgn_date, stp_date)
+
+
+class CMgrMktDataColumnar(CMgrMktDataBase):
+    def __init__(
+        self,
+        fmd: CDataDescriptor,
+        date_type: TDateType = "str",
+        bgn_date: str = None,
+        stp_date: str = None,
+        fields: list[str] = None,
+    ):
+        """
+        Same interface as CMgrMktData, but each field is saved as a contiguous numpy column
+        instead of one python dict per row, which costs much less memory and load time.
+
+        Rows are sorted by (contract, trade_date). A contract is usually traded on every trade date
+        between its first and last trade date, so its rows can be located by a ragged position map:
+            row = pos[base[contract] + sn[trade_date]], -1 for missing.
+        The size of pos is about the number of rows, instead of (number of dates x number of contracts).
+
+        :param date_type: "str" for "YYYYMMDD", "int" for int32 like 20250407
+        :param bgn_date, stp_date, fields: same as CMgrMktData
+        """
+        major_data = fetch_mkt_data(fmd, date_type, bgn_date, stp_date, fields)
+        self.date_digests: dict[int, int] = cal_date_digests(major_data)
+        date_sns, dates = pd.factorize(major_data["trade_date"], sort=True)
+        contract_sns, contracts = pd.factorize(major_data["contract"], sort=True)
+        order = np.lexsort((date_sns, contract_sns))
+        date_sns, contract_sns = date_sns[order], contract_sns[order]
+        if np.any((np.diff(contract_sns) == 0) & (np.diff(date_sns) == 0)):
+            raise ValueError("(trade_date, contract) of market data is not unique")
+
+        # first and last row of each contract
+        bgn_rows = np.flatnonzero(np.concatenate([[True], np.diff(contract_sns) != 0]))
+        end_rows = np.concatenate([bgn_rows[1:], [len(order)]]) - 1
+        first_sns, last_sns = date_sns[bgn_rows], date_sns[end_rows]
+        spans = last_sns - first_sns + 1
+        offsets = np.concatenate([[0], np.cumsum(spans)[:-1]])
+        self.bases: np.ndarray = offsets - first_sns
+        self.first_sns: np.ndarray = first_sns
+        self.last_sns: np.ndarray = last_sns
+        self.pos: np.ndarray = np.full(np.sum(spans), -1, dtype=np.int32)
+        self.pos[self.bases[contract_sns] + date_sns] = np.arange(len(order), dtype=np.int32)
+
+        # dict[trade_date, date sn], dict[contract, contract sn]
+        # and dict[contract, (base, first date sn, last date sn)] for faster scalar lookup
+        self.date_sns: dict[Union[str, int], int] = {d: i for i, d in enumerate(dates.tolist())}
+        self.contract_sns: dict[str, int] = {c: i for i, c in enumerate(contracts.tolist())}
+        self.contract_info: dict[str, tuple[int, int, int]] = dict(zip(
+            contracts.tolist(), zip(self.bases.tolist(), first_sns.tolist(), last_sns.tolist())
+        ))
+        self.columns: dict[str, np.ndarray] = {
+            md: major_data[md].to_numpy()[order] for md in major_data.columns
+            if md not in ("datetime", "trade_date", "contract")
+        }
+        print(f"... Market data loaded")
+
+    def get_row(self, trade_date: Union[str, int], contract: str) -> int:
+        base, first_sn, last_sn = self.contract_info[contract]
+        sn = self.date_sns[trade_date]
+        if first_sn <= sn <= last_sn and (row := self.pos.item(base + sn)) >= 0:
+            return row
+        raise KeyError((trade_date, contract))
+
+    def get_md(
+        self,
+        trade_date: Union[str, int],
+        contract: str,
+        md: Literal["open", "close", "settle", "multiplier"],
+    ) -> Union[int, float]:
+        """
+
+        :param trade_date: like "20250407", or 20250407 if date_type = "int"
+        :param contract:
+        :param md:  ["pre_close", "pre_settle",
+                     "open", "high", "low", "close", "settle",
+                     "vol", "amount", "oi"]
+        :return:
+        """
+        return self.columns[md].item(self.get_row(trade_date, contract))
+
+    def get_md_batch(
+        self,
+        trade_date: Union[str, int],
+        contracts: list[str],
+        md: Literal["open", "close", "settle", "multiplier"],
+        strict: bool = False,
+    ) -> np.ndarray:
+        """
+
+        :param strict: if True, raise KeyError for a missing row, otherwise NaN is returned for it
+        :return: a float array with the same length as contracts
+        """
+        res = np.full(len(contracts), np.nan)
+        if not contracts:
+            return res
+        sn = self.date_sns.get(trade_date, None)
+        if sn is None:
+            if strict:
+                raise KeyError((trade_date, contracts[0]))
+            return res
+        csns = np.array([self.contract_sns.get(c, -1) for c in contracts], dtype=np.int64)
+        is_in = (csns >= 0) & (self.first_sns[csns] <= sn) & (sn <= self.last_sns[csns])
+        rows = np.where(is_in, self.pos[np.where(is_in, self.bases[csns] + sn, 0)], -1)
+        is_in = rows >= 0
+        if strict and not np.all(is_in):
+            raise KeyError((trade_date, contracts[int(np.argmin(is_in))]))
+        res[is_in] = self.columns[md][rows[is_in]]
+        return res
+
+    def digest(self, bgn_date: str, stp_date: str) -> str:
+        return digest_date_range(self.date_digests, bgn_date, stp_date)
+
 
 class CSignal(CSignalBase):
-    def __init__(self, sid: str, signal_db: CDataDescriptor):
+    def __init__(
+        self,
+        sid: str,
+        signal_db: CDataDescriptor,
+        date_type: TDateType = "str",
+        bgn_date: str = None,
+        stp_date: str = None,
+    ):
+        """
+
+        :param date_type: "str" for "YYYYMMDD", "int" for int32 like 20250407
+        :param bgn_date: like "20250101", only data in [bgn_date, stp_date) is loaded, None for no limit.
+                         To simulate from bgn_date D, it should be no later than the trade date before D.
+        :param stp_date: like "20260101", not included
+        """
         self._sid = sid
         signal_data = fetch(
             lib=signal_db.db_name,
             table=signal_db.table_name,
             names=["datetime", "code", self.sid],
-            conds="",
+            conds=gen_date_conds("datetime", bgn_date, stp_date),
         )
-        signal_data["trade_date"] = signal_data["datetime"].map(lambda z: z.strftime("%Y%m%d"))
-        self.signal: dict[str, dict[str, float]] = {}  # dict[trade_date, dict[instrument, weight]]
+        signal_data["trade_date"] = convert_to_trade_dates(signal_data["datetime"], date_type)
+        self.date_digests: dict[int, int] = cal_date_digests(signal_data)
+        self.signal: dict[Union[str, int], dict[str, float]] = {}  # dict[trade_date, dict[instrument, weight]]
         for trade_date, trade_date_data in signal_data.groupby(by="trade_date"):  # type:ignore
-            trade_date: str
+            trade_date: Union[str, int]
             trade_date_data: pd.DataFrame
             self.signal[trade_date] = trade_date_data.set_index("code")[self.sid].to_dict()
         print(f"... Singal {SFG(sid)} data loaded")
@@ -483,5 +1301,239 @@ class CSignal(CSignalBase):
     def sid(self) -> str:
         return self._sid
 
-    def get_signal(self, trade_date: str) -> dict[str, float]:
+    def get_signal(self, trade_date: Union[str, int]) -> dict[str, float]:
         return self.signal.get(trade_date, {})
+
+    def digest(self, bgn_date: str, stp_date: str) -> str:
+        return digest_date_range(self.date_digests, bgn_date, stp_date)
+
+
+class CSignalMatrix(CSignalBase):
+    def __init__(
+        self,
+        sid: str,
+        signal_db: CDataDescriptor,
+        date_type: TDateType = "str",
+        bgn_date: str = None,
+        stp_date: str = None,
+        dtype: type = np.float32,
+    ):
+        """
+        Same interface as CSignal, but the signal table is pivoted once into a matrix with
+        shape = (number of dates, number of instruments), NaN for missing values, instead of
+        one dict for each trade date.
+        1.  instruments of each date are sorted by name, and instruments with NaN are skipped.
+        2.  values are saved as dtype, float32 costs half the memory, but the weights are
+            rounded to float32 precision, use np.float64 to get the same results as CSignal.
+
+        :param date_type: "str" for "YYYYMMDD", "int" for int32 like 20250407
+        :param bgn_date, stp_date: same as CSignal
+        :param dtype: np.float32 or np.float64
+        """
+        self._sid = sid
+        signal_data = fetch(
+            lib=signal_db.db_name,
+            table=signal_db.table_name,
+            names=["datetime", "code", self.sid],
+            conds=gen_date_conds("datetime", bgn_date, stp_date),
+        )
+        signal_data["trade_date"] = convert_to_trade_dates(signal_data["datetime"], date_type)
+        self.date_digests: dict[int, int] = cal_date_digests(signal_data)
+        date_sns, dates = pd.factorize(signal_data["trade_date"], sort=True)
+        instru_sns, instruments = pd.factorize(signal_data["code"], sort=True)
+        self.instruments: np.ndarray = np.asarray(instruments, dtype=object)
+        self.date_sns: dict[Union[str, int], int] = {d: i for i, d in enumerate(dates.tolist())}
+        self.matrix: np.ndarray = np.full((len(dates), len(instruments)), np.nan, dtype=dtype)
+        self.matrix[date_sns, instru_sns] = signal_data[self.sid].to_numpy(dtype=dtype)
+        print(f"... Singal {SFG(sid)} data loaded")
+
+    @property
+    def sid(self) -> str:
+        return self._sid
+
+    def get_row(self, trade_date: Union[str, int]) -> Union[np.ndarray, None]:
+        """
+
+        :return: a read-only view of signal of all instruments at trade_date, None if trade_date is missing
+        """
+        if (sn := self.date_sns.get(trade_date, None)) is None:
+            return None
+        row = self.matrix[sn]
+        row.flags.writeable = False
+        return row
+
+    def get_signal(self, trade_date: Union[str, int]) -> dict[str, float]:
+        instruments, weights = self.get_signal_batch(trade_date)
+        return dict(zip(instruments, weights.tolist()))
+
+    def get_signal_batch(self, trade_date: Union[str, int]) -> tuple[list[str], np.ndarray]:
+        if (row := self.get_row(trade_date)) is None:
+            return [], np.array([], dtype=np.float64)
+        is_valid = ~np.isnan(row)
+        return self.instruments[is_valid].tolist(), row[is_valid].astype(np.float64)
+
+    def digest(self, bgn_date: str, stp_date: str) -> str:
+        return digest_date_range(self.date_digests, bgn_date, stp_date)
+
+
+"""
+------ streaming classes for Transquant ------
+load data year by year as the simulation advances,
+only a sliding window of years is kept in memory
+"""
+
+
+class CYearlyWindows:
+    def __init__(self, load: Callable[[str, str], object], bgn_date: str, stp_date: str, max_windows: int = 2):
+        """
+
+        :param load: a function load(bgn_date, stp_date) returning an object with data in [bgn_date, stp_date),
+                     like CMgrMktDataColumnar(fmd, date_type, bgn_date, stp_date)
+        :param bgn_date: like "20150101", included
+        :param stp_date: like "20250101", not included
+        :param max_windows: at most max_windows years are kept in memory, the earliest loaded one is
+                            dropped first. At least 2 is suggested, because signal date and execution date
+                            may be in 2 different years.
+        """
+        self.load = load
+        self.bgn_date = bgn_date
+        self.stp_date = stp_date
+        self.max_windows = max_windows
+        self.windows: dict[int, object] = {}  # dict[year, loaded object], in loading order
+
+    def covers(self, trade_date: Union[str, int]) -> bool:
+        return int(self.bgn_date) <= int(trade_date) < int(self.stp_date)
+
+    def get_window_range(self, year: int) -> tuple[str, str]:
+        return max(self.bgn_date, f"{year}0101"), min(self.stp_date, f"{year + 1}0101")
+
+    def get(self, trade_date: Union[str, int]) -> object:
+        if not self.covers(trade_date):
+            raise KeyError(f"trade date {trade_date} is out of [{self.bgn_date}, {self.stp_date})")
+        year = int(trade_date) // 10000
+        if (window := self.windows.get(year)) is None:
+            if len(self.windows) >= self.max_windows:
+                del self.windows[next(iter(self.windows))]
+            window = self.windows[year] = self.load(*self.get_window_range(year))
+        return window
+
+    def digest(self, bgn_date: str, stp_date: str) -> str:
+        # load windows one by one, so at most max_windows years are in memory
+        date_digests: dict[int, int] = {}
+        for year in range(int(bgn_date) // 10000, int(stp_date) // 10000 + 1):
+            win_bgn_date, win_stp_date = self.get_window_range(year)
+            if win_bgn_date < win_stp_date:
+                date_digests.update(self.get(win_bgn_date).date_digests)
+        return digest_date_range(date_digests, bgn_date, stp_date)
+
+
+class CMgrMajContractStream(CMgrMajContractBase):
+    def __init__(
+        self,
+        universe: list[str],
+        dominant: CDataDescriptor,
+        bgn_date: str,
+        stp_date: str,
+        date_type: TDateType = "str",
+        max_windows: int = 2,
+    ):
+        """
+        Same as CMgrMajContract, but data is loaded year by year when it is queried.
+
+        :param bgn_date: like "20150101", no later than the trade date before the bgn_date of simulation
+        :param stp_date: like "20250101", not included
+        """
+        self.windows = CYearlyWindows(
+            partial(CMgrMajContract, universe, dominant, date_type), bgn_date, stp_date, max_windows
+        )
+
+    def get_contract(self, trade_date: Union[str, int], instrument: str) -> str:
+        return self.windows.get(trade_date).get_contract(trade_date, instrument)
+
+    def get_contract_batch(self, trade_date: Union[str, int], instruments: list[str]) -> list[str]:
+        return self.windows.get(trade_date).get_contract_batch(trade_date, instruments)
+
+    def digest(self, bgn_date: str, stp_date: str) -> str:
+        return self.windows.digest(bgn_date, stp_date)
+
+
+class CMgrMktDataStream(CMgrMktDataBase):
+    def __init__(
+        self,
+        fmd: CDataDescriptor,
+        bgn_date: str,
+        stp_date: str,
+        date_type: TDateType = "str",
+        fields: list[str] = None,
+        max_windows: int = 2,
+        mgr_type: type = CMgrMktDataColumnar,
+    ):
+        """
+        Same as CMgrMktData, but data is loaded year by year when it is queried.
+
+        :param bgn_date: like "20150101", no later than the trade date before the bgn_date of simulation
+        :param stp_date: like "20250101", not included
+        :param mgr_type: CMgrMktDataColumnar or CMgrMktData, to manage data of each year
+        """
+        self.windows = CYearlyWindows(
+            partial(mgr_type, fmd, date_type, fields=fields), bgn_date, stp_date, max_windows
+        )
+
+    def get_md(
+        self,
+        trade_date: Union[str, int],
+        contract: str,
+        md: Literal["open", "close", "settle", "multiplier"],
+    ) -> Union[int, float]:
+        return self.windows.get(trade_date).get_md(trade_date, contract, md)
+
+    def get_md_batch(
+        self,
+        trade_date: Union[str, int],
+        contracts: list[str],
+        md: Literal["open", "close", "settle", "multiplier"],
+        strict: bool = False,
+    ) -> np.ndarray:
+        return self.windows.get(trade_date).get_md_batch(trade_date, contracts, md, strict=strict)
+
+    def digest(self, bgn_date: str, stp_date: str) -> str:
+        return self.windows.digest(bgn_date, stp_date)
+
+
+class CSignalStream(CSignalBase):
+    def __init__(
+        self,
+        sid: str,
+        signal_db: CDataDescriptor,
+        bgn_date: str,
+        stp_date: str,
+        date_type: TDateType = "str",
+        max_windows: int = 2,
+        sig_type: type = CSignal,
+    ):
+        """
+        Same as CSignal, but data is loaded year by year when it is queried.
+
+        :param bgn_date: like "20150101", no later than the trade date before the bgn_date of simulation
+        :param stp_date: like "20250101", not included
+        :param sig_type: CSignal or CSignalMatrix, to manage data of each year
+        """
+        self._sid = sid
+        self.windows = CYearlyWindows(partial(sig_type, sid, signal_db, date_type), bgn_date, stp_date, max_windows)
+
+    @property
+    def sid(self) -> str:
+        return self._sid
+
+    def get_signal(self, trade_date: Union[str, int]) -> dict[str, float]:
+        if not self.windows.covers(trade_date):
+            return {}
+        return self.windows.get(trade_date).get_signal(trade_date)
+
+    def get_signal_batch(self, trade_date: Union[str, int]) -> tuple[list[str], np.ndarray]:
+        if not self.windows.covers(trade_date):
+            return [], np.array([], dtype=np.float64)
+        return self.windows.get(trade_date).get_signal_batch(trade_date)
+
+    def digest(self, bgn_date: str, stp_date: str) -> str:
+        return self.windows.digest(bgn_date, stp_date)
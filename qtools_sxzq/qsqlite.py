@@ -107,6 +107,9 @@ class CDbStruct:
 
 
 class CMgrSqlDb(object):
+    # for bulk load, journal in memory, no fsync, temp tables and indices in memory, 200MB page cache
+    BULK_PRAGMAS = {"journal_mode": "MEMORY", "synchronous": "OFF", "temp_store": "MEMORY", "cache_size": -200000}
+
     def __init__(self, db_save_dir: str, db_name: str, table: CSqlTable, mode: str, verbose: bool = False):
         """
 
@@ -305,21 +308,75 @@ class CMgrSqlDb(object):
             )
             return 2
 
-    def update(self, update_data: pd.DataFrame, using_index: bool = False):
+    @staticmethod
+    def iter_chunks(update_data: pd.DataFrame, using_index: bool, chunk_size: int):
+        """
+        convert update_data to rows of python objects chunk by chunk, Series.tolist() converts
+        a whole column at once, so it is much faster than itertuples, and memory is bounded by chunk_size
+
+        :return: a generator of list[tuple], each list has at most chunk_size rows
+        """
+        for bgn in range(0, len(update_data), chunk_size):
+            chunk = update_data.iloc[bgn:bgn + chunk_size]
+            columns = [chunk.index.tolist()] if using_index else []
+            columns += [chunk.iloc[:, j].tolist() for j in range(chunk.shape[1])]
+            yield list(zip(*columns))
+
+    @staticmethod
+    def set_pragmas(cursor: sql3.Cursor, pragmas: dict[str, Union[str, int]]) -> dict[str, Union[str, int]]:
+        """
+
+        :param cursor:
+        :param pragmas: like {"journal_mode": "MEMORY"}
+        :return: the original values of these pragmas
+        """
+        originals = {}
+        for key, val in pragmas.items():
+            originals[key] = cursor.execute(f"PRAGMA {key}").fetchone()[0]
+            cursor.execute(f"PRAGMA {key} = {val}").fetchall()
+        return originals
+
+    def update(
+            self,
+            update_data: pd.DataFrame,
+            using_index: bool = False,
+            chunk_size: int = 100000,
+            pragmas: dict[str, Union[str, int]] = None,
+    ):
         """
 
         :param update_data: new data, column orders must be the same as the columns orders of the new target table
         :param using_index: whether using index as a data column
+        :param chunk_size: number of rows converted and written by one executemany
+        :param pragmas: PRAGMA settings during this update, they are restored after it,
+                        like BULK_PRAGMAS, which trades durability of this update for speed:
+                        if the process crashes during the update, the database may be corrupted.
+                        They are restored and the connection is closed even if the update fails.
         :return:
         """
 
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size = {chunk_size} is illegal, it must be a positive integer")
         if self.check_permission():
             cmd_upd = self.table.cmd_sql_upd
-            with sql3.connect(self.db_path) as connection:
-                cursor = connection.cursor()
-                for data_cell in update_data.itertuples(index=using_index):  # itertuples is much faster than iterrows
-                    cursor.execute(cmd_upd, data_cell)
+            connection = sql3.connect(self.db_path)
+            cursor = connection.cursor()
+            originals = {}
+            try:
+                for key, val in (pragmas or {}).items():
+                    originals.update(self.set_pragmas(cursor, {key: val}))
+                for rows in self.iter_chunks(update_data, using_index, chunk_size):
+                    cursor.executemany(cmd_upd, rows)
                 connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                # pragmas like journal_mode can not be changed inside a transaction, so restore them after it
+                try:
+                    self.set_pragmas(cursor, originals)
+                finally:
+                    connection.close()
         return 0
 
     def delete_by_conditions(self, conditions: list[tuple[str, str, str]]):
@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+from typing import Union
+
+"""
+created @ 2026-10-17
+0.  tail risk indicators of return series: Value at Risk (VaR) and Expected Shortfall (ES).
+1.  cal_var_es() sorts each series only once for all the quantiles, and supports
+    a matrix with shape = (dates, strategies).
+2.  CTailRiskStream estimates them in a streaming way with O(1) memory, by the P-Square
+    algorithm (Jain & Chlamtac, 1985), for series too long to be held in memory.
+3.  q in qs is a percentage, like 1 or 5, same as np.percentile. VaR is the q-th percentile of
+    returns, without changing the sign. ES is the mean of returns NOT greater than VaR.
+"""
+
+
+def cal_quantiles_from_sorted(sorted_rtn: np.ndarray, qs: tuple[Union[int, float], ...]) -> np.ndarray:
+    """
+    linear interpolation, exactly the same as np.percentile(rtn, qs, axis=0)
+
+    :param sorted_rtn: returns sorted along axis 0, shape = (dates,) or (dates, strategies), NaN at the end
+    :param qs: percentages
+    :return: shape = (len(qs),) or (len(qs), strategies)
+    """
+    n = sorted_rtn.shape[0]
+    virtual_idx = (n - 1) * (np.asarray(qs, dtype=np.float64) / 100)
+    prev_idx = np.floor(virtual_idx).astype(np.int64)
+    next_idx = np.minimum(prev_idx + 1, n - 1)
+    gamma = (virtual_idx - prev_idx).reshape((-1,) + (1,) * (sorted_rtn.ndim - 1))
+    a, b = sorted_rtn[prev_idx], sorted_rtn[next_idx]
+    diff_b_a = b - a
+    res = np.where(gamma >= 0.5, b - diff_b_a * (1 - gamma), a + diff_b_a * gamma)
+    return np.where(np.isnan(sorted_rtn[-1]), np.nan, res)
+
+
+def cal_es_from_sorted(sorted_rtn: np.ndarray, var: np.ndarray) -> np.ndarray:
+    """
+
+    :param sorted_rtn: returns sorted along axis 0, same as cal_quantiles_from_sorted
+    :param var: result of cal_quantiles_from_sorted(sorted_rtn, qs)
+    :return: mean of returns not greater than VaR, same shape as var
+    """
+    cum_rtn = np.cumsum(sorted_rtn, axis=0)
+    # number of returns not greater than VaR, at least 1 since VaR >= the min return,
+    # searched column by column, NaN are sorted to the end and never counted
+    if sorted_rtn.ndim == 1:
+        counts = np.searchsorted(sorted_rtn, var, side="right")
+    else:
+        counts = np.empty(var.shape, dtype=np.int64)
+        for j in range(sorted_rtn.shape[1]):
+            counts[:, j] = np.searchsorted(sorted_rtn[:, j], var[:, j], side="right")
+    counts = np.maximum(counts, 1)
+    if sorted_rtn.ndim == 1:
+        es = cum_rtn[counts - 1] / counts
+    else:
+        es = np.take_along_axis(cum_rtn, counts - 1, axis=0) / counts
+    return np.where(np.isnan(var), np.nan, es)
+
+
+def cal_var_es(rtn: np.ndarray, qs: tuple[Union[int, float], ...]) -> tuple[np.ndarray, np.ndarray]:
+    """
+
+    :param rtn: returns, shape = (dates,) or (dates, strategies)
+    :param qs: percentages, like (1, 5)
+    :return: (VaR, ES), both with shape = (len(qs),) or (len(qs), strategies)
+    """
+    sorted_rtn = np.sort(rtn, axis=0)
+    var = cal_quantiles_from_sorted(sorted_rtn, qs)
+    return var, cal_es_from_sorted(sorted_rtn, var)
+
+
+def cal_tail_risk(
+    rtn: Union[pd.Series, pd.DataFrame], qs: tuple[int, ...]
+) -> Union[pd.Series, pd.DataFrame]:
+    """
+
+    :param rtn: a return series, or a pd.DataFrame with shape = (dates, strategies)
+    :param qs: percentages, like (1, 5)
+    :return: a pd.Series with index = ["q01", "q05", "es01", "es05"] for a series input,
+             or a pd.DataFrame with index = strategies and the same columns for a DataFrame input.
+             "q01" is the same key as CNAV.to_dict().
+    """
+    var, es = cal_var_es(rtn.to_numpy(dtype=np.float64), qs)
+    keys = [f"q{q:02d}" for q in qs] + [f"es{q:02d}" for q in qs]
+    if isinstance(rtn, pd.Series):
+        return pd.Series(np.concatenate([var, es]), index=keys)
+    return pd.DataFrame(np.concatenate([var, es]).T, index=rtn.columns, columns=keys)
+
+
+"""
+------ streaming ------
+"""
+
+
+class CP2Quantile(object):
+    def __init__(self, p: float):
+        """
+        P-Square estimator of one quantile, 5 markers are kept, each update costs O(1).
+
+        :param p: quantile in (0, 1), like 0.05
+        """
+        self.p = p
+        self.heights: list[float] = []  # the first 5 observations are kept as the initial markers
+        self.positions: list[int] = [1, 2, 3, 4, 5]
+        self.desired: list[float] = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments: tuple[float, ...] = (0, p / 2, p, (1 + p) / 2, 1)
+
+    @property
+    def count(self) -> int:
+        return self.positions[4] if len(self.heights) == 5 else len(self.heights)
+
+    @property
+    def value(self) -> float:
+        if len(self.heights) == 5:
+            return self.heights[2]
+        if not self.heights:
+            return np.nan
+        return float(np.percentile(self.heights, self.p * 100))
+
+    def update(self, x: float):
+        h, n = self.heights, self.positions
+        if len(h) < 5:
+            h.append(x)
+            h.sort()
+            return 0
+
+        # find cell k and update extreme markers
+        if x < h[0]:
+            h[0], k = x, 0
+        elif x >= h[4]:
+            h[4], k = x, 3
+        else:
+            k = 0
+            while x >= h[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # adjust heights of inner markers
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                hp = h[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not h[i - 1] < hp < h[i + 1]:  # parabolic prediction is out of range, use linear
+                    hp = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                h[i] = hp
+                n[i] += d
+        return 0
+
+
+class CTailRiskStream(object):
+    def __init__(self, qs: tuple[int, ...]):
+        """
+        Streaming approximate VaR and ES, memory cost is O(len(qs)) and does not depend
+        on the length of the series.
+        VaR is estimated by CP2Quantile, and ES is the mean of the returns not greater than
+        the running VaR estimate when they arrive, the error of the first few returns
+        is diluted as the series grows.
+
+        :param qs: percentages, like (1, 5)
+        """
+        self.qs = tuple(qs)
+        self.var_estimators = [CP2Quantile(q / 100) for q in self.qs]
+        self.tail_sums: list[float] = [0.0] * len(self.qs)
+        self.tail_counts: list[int] = [0] * len(self.qs)
+
+    def update(self, ret: float):
+        ret = float(ret)
+        for i, est in enumerate(self.var_estimators):
+            est.update(ret)
+            if ret <= est.value:
+                self.tail_sums[i] += ret
+                self.tail_counts[i] += 1
+        return 0
+
+    def update_batch(self, rets: Union[np.ndarray, pd.Series, list[float]]):
+        for ret in np.asarray(rets, dtype=np.float64).tolist():
+            self.update(ret)
+        return 0
+
+    def to_dict(self) -> dict[str, float]:
+        """
+
+        :return: like {"q01": ..., "q05": ..., "es01": ..., "es05": ...}, same keys as cal_tail_risk
+        """
+        d = {f"q{q:02d}": est.value for q, est in zip(self.qs, self.var_estimators)}
+        d.update({
+            f"es{q:02d}": s / c if c > 0 else np.nan
+            for q, s, c in zip(self.qs, self.tail_sums, self.tail_counts)
+        })
+        return d